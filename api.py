@@ -4,16 +4,22 @@ Aura AI FastAPI 服务
 集成安全中间件：API Key 认证、速率限制、输入校验、审计日志
 """
 import os
+import asyncio
+import json
 import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Security
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, Security
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 import uvicorn
 
 from security import (
@@ -25,6 +31,8 @@ from security import (
     audit_log,
     setup_audit_log,
 )
+from startup import timeline
+from filters import SearchFilter
 
 logger = logging.getLogger("AuraAPI")
 
@@ -56,14 +64,41 @@ class RateLimiter:
 rate_limiter = RateLimiter(max_requests=30, window_seconds=60)
 
 
+# ---------------------------------------------------------------------------
+# 对话执行线程池
+# /chat 的同步 Agent 调用在独立线程池中执行，与 starlette 默认线程池（get_agent / 检索等短任务）隔离；
+# 不同会话并行，同一会话由 Agent 串行化。并发上限由 AURA_CHAT_WORKERS 控制
+# ---------------------------------------------------------------------------
+CHAT_WORKERS = int(os.environ.get("AURA_CHAT_WORKERS", "8"))
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="aura-chat")
+
+
 # ---------------------------------------------------------------------------
 # Lifespan（启动/关闭）
 # ---------------------------------------------------------------------------
+WARMUP_COMPONENTS = ("llm", "embeddings", "vectorstore", "bm25", "reranker", "agent", "warmup")
+
+
+def warm_up():
+    """后台构建 Agent 并预热模型，完成后 /ready 返回 200"""
+    try:
+        agent = get_agent()
+        agent.rag_system.warmup()
+        logger.info("冷启动完成: %s", timeline.snapshot())
+    except Exception as e:
+        logger.error("后台预热失败: %s", e)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_audit_log()
     audit_log("server_start", "Aura API 服务启动")
+    # 模型在后台线程加载，服务立即开始接受请求；AURA_WARMUP=0 时退回首个请求时加载
+    if os.environ.get("AURA_WARMUP", "1") != "0":
+        timeline.expect(*WARMUP_COMPONENTS)
+        app.state.warmup_task = asyncio.create_task(run_in_threadpool(warm_up))
     yield
+    chat_executor.shutdown(wait=False, cancel_futures=True)
     audit_log("server_stop", "Aura API 服务关闭")
 
 
@@ -145,12 +180,16 @@ async def check_rate_limit(request: Request):
 # Agent 延迟加载
 # ---------------------------------------------------------------------------
 _agent = None
+_agent_lock = threading.Lock()
 
 def get_agent():
+    """线程安全：后台预热进行中时，请求线程等待同一个 Agent 构建完成"""
     global _agent
     if _agent is None:
-        from aura_react import AuraReActAgent
-        _agent = AuraReActAgent()
+        with _agent_lock:
+            if _agent is None:
+                from aura_react import AuraReActAgent
+                _agent = AuraReActAgent()
     return _agent
 
 
@@ -160,18 +199,47 @@ def get_agent():
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=4096)
     use_tools: bool = True
+    # 会话 ID：同一 ID 共享对话上下文；不传时服务端生成新会话并在响应中返回
+    session_id: Optional[str] = Field(default=None, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
 
 
 class ChatResponse(BaseModel):
     response: str
     success: bool = True
     error: Optional[str] = None
+    session_id: Optional[str] = None
 
 
 class KnowledgeRequest(BaseModel):
     file_path: str = Field(..., min_length=1, max_length=260)
 
 
+DISCONNECT_POLL_SECONDS = 0.1
+
+
+async def cancel_on_disconnect(request: Optional[Request], coro):
+    """
+    执行协程，期间轮询客户端连接；客户端断开时取消它并抛出 CancelledError。
+    request 为 None（如直接调用路由函数）时直接等待。
+    """
+    task = asyncio.ensure_future(coro)
+    if request is None:
+        return await task
+
+    async def watch():
+        while not task.done():
+            if await request.is_disconnected():
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        return await task
+    finally:
+        watcher.cancel()
+
+
 # ---------------------------------------------------------------------------
 # 路由
 # ---------------------------------------------------------------------------
@@ -185,6 +253,16 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    """就绪检查：各组件加载状态与冷启动时间线，未就绪时返回 503"""
+    is_ready = _agent is not None and timeline.is_ready()
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, **timeline.snapshot()},
+    )
+
+
 @app.post(
     "/chat",
     response_model=ChatResponse,
@@ -192,6 +270,8 @@ async def health():
 )
 async def chat(request: ChatRequest, raw_request: Request):
     """与 Aura 对话"""
+    # 在 try 之前确定会话 ID：出错时也把服务端生成的 ID 返回给客户端
+    session_id = request.session_id or uuid.uuid4().hex
     try:
         clean_query = sanitize_query(request.query)
         audit_log(
@@ -199,14 +279,52 @@ async def chat(request: ChatRequest, raw_request: Request):
             mask_pii(clean_query[:120]),
             client_ip=raw_request.client.host,
         )
-        agent = get_agent()
-        response = agent.process_query(clean_query)
-        return ChatResponse(response=response, success=True)
+        agent = await run_in_threadpool(get_agent)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(chat_executor, agent.process_query, clean_query, session_id)
+        return ChatResponse(response=response, success=True, session_id=session_id)
     except ValueError as e:
-        return ChatResponse(response="", success=False, error=str(e))
+        return ChatResponse(response="", success=False, error=str(e), session_id=session_id)
     except Exception as e:
         logger.error("chat 处理异常: %s", e)
-        return ChatResponse(response="", success=False, error="内部错误")
+        return ChatResponse(response="", success=False, error="内部错误", session_id=session_id)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """格式化为一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post(
+    "/chat/stream",
+    dependencies=[Depends(require_api_key), Depends(check_rate_limit)],
+)
+async def chat_stream(request: ChatRequest, raw_request: Request):
+    """
+    与 Aura 对话（SSE 流式）：依次推送 route / tool_start / tool_end / token 事件，最后是 done 或 error。
+    客户端断开时停止生成。
+    """
+    try:
+        clean_query = sanitize_query(request.query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    audit_log(
+        "chat_stream_request",
+        mask_pii(clean_query[:120]),
+        client_ip=raw_request.client.host,
+    )
+    session_id = request.session_id or uuid.uuid4().hex
+    agent = await run_in_threadpool(get_agent)
+
+    async def events():
+        async for item in agent.astream_query(clean_query, session_id):
+            yield sse_event(item["event"], item["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id},
+    )
 
 
 @app.post(
@@ -221,8 +339,8 @@ async def add_knowledge(request: KnowledgeRequest, raw_request: Request):
             "knowledge_add", safe_path,
             client_ip=raw_request.client.host,
         )
-        agent = get_agent()
-        agent.rag_system.add_documents(safe_path)
+        agent = await run_in_threadpool(get_agent)
+        await run_in_threadpool(agent.rag_system.add_documents, safe_path)
         return {"success": True, "message": f"已添加: {safe_path}"}
     except (ValueError, PermissionError) as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -239,28 +357,52 @@ async def search_knowledge(
     query: str,
     top_k: int = Field(default=3, ge=1, le=20),
     hybrid: bool = True,
+    source: Optional[List[str]] = Query(default=None, description="来源文件名或完整路径，可重复"),
+    extension: Optional[List[str]] = Query(default=None, description="扩展名，如 pdf / .md，可重复"),
+    ingested_after: Optional[str] = Query(default=None, description="导入时间下限（epoch 秒或 ISO 8601）"),
+    ingested_before: Optional[str] = Query(default=None, description="导入时间上限（epoch 秒或 ISO 8601）"),
+    budget_ms: Optional[float] = Query(default=None, gt=0, description="延迟预算（毫秒），超出时降级并在 pipeline 中说明"),
     raw_request: Request = None,
 ):
-    """搜索知识库（支持多路召回）"""
+    """搜索知识库（支持多路召回，过滤条件下推到向量库和 BM25）"""
     try:
         clean_query = sanitize_query(query)
-        agent = get_agent()
-        if hybrid:
-            results = agent.rag_system.hybrid_search(
-                clean_query, k=top_k, use_rerank=True
+        filters = SearchFilter.from_params(
+            sources=source, extensions=extension,
+            ingested_after=ingested_after, ingested_before=ingested_before,
+        ) or None
+        agent = await run_in_threadpool(get_agent)
+        # 检索在 RAGSystem 的专用线程池中执行（两路召回并发），并发请求可在重排序阶段合并成一个批次；
+        # 客户端断开时取消剩余阶段
+        pipeline = None
+        if hybrid and budget_ms is not None:
+            search = agent.rag_system.asearch_with_budget(
+                clean_query, budget_ms, k=top_k, use_rerank=True, filters=filters
             )
+            results, pipeline = await cancel_on_disconnect(raw_request, search)
         else:
-            results = agent.rag_system.search(clean_query, k=top_k)
+            if hybrid:
+                search = agent.rag_system.ahybrid_search(clean_query, k=top_k, use_rerank=True, filters=filters)
+            else:
+                search = agent.rag_system.asearch(clean_query, k=top_k, filters=filters)
+            results = await cancel_on_disconnect(raw_request, search)
 
         result_list = [
             {"content": doc.page_content, "metadata": doc.metadata}
             for doc in results
         ]
-        return {
+        response = {
             "success": True,
             "results": result_list,
             "mode": "hybrid" if hybrid else "vector",
         }
+        if pipeline is not None:
+            response["pipeline"] = pipeline
+        return response
+    except asyncio.CancelledError:
+        # 继续向上传播，让服务器按取消处理（客户端已断开，无需响应）
+        logger.info("knowledge/search 客户端已断开，检索已取消")
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -268,6 +410,67 @@ async def search_knowledge(
         raise HTTPException(status_code=500, detail="内部错误")
 
 
+@app.get(
+    "/knowledge/stats",
+    dependencies=[Depends(require_api_key), Depends(check_rate_limit)],
+)
+async def knowledge_stats():
+    """检索缓存 / 嵌入缓存 / LLM 响应缓存命中统计，以及会话池状态"""
+    try:
+        agent = await run_in_threadpool(get_agent)
+        return {
+            "success": True,
+            "stats": agent.rag_system.cache_stats(),
+            "sessions": agent.sessions.stats(),
+            "llm_cache": agent.llm_cache.stats() if agent.llm_cache is not None else None,
+        }
+    except Exception as e:
+        logger.error("knowledge/stats 异常: %s", e)
+        raise HTTPException(status_code=500, detail="内部错误")
+
+
+@app.post(
+    "/knowledge/delete",
+    dependencies=[Depends(require_api_key), Depends(check_rate_limit)],
+)
+async def delete_knowledge(request: KnowledgeRequest, raw_request: Request):
+    """按来源删除文档（文件或目录，路径限制在 data/ 目录）"""
+    try:
+        safe_path = validate_file_path(request.file_path)
+        audit_log(
+            "knowledge_delete", safe_path,
+            client_ip=raw_request.client.host,
+        )
+        agent = await run_in_threadpool(get_agent)
+        result = await run_in_threadpool(agent.rag_system.delete_source, safe_path)
+        if not result["files"]:
+            raise HTTPException(status_code=404, detail=f"知识库中没有该来源: {safe_path}")
+        return {"success": True, **result}
+    except HTTPException:
+        raise
+    except (ValueError, PermissionError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("knowledge/delete 异常: %s", e)
+        raise HTTPException(status_code=500, detail="内部错误")
+
+
+@app.post(
+    "/knowledge/compact",
+    dependencies=[Depends(require_api_key), Depends(check_rate_limit)],
+)
+async def compact_knowledge(raw_request: Request):
+    """压缩知识库持久化目录，回收删除留下的空间"""
+    try:
+        audit_log("knowledge_compact", "压缩知识库", client_ip=raw_request.client.host)
+        agent = await run_in_threadpool(get_agent)
+        result = await run_in_threadpool(agent.rag_system.compact)
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error("knowledge/compact 异常: %s", e)
+        raise HTTPException(status_code=500, detail="内部错误")
+
+
 # ---------------------------------------------------------------------------
 # 入口
 # ---------------------------------------------------------------------------
@@ -4,7 +4,10 @@ Aura AI - 完整 ReAct Agent 版本
 """
 
 import os
+import asyncio
 import logging
+import threading
+import time
 
 try:
     from langchain_classic.agents import AgentExecutor, create_react_agent
@@ -13,13 +16,19 @@ except ImportError:
     from langchain.agents import AgentExecutor, create_react_agent
     from langchain.memory import ConversationBufferWindowMemory
 
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.tools import Tool
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 
 from rag import RAGSystem
 from memory import LongTermMemory
-from tracing import Tracer
+from tracing import Tracer, trace_llm_call
+from fast_router import FastRouter, RouteClassifier
+from llm_cache import LLMCache, cached_invoke
+from sessions import SessionPool
+from startup import timeline
 import tools as tool_functions
 
 # ── Adaptive RAG 路由 ────────────────────────────────────
@@ -35,28 +44,141 @@ Route:"""
 
 
 class QueryRouter:
-    """Adaptive RAG: 根据查询意图选择检索/工具/直接回答"""
+    """Adaptive RAG: 根据查询意图选择检索/工具/直接回答；传入 cache 时相同查询复用上次的 LLM 输出"""
 
-    def __init__(self, llm):
+    def __init__(self, llm, callbacks: list | None = None, cache: LLMCache | None = None):
+        self.llm = llm
         self.chain = ROUTE_PROMPT | llm
+        self.callbacks = callbacks
+        self.cache = cache
+
+    @staticmethod
+    def _parse(text: str) -> str | None:
+        text = text.strip().upper()
+        for r in ("RETRIEVE", "TOOL", "DIRECT"):
+            if r in text:
+                return r
+        return None
 
     def route(self, query: str) -> str:
+        def call():
+            if self.callbacks:
+                return self.chain.invoke({"query": query}, config={"callbacks": self.callbacks, "tags": ["router"]})
+            return self.chain.invoke({"query": query})
+
         try:
-            raw = self.chain.invoke({"query": query})
-            text = raw.content if hasattr(raw, "content") else str(raw)
-            text = text.strip().upper()
-            for r in ("RETRIEVE", "TOOL", "DIRECT"):
-                if r in text:
-                    return r
+            text = cached_invoke(self.cache, self.llm, ROUTE_PROMPT.format(query=query), "router", call=call,
+                                 validate=lambda t: self._parse(t) is not None)
+            route = self._parse(text)
+            if route:
+                return route
         except Exception:
             pass
         return "RETRIEVE"  # 默认走检索（安全兜底）
 
 
-def _build_llm(model_name: str, api_key: str | None = None, base_url: str | None = None):
+# 本地路由分类器的训练数据：只取评测数据集的 rag_tests（fast_router.TRAIN_SPLITS），
+# agent_tests 由 run_evaluation 评测工具选择，训练时排除以免准确率虚高
+ROUTER_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation", "test_dataset.json")
+
+# 快速路径：DIRECT 一次 LLM 调用；RETRIEVE 一次检索 + 一次基于检索结果的生成。都不带工具描述
+DIRECT_PROMPT = PromptTemplate.from_template("""你是 Aura，一个智能助手。请直接回答用户的问题。
+
+对话历史:
+{chat_history}
+
+Question: {input}
+Answer:""")
+
+GROUNDED_PROMPT = PromptTemplate.from_template("""你是 Aura，一个智能助手。请只根据下面的知识库内容回答问题，
+在用到的内容后用 [编号] 标注来源；知识库内容不足以回答时如实说明。
+
+知识库内容:
+{context}
+
+对话历史:
+{chat_history}
+
+Question: {input}
+Answer:""")
+
+
+def llm_usage(result) -> tuple[int | None, int | None]:
+    """
+    从 LLMResult 中取 (prompt_tokens, completion_tokens)：
+    OpenAI 兼容接口在 llm_output["token_usage"]，聊天模型在 message.usage_metadata，
+    Ollama 在 generation_info 的 prompt_eval_count / eval_count；后端未返回时为 None
+    """
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    prompt = completion = None
+    for generations in result.generations:
+        for gen in generations:
+            meta = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if meta:
+                p, c = meta.get("input_tokens"), meta.get("output_tokens")
+            else:
+                info = gen.generation_info or {}
+                p, c = info.get("prompt_eval_count"), info.get("eval_count")
+            if p is not None:
+                prompt = (prompt or 0) + p
+            if c is not None:
+                completion = (completion or 0) + c
+    return prompt, completion
+
+
+class FinalAnswerFilter:
+    """
+    流式 ReAct 输出过滤：每次 LLM 调用的文本先缓存，出现 "Final Answer:" 之后的片段才放行，
+    Thought / Action 等中间内容不推给用户
+    """
+
+    MARKER = "Final Answer:"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._buffer = ""
+        self._open = False
+
+    def feed(self, text: str) -> str:
+        if self._open:
+            return text
+        self._buffer += text
+        pos = self._buffer.find(self.MARKER)
+        if pos < 0:
+            return ""
+        self._open = True
+        return self._buffer[pos + len(self.MARKER):].lstrip()
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """把每次 LLM 调用的耗时与 token 数写入当前 trace；调用名取 config 中的第一个 tag"""
+
+    def __init__(self):
+        self._starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), tags[0] if tags else "llm")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, tags=tags)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, name = self._starts.pop(run_id, (time.perf_counter(), "llm"))
+        trace_llm_call(name, (time.perf_counter() - start) * 1000, *llm_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+
+
+def _build_llm(model_name: str, api_key: str | None = None, base_url: str | None = None,
+               temperature: float = 0.3):
     """
     构建 LLM 实例。
-    - 有 api_key → 走 OpenAI 兼容 API（DeepSeek / 智谱 等）
+    - 有 api_key → 走 OpenAI 兼容 API（DeepSeek / 智谱 等），temperature 只作用于这一路
     - 否则 → 走本地 Ollama
     """
     if api_key:
@@ -65,7 +187,7 @@ def _build_llm(model_name: str, api_key: str | None = None, base_url: str | None
             model=model_name,
             openai_api_key=api_key,
             openai_api_base=base_url or "https://api.deepseek.com",
-            temperature=0.3,
+            temperature=temperature,
             max_tokens=1024,
         )
     return Ollama(
@@ -104,56 +226,133 @@ Question: {input}
 {agent_scratchpad}""")
 
 
+class AgentSession:
+    """单个会话的轻量状态：对话窗口记忆 + 绑定该记忆的 AgentExecutor；同一会话的请求由 lock 串行化"""
+
+    def __init__(self, session_id: str, conversation_memory, agent_executor):
+        self.session_id = session_id
+        self.conversation_memory = conversation_memory
+        self.agent_executor = agent_executor
+        self.last_intermediate_steps = []
+        self.lock = threading.Lock()
+
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    async def acquire_async(self):
+        """
+        在线程中等待会话锁（lock 与同步路径共用）。
+        等待期间被取消（如 SSE 客户端断开）时，后台线程稍后仍会拿到锁，由回调立即释放，避免会话永久锁死
+        """
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire))
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            def release(future):
+                if not future.cancelled() and future.exception() is None:
+                    self.lock.release()
+            waiter.add_done_callback(release)
+            raise
+
+
 class AuraReActAgent:
-    """完整 ReAct Agent 版本"""
+    """
+    完整 ReAct Agent 版本
+
+    LLM 客户端、RAGSystem、工具、路由器和 ReAct agent 由所有会话共享；
+    每个 session_id 在 sessions 池中有独立的对话记忆和 AgentExecutor，不同会话的请求可并行执行。
+    未指定 session_id 时使用 default_session（CLI / 评测）。
+    """
     
     def __init__(self, model_name="qwen2.5:7b", enable_reranker=True,
-                 api_key: str | None = None, base_url: str | None = None):
+                 api_key: str | None = None, base_url: str | None = None,
+                 search_budget_ms: float | None = None, router: str = "local",
+                 max_sessions: int = 256, session_idle_ttl: float | None = 1800.0,
+                 llm_cache: bool = True):
         logger.info("初始化 ReAct Agent...")
         
-        self.llm = _build_llm(model_name, api_key=api_key, base_url=base_url)
+        # search_knowledge 工具的检索延迟预算（毫秒）；未指定时读取 AURA_SEARCH_BUDGET_MS，均未设置则不限
+        if search_budget_ms is None and os.environ.get("AURA_SEARCH_BUDGET_MS"):
+            search_budget_ms = float(os.environ["AURA_SEARCH_BUDGET_MS"])
+        self.search_budget_ms = search_budget_ms
+        
+        with timeline.track("llm"):
+            self.llm = _build_llm(model_name, api_key=api_key, base_url=base_url)
         
         self.long_term_memory = LongTermMemory()
-        self.conversation_memory = ConversationBufferWindowMemory(
-            k=5,
-            memory_key="chat_history",
-            return_messages=False,
-        )
         
         self.rag_system = RAGSystem(
             persist_directory="db",
             enable_reranker=enable_reranker,
         )
         
-        # 可观测性
+        # 可观测性：usage_handler 记录每次 LLM 调用的耗时与 token
         self.tracer = Tracer()
-
-        # Adaptive RAG 路由器
-        self.router = QueryRouter(self.llm)
-
-        # 工具
-        self.tools = self._create_tools()
+        self.usage_handler = TokenUsageHandler()
+
+        # 确定性 LLM 调用（路由等）的响应缓存，与嵌入缓存一起放在 db 目录；AURA_LLM_CACHE=0 关闭
+        self.llm_cache = None
+        if llm_cache and os.environ.get("AURA_LLM_CACHE", "1") != "0":
+            os.makedirs(self.rag_system.persist_directory, exist_ok=True)
+            self.llm_cache = LLMCache(os.path.join(self.rag_system.persist_directory, "llm_cache.sqlite"))
+
+        # Adaptive RAG 路由器：local 为本地分类器优先、低置信度时回退 LLM；llm 为每次都调用 LLM
+        # 路由输出需可缓存：API 模型对话用 temperature=0.3，路由单独用 temperature=0 的实例
+        router_llm = _build_llm(model_name, api_key=api_key, base_url=base_url, temperature=0) if api_key else self.llm
+        llm_router = QueryRouter(router_llm, callbacks=[self.usage_handler], cache=self.llm_cache)
+        if router == "local":
+            self.router = FastRouter(RouteClassifier.from_dataset(ROUTER_DATASET), fallback=llm_router)
+        elif router == "llm":
+            self.router = llm_router
+        else:
+            raise ValueError(f"未知路由器: {router}，可选: local, llm")
+
+        with timeline.track("agent"):
+            # 工具
+            self.tools = self._create_tools()
         
-        # 创建 ReAct Agent
-        self.agent = create_react_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=REACT_PROMPT
-        )
+            # 创建 ReAct Agent
+            self.agent = create_react_agent(
+                llm=self.llm,
+                tools=self.tools,
+                prompt=REACT_PROMPT
+            )
+        
+            # 会话（对话记忆 + Agent Executor）
+            self.sessions = SessionPool(self._new_session, max_sessions=max_sessions, idle_ttl=session_idle_ttl,
+                                        busy=AgentSession.busy)
+            self.default_session = self._new_session("default")
         
-        # Agent Executor
-        self.agent_executor = AgentExecutor(
+        logger.info("ReAct Agent 初始化完成")
+    
+    def _new_session(self, session_id: str) -> AgentSession:
+        conversation_memory = ConversationBufferWindowMemory(
+            k=5,
+            memory_key="chat_history",
+            return_messages=False,
+        )
+        agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            memory=self.conversation_memory,
+            memory=conversation_memory,
             verbose=True,
             handle_parsing_errors=True,
             max_iterations=5,
             early_stopping_method="force",
             return_intermediate_steps=True,
         )
-        
-        logger.info("ReAct Agent 初始化完成")
+        return AgentSession(session_id, conversation_memory, agent_executor)
+    
+    def session(self, session_id: str | None = None) -> AgentSession:
+        return self.default_session if session_id is None else self.sessions.get(session_id)
+    
+    @property
+    def conversation_memory(self):
+        return self.default_session.conversation_memory
+    
+    @property
+    def agent_executor(self):
+        return self.default_session.agent_executor
     
     def _create_tools(self):
         """创建工具"""
@@ -193,19 +392,29 @@ class AuraReActAgent:
     def _search_knowledge(self, query: str) -> str:
         """搜索知识库（多路召回 + 重排序 + Citation 溯源）"""
         try:
-            cited = self.rag_system.hybrid_search_with_sources(query, k=3, use_rerank=True)
+            cited = self._cite(query)
         except AttributeError:
             results = self.rag_system.search(query, k=3)
             if results:
                 return "\n".join([doc.page_content[:200] for doc in results])
             return "知识库中没有找到相关信息"
-
+        return self._format_citations(cited)
+    
+    def _cite(self, query: str) -> list[dict]:
+        return self.rag_system.hybrid_search_with_sources(
+            query, k=3, use_rerank=True, budget_ms=self.search_budget_ms
+        )
+    
+    @staticmethod
+    def _format_citations(cited: list[dict], max_chars: int = 200) -> str:
         if not cited:
             return "知识库中没有找到相关信息"
-
         parts = []
         for item in cited:
-            parts.append(f"[{item['index']}] {item['content'][:200]}\n    —— 来源: {item['source']}")
+            source = item['source']
+            if item.get('heading_path'):
+                source = f"{source} · {item['heading_path']}"
+            parts.append(f"[{item['index']}] {item['content'][:max_chars]}\n    —— 来源: {source}")
         return "\n\n".join(parts)
     
     def _remember(self, fact: str) -> str:
@@ -247,40 +456,206 @@ class AuraReActAgent:
         except Exception as e:
             return f"回忆失败: {e}"
     
-    def process_query(self, query: str) -> str:
-        """处理查询"""
+    def _route(self, query: str, trace: dict) -> str:
+        """路由决策并写入 trace（FastRouter 额外记录决策来源与耗时）"""
+        if hasattr(self.router, "decide"):
+            decision = self.router.decide(query)
+            self.tracer.add_event(trace, "route", {
+                "route": decision.route, "source": decision.source,
+                "confidence": decision.confidence, "ms": decision.ms,
+            })
+            return decision.route
+        route = self.router.route(query)
+        self.tracer.add_event(trace, "route", {"route": route})
+        return route
+    
+    def _llm_config(self, name: str) -> dict:
+        return {"callbacks": [self.usage_handler], "tags": [name]}
+    
+    def _generate(self, session: AgentSession, name: str, prompt, query: str, **variables) -> str:
+        """带会话对话历史的单次 LLM 调用，并写回对话记忆"""
+        history = session.conversation_memory.load_memory_variables({}).get("chat_history", "")
+        raw = (prompt | self.llm).invoke(
+            {"input": query, "chat_history": history, **variables}, config=self._llm_config(name)
+        )
+        response = (raw.content if hasattr(raw, "content") else str(raw)).strip()
+        session.conversation_memory.save_context({"input": query}, {"output": response})
+        return response
+    
+    async def _astream_generate(self, session: AgentSession, name: str, prompt, query: str, **variables):
+        """_generate 的流式版本：逐段产出文本，结束后写回对话记忆"""
+        history = session.conversation_memory.load_memory_variables({}).get("chat_history", "")
+        parts = []
+        async for chunk in (prompt | self.llm).astream(
+            {"input": query, "chat_history": history, **variables}, config=self._llm_config(name)
+        ):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        session.conversation_memory.save_context({"input": query}, {"output": "".join(parts).strip()})
+    
+    async def _astream_react(self, session: AgentSession, query: str):
+        """
+        ReAct 的流式版本（astream_events）：工具调用产出 tool_start / tool_end，
+        最终回答经 FinalAnswerFilter 逐段产出 token；没有流出任何片段时用最终输出补发一次
+        """
+        answer = FinalAnswerFilter()
+        streamed = False
+        output = None
+        async for event in session.agent_executor.astream_events(
+            {"input": query}, config=self._llm_config("react"), version="v2"
+        ):
+            kind = event["event"]
+            if kind in ("on_chat_model_start", "on_llm_start"):
+                answer.reset()
+            elif kind in ("on_chat_model_stream", "on_llm_stream"):
+                chunk = event["data"]["chunk"]
+                text = answer.feed(chunk.content if hasattr(chunk, "content") else getattr(chunk, "text", str(chunk)))
+                if text:
+                    streamed = True
+                    yield {"event": "token", "data": {"text": text}}
+            elif kind == "on_tool_start":
+                yield {"event": "tool_start", "data": {"tool": event["name"], "input": str(event["data"].get("input", ""))}}
+            elif kind == "on_tool_end":
+                yield {"event": "tool_end", "data": {"tool": event["name"], "output": str(event["data"].get("output", ""))[:200]}}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = (event["data"].get("output") or {}).get("output")
+        output = output or "抱歉，我无法回答这个问题"
+        if not streamed:
+            yield {"event": "token", "data": {"text": output}}
+        yield {"event": "output", "data": {"text": output}}
+    
+    async def astream_query(self, query: str, session_id: str | None = None):
+        """
+        流式处理查询（SSE /chat/stream 使用），依次产出事件 {"event": ..., "data": {...}}：
+        route → tool_start / tool_end（RETRIEVE 的检索或 ReAct 的工具调用）→ token（最终回答片段）→ done
+        执行路径与 process_query 相同，只是回答边生成边返回；出错时产出 error。
+        同一会话的请求排队执行，直到生成器结束（含客户端断开）才释放会话
+        """
+        session = self.session(session_id)
+        await session.acquire_async()
+        try:
+            async for event in self._astream_query(session, query, session_id):
+                yield event
+        finally:
+            session.lock.release()
+    
+    async def _astream_query(self, session: AgentSession, query: str, session_id: str | None):
         trace = self.tracer.start_trace(query)
+        tools_used, parts = [], []
         try:
-            route = self.router.route(query)
-            self.tracer.add_event(trace, "route", {"route": route})
-
-            result = self.agent_executor.invoke({"input": query})
-            response = result.get("output", "抱歉，我无法回答这个问题")
+            route = await asyncio.to_thread(self._route, query, trace)
+            yield {"event": "route", "data": {"route": route}}
             
-            self.long_term_memory.add_conversation(query, response)
-            self._last_intermediate_steps = result.get("intermediate_steps", [])
-
-            tools_used = self.get_last_tools_used()
-            self.tracer.end_trace(trace, response, route=route, tools_used=tools_used)
-
-            return response
+            if route == "RETRIEVE":
+                tools_used.append("search_knowledge")
+                yield {"event": "tool_start", "data": {"tool": "search_knowledge", "input": query}}
+                cited = await asyncio.to_thread(self._cite, query)
+                self.tracer.add_event(trace, "retrieve", {"hits": len(cited)})
+                yield {"event": "tool_end", "data": {"tool": "search_knowledge", "output": self._format_citations(cited)}}
+            
+            generation = None
+            if route == "DIRECT":
+                generation = self._astream_generate(session, "direct", DIRECT_PROMPT, query)
+            elif route == "RETRIEVE":
+                if cited:
+                    context = self._format_citations(cited, max_chars=800)
+                    generation = self._astream_generate(session, "grounded", GROUNDED_PROMPT, query, context=context)
+                else:
+                    tools_used.clear()
+                    self.tracer.add_event(trace, "fallback", {"from": "RETRIEVE", "to": "react"})
+            
+            if generation is not None:
+                async for text in generation:
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+            else:
+                async for event in self._astream_react(session, query):
+                    if event["event"] == "output":
+                        parts = [event["data"]["text"]]
+                        continue
+                    if event["event"] == "tool_start":
+                        tools_used.append(event["data"]["tool"])
+                    yield event
+            
+            response = "".join(parts).strip()
+            self.long_term_memory.add_conversation(query, response, session_id=session_id)
+            finished = self.tracer.end_trace(trace, response, route=route, tools_used=tools_used)
+            yield {"event": "done", "data": {
+                "response": response, "route": route, "tools_used": tools_used,
+                "trace_id": finished["trace_id"], "latency_ms": finished["latency_ms"],
+                "tokens": finished["tokens"],
+            }}
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开：记录已生成的部分后继续向上抛出
+            self.tracer.end_trace(trace, "".join(parts), route="CANCELLED", tools_used=tools_used)
+            raise
         except Exception as e:
-            logger.error(f"处理出错: {e}")
-            self._last_intermediate_steps = []
+            logger.error(f"流式处理出错: {e}")
             self.tracer.end_trace(trace, str(e), route="ERROR")
-            return f"抱歉，出错了: {e}"
+            yield {"event": "error", "data": {"error": str(e)}}
+    
+    def _run_route(self, session: AgentSession, query: str, route: str, trace: dict) -> tuple[str, list]:
+        """
+        按路由执行，返回 (回答, intermediate_steps)：
+        - DIRECT：一次 LLM 调用，不带工具描述
+        - RETRIEVE：一次 hybrid_search_with_sources + 一次基于检索结果的生成；知识库没有结果时回退 ReAct
+        - TOOL：完整 ReAct
+        RETRIEVE 快速路径把检索补记为 (AgentAction, observation)，工具统计与 ReAct 路径一致
+        """
+        if route == "DIRECT":
+            return self._generate(session, "direct", DIRECT_PROMPT, query), []
+        if route == "RETRIEVE":
+            start = time.perf_counter()
+            cited = self._cite(query)
+            self.tracer.add_event(trace, "retrieve", {
+                "hits": len(cited), "ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+            if cited:
+                steps = [(AgentAction("search_knowledge", query, ""), self._format_citations(cited))]
+                context = self._format_citations(cited, max_chars=800)
+                return self._generate(session, "grounded", GROUNDED_PROMPT, query, context=context), steps
+            self.tracer.add_event(trace, "fallback", {"from": "RETRIEVE", "to": "react"})
+        result = session.agent_executor.invoke({"input": query}, config=self._llm_config("react"))
+        return result.get("output", "抱歉，我无法回答这个问题"), result.get("intermediate_steps", [])
     
-    def process_query_with_info(self, query: str) -> dict:
+    def process_query(self, query: str, session_id: str | None = None) -> str:
+        """处理查询（同一会话的请求串行执行，不同会话可并行）"""
+        session = self.session(session_id)
+        with session.lock:
+            trace = self.tracer.start_trace(query)
+            try:
+                route = self._route(query, trace)
+                response, steps = self._run_route(session, query, route, trace)
+                
+                self.long_term_memory.add_conversation(query, response, session_id=session_id)
+                session.last_intermediate_steps = steps
+
+                tools_used = self.get_last_tools_used(session_id)
+                self.tracer.end_trace(trace, response, route=route, tools_used=tools_used)
+
+                return response
+            except Exception as e:
+                logger.error(f"处理出错: {e}")
+                session.last_intermediate_steps = []
+                self.tracer.end_trace(trace, str(e), route="ERROR")
+                return f"抱歉，出错了: {e}"
+    
+    def process_query_with_info(self, query: str, session_id: str | None = None) -> dict:
         """处理查询并返回详细信息（含路由决策 + tracing，用于评估）"""
+        session = self.session(session_id)
+        with session.lock:
+            return self._process_with_info(session, query, session_id)
+    
+    def _process_with_info(self, session: AgentSession, query: str, session_id: str | None) -> dict:
         trace = self.tracer.start_trace(query)
         try:
-            route = self.router.route(query)
-            self.tracer.add_event(trace, "route", {"route": route})
+            route = self._route(query, trace)
             logger.info(f"Adaptive RAG route: {query[:40]}... → {route}")
 
-            result = self.agent_executor.invoke({"input": query})
-            response = result.get("output", "抱歉，我无法回答这个问题")
-            intermediate_steps = result.get("intermediate_steps", [])
+            response, intermediate_steps = self._run_route(session, query, route, trace)
+            session.last_intermediate_steps = intermediate_steps
             
             tools_used = []
             tool_outputs = []
@@ -291,7 +666,7 @@ class AuraReActAgent:
                     tools_used.append(action.tool)
                     tool_outputs.append(str(output)[:200])
             
-            self.long_term_memory.add_conversation(query, response)
+            self.long_term_memory.add_conversation(query, response, session_id=session_id)
 
             self.tracer.add_event(trace, "agent_done", {"tools": tools_used})
             finished = self.tracer.end_trace(trace, response, route=route, tools_used=tools_used)
@@ -304,6 +679,7 @@ class AuraReActAgent:
                 "intermediate_steps": intermediate_steps,
                 "trace_id": finished["trace_id"],
                 "latency_ms": finished["latency_ms"],
+                "tokens": finished["tokens"],
             }
         except Exception as e:
             logger.error(f"处理出错: {e}")
@@ -316,10 +692,10 @@ class AuraReActAgent:
                 "error": str(e),
             }
     
-    def get_last_tools_used(self) -> list:
-        """获取上次调用使用的工具列表"""
+    def get_last_tools_used(self, session_id: str | None = None) -> list:
+        """获取该会话上次调用使用的工具列表"""
         tools = []
-        for step in getattr(self, '_last_intermediate_steps', []):
+        for step in self.session(session_id).last_intermediate_steps:
             if len(step) >= 1:
                 tools.append(step[0].tool)
         return tools
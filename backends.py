@@ -0,0 +1,86 @@
+"""
+Aura CPU 推理后端
+- torch：默认，sentence-transformers 原生 PyTorch 推理
+- onnx：ONNX Runtime（首次使用时由 sentence-transformers 自动导出）
+- onnx-int8：ONNX + 动态 int8 量化，量化模型导出到 models/ 目录后复用
+
+嵌入模型（m3e-base）与重排序模型（MiniLM CrossEncoder）共用同一套选择逻辑。
+需要 sentence-transformers>=4.1 与 optimum[onnxruntime]。
+"""
+
+import logging
+import os
+
+try:
+    import onnxruntime  # noqa: F401
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger("AuraBackends")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+MODELS_DIR = "models"
+QUANTIZATION_CONFIG = "avx2"
+QUANTIZED_FILE = f"onnx/model_qint8_{QUANTIZATION_CONFIG}.onnx"
+
+
+def resolve_backend(backend: str) -> str:
+    """校验后端名称；ONNX 依赖缺失时回退到 torch"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知推理后端: {backend}，可选: {', '.join(BACKENDS)}")
+    if backend != "torch" and not ONNX_AVAILABLE:
+        logger.warning("未安装 onnxruntime / optimum，推理后端 %s 回退为 torch", backend)
+        return "torch"
+    return backend
+
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """嵌入缓存使用的模型名：量化模型的向量与原模型不同，不能共用缓存"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def quantized_model_dir(model_name: str, models_dir: str = MODELS_DIR) -> str:
+    return os.path.join(models_dir, model_name.replace("/", "__") + "-onnx-int8")
+
+
+def _export_quantized(model_cls, model_name: str, models_dir: str, **kwargs) -> str:
+    """把模型导出为 ONNX 并做动态 int8 量化，已存在则直接返回目录"""
+    target = quantized_model_dir(model_name, models_dir)
+    if os.path.exists(os.path.join(target, QUANTIZED_FILE)):
+        return target
+    logger.info("导出 int8 量化模型: %s → %s", model_name, target)
+    model = model_cls(model_name, backend="onnx", **kwargs)
+    model.save_pretrained(target)
+    export_dynamic_quantized_onnx_model(model, QUANTIZATION_CONFIG, target)
+    return target
+
+
+def embedding_model_args(model_name: str, backend: str, device: str = "cpu",
+                         models_dir: str = MODELS_DIR) -> tuple[str, dict]:
+    """返回 (模型路径, model_kwargs)，直接传给 HuggingFaceEmbeddings"""
+    backend = resolve_backend(backend)
+    if backend == "torch":
+        return model_name, {"device": device}
+    if backend == "onnx":
+        return model_name, {"device": device, "backend": "onnx"}
+    from sentence_transformers import SentenceTransformer
+
+    path = _export_quantized(SentenceTransformer, model_name, models_dir, device=device)
+    return path, {"device": device, "backend": "onnx", "model_kwargs": {"file_name": QUANTIZED_FILE}}
+
+
+def load_cross_encoder(model_name: str, backend: str, max_length: int = 512,
+                       models_dir: str = MODELS_DIR):
+    """按后端加载 CrossEncoder"""
+    from sentence_transformers import CrossEncoder
+
+    backend = resolve_backend(backend)
+    if backend == "torch":
+        return CrossEncoder(model_name, max_length=max_length)
+    if backend == "onnx":
+        return CrossEncoder(model_name, max_length=max_length, backend="onnx")
+    path = _export_quantized(CrossEncoder, model_name, models_dir, max_length=max_length)
+    return CrossEncoder(path, max_length=max_length, backend="onnx",
+                        model_kwargs={"file_name": QUANTIZED_FILE})
@@ -0,0 +1,461 @@
+"""
+Aura 增量 BM25 倒排索引
+- 倒排表 postings: term -> {chunk_id: tf}，df 即倒排表长度
+- 文档长度 / 总长度随 add / remove 增量维护，单个 chunk 的增删代价为 O(chunk 长度)
+- 替代每次 add_documents 都用 BM25Retriever.from_documents 全量重建
+- 可选持久化：磁盘快照（mmap 的 uint32 倒排/正排表，按词项惰性解码）+ 追加写日志
+- 可插拔分词：whitespace / 中文字 bigram / jieba 词典分词（可选依赖），按 chunk 缓存
+"""
+
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import uuid
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Collection, Iterable
+
+logger = logging.getLogger("AuraBM25")
+
+# 可选：jieba 词典分词
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+JOURNAL_FILE = "journal.jsonl"
+
+
+# ---------------------------------------------------------------------------
+# 分词
+# ---------------------------------------------------------------------------
+
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_CJK_RUN = re.compile(f"[{_CJK_CHARS}]+")
+_TOKEN_RUN = re.compile(f"[{_CJK_CHARS}]+|[a-z0-9_]+")
+
+
+def whitespace_tokenize(text: str) -> list[str]:
+    """按空白切分（与 BM25Retriever 默认预处理一致）"""
+    return text.split()
+
+
+def bigram_tokenize(text: str) -> list[str]:
+    """中文连续片段切成字 bigram（单字片段保留单字），英文/数字按词切分并小写"""
+    tokens = []
+    for run in _TOKEN_RUN.findall(text.lower()):
+        if _CJK_RUN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def jieba_tokenize(text: str) -> list[str]:
+    """jieba 搜索引擎模式分词，丢弃标点与空白"""
+    return [
+        token for token in jieba.lcut_for_search(text.lower())
+        if _TOKEN_RUN.fullmatch(token)
+    ]
+
+
+TOKENIZERS = {
+    "whitespace": whitespace_tokenize,
+    "bigram": bigram_tokenize,
+    "jieba": jieba_tokenize,
+}
+
+
+class Tokenizer:
+    """带名字和 LRU 缓存的分词器：同一 chunk 重复分词（重建索引、重复导入）直接命中缓存"""
+
+    def __init__(self, name: str, fn: Callable[[str], list[str]], cache_size: int = 4096):
+        self.name = name
+        self._cached = lru_cache(maxsize=cache_size)(lambda text: tuple(fn(text)))
+
+    def __call__(self, text: str) -> tuple[str, ...]:
+        return self._cached(text)
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+def get_tokenizer(name: str, cache_size: int = 4096) -> Tokenizer:
+    """按名字获取分词器；jieba 未安装时回退到 bigram"""
+    if name not in TOKENIZERS:
+        raise ValueError(f"未知分词器: {name}（可选: {', '.join(TOKENIZERS)}）")
+    if name == "jieba" and not JIEBA_AVAILABLE:
+        logger.warning("未安装 jieba，BM25 分词回退到 bigram")
+        name = "bigram"
+    return Tokenizer(name, TOKENIZERS[name], cache_size=cache_size)
+
+
+class _Segment:
+    """
+    只读磁盘快照。postings 文件是一个 uint32 数组：
+    [term_offsets(T+1)] [doc_offsets(D+1)] [倒排 (doc_idx, tf) 对] [正排 (term_idx, tf) 对]
+    通过 mmap 访问，词项的倒排表在第一次用到时才解码，解码后即交给内存索引接管。
+    """
+
+    def __init__(self, directory: str, meta: dict):
+        if meta.get("byteorder") != sys.byteorder:
+            raise ValueError("快照字节序与当前平台不一致")
+        with open(os.path.join(directory, meta["vocab_file"]), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        self.terms: list[str] = vocab["terms"]
+        self.doc_ids: list[str] = vocab["doc_ids"]
+        self.doc_lens: list[int] = vocab["doc_lens"]
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        self.doc_index = {chunk_id: i for i, chunk_id in enumerate(self.doc_ids)}
+
+        self._file = open(os.path.join(directory, meta["postings_file"]), "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = memoryview(self._mmap).cast("I")
+        n_terms, n_docs = len(self.terms), len(self.doc_ids)
+        self._doc_offsets_base = n_terms + 1
+        self._postings_base = n_terms + n_docs + 2
+        self._forward_base = self._postings_base + 2 * self._data[n_terms]
+
+    def _pairs(self, base: int, offsets_base: int, i: int) -> list[int]:
+        start = base + 2 * self._data[offsets_base + i]
+        end = base + 2 * self._data[offsets_base + i + 1]
+        with self._data[start:end] as pairs:
+            return pairs.tolist()
+
+    def take_postings(self, term: str) -> dict[str, int] | None:
+        """解码一个词项的倒排表并从快照词表中移除（此后由内存索引维护）"""
+        i = self.term_index.pop(term, None)
+        if i is None:
+            return None
+        pairs = self._pairs(self._postings_base, 0, i)
+        return {self.doc_ids[pairs[j]]: pairs[j + 1] for j in range(0, len(pairs), 2)}
+
+    def take_doc_terms(self, chunk_id: str) -> dict[str, int] | None:
+        """解码一个文档的正排词频（删除文档时使用）"""
+        i = self.doc_index.pop(chunk_id, None)
+        if i is None:
+            return None
+        pairs = self._pairs(self._forward_base, self._doc_offsets_base, i)
+        return {self.terms[pairs[j]]: pairs[j + 1] for j in range(0, len(pairs), 2)}
+
+    def close(self):
+        self._data.release()
+        self._mmap.close()
+        self._file.close()
+
+
+class BM25Index:
+    """
+    可增量维护的 BM25 (Okapi) 索引。
+
+    idf 采用 Lucene 形式 log(1 + (N - df + 0.5) / (df + 0.5))，恒为正，
+    无需像 rank_bm25 那样用全体词项的平均 idf 做下限，因此可以增量更新。
+    """
+
+    def __init__(self, tokenizer: str | Callable[[str], list[str]] = "whitespace",
+                 k1: float = 1.5, b: float = 0.75):
+        self.tokenizer = get_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.tokenizer_name = getattr(self.tokenizer, "name", getattr(self.tokenizer, "__name__", "custom"))
+        self.k1 = k1
+        self.b = b
+        self.directory: str | None = None
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, dict[str, int]] = {}
+        self._doc_len: dict[str, int] = {}
+        self._total_len = 0
+        self._segment: _Segment | None = None
+        self._journal = None
+        self._journal_ops = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._doc_len
+
+    @property
+    def avgdl(self) -> float:
+        return self._total_len / len(self._doc_len) if self._doc_len else 0.0
+
+    def df(self, term: str) -> int:
+        with self._lock:
+            return len(self._postings_for(term) or ())
+
+    def _postings_for(self, term: str, create: bool = False) -> dict[str, int] | None:
+        postings = self._postings.get(term)
+        if postings is None and self._segment is not None:
+            postings = self._segment.take_postings(term)
+            if postings is not None:
+                self._postings[term] = postings
+        if postings is None and create:
+            postings = self._postings[term] = {}
+        return postings
+
+    # ------------------------------------------------------------------
+    # 增删
+    # ------------------------------------------------------------------
+    def add(self, chunk_id: str, text: str):
+        """添加（或覆盖）一个 chunk"""
+        self.add_many([(chunk_id, text)])
+
+    def add_many(self, items: Iterable[tuple[str, str]]):
+        """批量添加 (chunk_id, text)"""
+        prepared = [(chunk_id, dict(Counter(self.tokenizer(text)))) for chunk_id, text in items]
+        with self._lock:
+            for chunk_id, term_freqs in prepared:
+                self._apply_add(chunk_id, term_freqs)
+                self._log({"op": "add", "id": chunk_id, "tf": term_freqs})
+            self._commit()
+
+    def remove(self, chunk_id: str) -> bool:
+        """删除一个 chunk，不存在时返回 False"""
+        with self._lock:
+            if chunk_id not in self._doc_len:
+                return False
+            self._remove(chunk_id)
+            self._log({"op": "del", "id": chunk_id})
+            self._commit()
+            return True
+
+    def _apply_add(self, chunk_id: str, term_freqs: dict[str, int]):
+        if chunk_id in self._doc_len:
+            self._remove(chunk_id)
+        all_postings = self._postings
+        for term, tf in term_freqs.items():
+            postings = all_postings.get(term)
+            if postings is None:
+                postings = self._postings_for(term, create=True)
+            postings[chunk_id] = tf
+        self._doc_terms[chunk_id] = term_freqs
+        length = sum(term_freqs.values())
+        self._doc_len[chunk_id] = length
+        self._total_len += length
+
+    def _remove(self, chunk_id: str):
+        term_freqs = self._doc_terms.pop(chunk_id, None)
+        if term_freqs is None and self._segment is not None:
+            term_freqs = self._segment.take_doc_terms(chunk_id)
+        for term in term_freqs or ():
+            postings = self._postings_for(term)
+            del postings[chunk_id]
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(chunk_id)
+
+    def rebuild(self, items: Iterable[tuple[str, str]]):
+        """全量重建：清空后在内存中添加全部 (chunk_id, text)，不写日志，结束时写一次快照"""
+        with self._lock:
+            journal, self._journal = self._journal, None
+            try:
+                self.clear()
+                self.add_many(items)
+            finally:
+                self._journal = journal
+            if self.directory is not None:
+                self.save()
+
+    def clear(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int = 5,
+               candidates: Collection[str] | None = None) -> list[tuple[str, float]]:
+        """
+        返回按 BM25 分数降序的 [(chunk_id, score)]，只遍历查询词的倒排表。
+        candidates 不为 None 时只对其中的 chunk 打分（idf 仍按全库统计）：
+        候选集比倒排表小时直接按候选查表，过滤越严格查询越快。
+        """
+        query_terms = set(self.tokenizer(query))
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs or not query_terms or (candidates is not None and not candidates):
+                return []
+            avgdl = self._total_len / n_docs
+            scores: dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings_for(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                if candidates is None:
+                    matched = postings.items()
+                elif len(candidates) < df:
+                    matched = [(c, postings[c]) for c in candidates if c in postings]
+                else:
+                    matched = [(c, tf) for c, tf in postings.items() if c in candidates]
+                for chunk_id, tf in matched:
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[chunk_id] / avgdl)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    @classmethod
+    def open(cls, directory: str, **kwargs) -> "BM25Index":
+        """打开（或新建）持久化索引：映射快照 + 重放日志，此后的增删追加写入日志"""
+        index = cls(**kwargs)
+        index.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        meta_path = os.path.join(directory, META_FILE)
+        journal_path = os.path.join(directory, JOURNAL_FILE)
+        fresh = not os.path.exists(meta_path)
+        if not fresh:
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("version") != FORMAT_VERSION:
+                    raise ValueError(f"不支持的快照版本: {meta.get('version')}")
+                if meta.get("tokenizer") != index.tokenizer_name:
+                    raise ValueError(f"分词器已变更: {meta.get('tokenizer')} → {index.tokenizer_name}")
+                index._load_snapshot(meta)
+                index._replay_journal()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("BM25 快照不可用，将从空索引开始: %s", e)
+                index.clear()
+                fresh = True
+                if os.path.exists(journal_path):
+                    os.remove(journal_path)
+
+        index._journal = open(journal_path, "a", encoding="utf-8")
+        if fresh:
+            # 立即写入（空）快照，让 meta 记录分词器，日志不会与分词器脱节
+            index.save()
+        return index
+
+    def _load_snapshot(self, meta: dict):
+        segment = _Segment(self.directory, meta)
+        self._segment = segment
+        self._doc_len = dict(zip(segment.doc_ids, segment.doc_lens))
+        self._total_len = sum(segment.doc_lens)
+
+    def _replay_journal(self):
+        path = os.path.join(self.directory, JOURNAL_FILE)
+        if not os.path.exists(path):
+            return
+        valid_end = 0
+        with open(path, "rb+") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("缺少换行")
+                    entry = json.loads(line)
+                except ValueError:
+                    # 写入中途崩溃留下的半行：截掉，避免后续追加接在坏行之后
+                    logger.warning("BM25 日志末尾不完整，已截断")
+                    f.truncate(valid_end)
+                    break
+                if entry["op"] == "add":
+                    self._apply_add(entry["id"], entry["tf"])
+                elif entry["id"] in self._doc_len:
+                    self._remove(entry["id"])
+                self._journal_ops += 1
+                valid_end += len(line)
+
+    def _log(self, entry: dict):
+        if self._journal is not None:
+            self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._journal_ops += 1
+
+    def _commit(self):
+        if self._journal is None:
+            return
+        self._journal.flush()
+        # 日志超过索引规模一半时写一次完整快照，摊还后每次增删仍是 O(chunk)
+        if self._journal_ops > max(1000, len(self._doc_len) // 2):
+            self.save()
+
+    def save(self):
+        """写入完整快照并清空日志"""
+        if self.directory is None:
+            raise ValueError("索引未绑定目录，请使用 BM25Index.open()")
+        with self._lock:
+            if self._segment is not None:
+                for term in list(self._segment.term_index):
+                    self._postings_for(term)
+                for chunk_id in list(self._segment.doc_index):
+                    self._doc_terms[chunk_id] = self._segment.take_doc_terms(chunk_id)
+                self._segment.close()
+                self._segment = None
+
+            terms = list(self._postings)
+            doc_ids = list(self._doc_len)
+            term_idx = {term: i for i, term in enumerate(terms)}
+            doc_idx = {chunk_id: i for i, chunk_id in enumerate(doc_ids)}
+
+            term_offsets, postings = array("I", [0]), array("I")
+            for term in terms:
+                for chunk_id, tf in self._postings[term].items():
+                    postings.extend((doc_idx[chunk_id], tf))
+                term_offsets.append(len(postings) // 2)
+            doc_offsets, forward = array("I", [0]), array("I")
+            for chunk_id in doc_ids:
+                for term, tf in self._doc_terms[chunk_id].items():
+                    forward.extend((term_idx[term], tf))
+                doc_offsets.append(len(forward) // 2)
+
+            generation = uuid.uuid4().hex[:8]
+            meta = {
+                "version": FORMAT_VERSION,
+                "byteorder": sys.byteorder,
+                "tokenizer": self.tokenizer_name,
+                "doc_count": len(doc_ids),
+                "postings_file": f"postings-{generation}.bin",
+                "vocab_file": f"vocab-{generation}.json",
+            }
+            with open(os.path.join(self.directory, meta["postings_file"]), "wb") as f:
+                for part in (term_offsets, doc_offsets, postings, forward):
+                    part.tofile(f)
+            with open(os.path.join(self.directory, meta["vocab_file"]), "w", encoding="utf-8") as f:
+                json.dump({
+                    "terms": terms,
+                    "doc_ids": doc_ids,
+                    "doc_lens": [self._doc_len[chunk_id] for chunk_id in doc_ids],
+                }, f, ensure_ascii=False)
+            tmp_meta = os.path.join(self.directory, META_FILE + ".tmp")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, os.path.join(self.directory, META_FILE))
+
+            # 快照落盘后才截断日志；中途崩溃时重放日志是幂等的
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(os.path.join(self.directory, JOURNAL_FILE), "w", encoding="utf-8")
+            self._journal_ops = 0
+
+            for name in os.listdir(self.directory):
+                if name.startswith(("postings-", "vocab-")) and name not in (meta["postings_file"], meta["vocab_file"]):
+                    os.remove(os.path.join(self.directory, name))
+            logger.info("BM25 快照已保存: %d 文档, %d 词项", len(doc_ids), len(terms))
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
@@ -0,0 +1,66 @@
+"""
+Aura 通用内存缓存
+线程安全的 LRU（可选 TTL），带命中率统计，供嵌入 / 检索 / 重排序 / LLM 缓存复用
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存；ttl 为秒，None 表示不过期"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
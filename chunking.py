@@ -0,0 +1,204 @@
+"""
+Aura 结构感知切分
+- Markdown：按标题切成章节，块不跨越标题；heading_path 记录 "一级 > 二级 > 三级"
+- PDF：逐页切分（块不跨页），识别 "1.2 方法" / "第三章" 这类编号标题作为章节边界
+- 超长章节按段落装箱到 max_chars，仍超长的段落按句子 / 硬切；块之间不重叠
+- 其他格式交给 fallback 切分器（默认 RecursiveCharacterTextSplitter）
+
+切出的块与输入文档同类型（type(doc)(page_content=..., metadata=...)），本模块不依赖 langchain。
+"""
+
+import os
+import re
+from typing import Any, Iterable
+
+HEADING_SEPARATOR = " > "
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+# PDF 编号标题："3 方法"、"3.2.1 实验设置"、"第二章 总则"、"第3节 ..."；只在短行上识别
+_PDF_NUMBERED = re.compile(r"^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+(\S.*)$")
+# 编号后的标题须以文字开头；含数值单元格、多空格 / 制表符分列或以空格分隔多个中文词的短行视为表格行
+_TITLE_START = re.compile(r"[^\W\d_]")
+_NUMERIC_CELL = re.compile(r"[-+]?[\d.,]+%?")
+_CJK_WORD = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+_COLUMN_GAP = re.compile(r"\s{2,}|\t")
+_PDF_CHINESE = re.compile(r"^第[一二三四五六七八九十百零\d]+([章节部分篇])\s*\S*.*$")
+_SENTENCE_END = re.compile(r"(?<=[。！？；.!?;])")
+_MAX_PDF_HEADING_CHARS = 60
+
+
+def _pack(pieces: Iterable[str], max_chars: int, joiner: str = "\n\n") -> list[str]:
+    """把有序片段贪心装箱成不超过 max_chars 的块；单个片段过长时先按句子再硬切"""
+    chunks, buf = [], ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if len(piece) > max_chars:
+            if buf:
+                chunks.append(buf)
+                buf = ""
+            sentences = [s for s in _SENTENCE_END.split(piece) if s.strip()]
+            if len(sentences) > 1:
+                chunks.extend(_pack(sentences, max_chars, joiner=""))
+            else:
+                chunks.extend(piece[i:i + max_chars] for i in range(0, len(piece), max_chars))
+            continue
+        candidate = f"{buf}{joiner}{piece}" if buf else piece
+        if len(candidate) > max_chars:
+            chunks.append(buf)
+            buf = piece
+        else:
+            buf = candidate
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def markdown_sections(text: str) -> list[tuple[list[str], str]]:
+    """
+    按标题切分 Markdown，返回 [(标题路径, 章节正文含标题行)]；代码块中的 # 不算标题。
+    只有标题没有正文的章节（如紧跟子标题的父标题）并入下一个章节，不单独成块。
+    """
+    sections = []
+    path: list[tuple[int, str]] = []
+    lines: list[str] = []
+    headings_only = False
+    in_fence = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append(([title for _, title in path], body))
+
+    for line in text.splitlines():
+        if _MD_FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _MD_HEADING.match(line)
+        if match:
+            if not headings_only:
+                flush()
+                lines = []
+            headings_only = True
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level]
+            path.append((level, match.group(2).strip()))
+        elif line.strip():
+            headings_only = False
+        lines.append(line)
+    flush()
+    return sections
+
+
+def _is_heading_title(title: str) -> bool:
+    """编号标题的标题部分是否像标题而不是表格行（如 "3 张三 男 28"、"1 Apple 3.5 12%"）"""
+    cells = title.split()
+    if not _TITLE_START.match(cells[0]) or _COLUMN_GAP.search(title):
+        return False
+    if any(_NUMERIC_CELL.fullmatch(cell) for cell in cells[1:]):
+        return False
+    return not (len(cells) >= 3 and all(_CJK_WORD.fullmatch(cell) for cell in cells))
+
+
+def _pdf_heading_level(line: str) -> int | None:
+    line = line.strip()
+    if not line or len(line) > _MAX_PDF_HEADING_CHARS or line[-1] in "。，,;；:：":
+        return None
+    match = _PDF_NUMBERED.match(line)
+    if match:
+        return match.group(1).count(".") + 1 if _is_heading_title(match.group(2)) else None
+    match = _PDF_CHINESE.match(line)
+    if match:
+        return 2 if match.group(1) == "节" else 1
+    return None
+
+
+def _is_heading_block(text: str) -> bool:
+    lines = [line for line in text.splitlines() if line.strip()]
+    return bool(lines) and all(
+        _MD_HEADING.match(line) or _pdf_heading_level(line) is not None for line in lines
+    )
+
+
+def pdf_sections(text: str, path: list[tuple[int, str]]) -> list[tuple[list[str], str]]:
+    """
+    按编号标题切分一页 PDF 文本。path 为跨页延续的标题栈（原地更新），
+    这样第 5 页的正文仍能归到第 3 页开始的章节下。
+    """
+    sections = []
+    lines: list[str] = []
+    headings_only = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append(([title for _, title in path], body))
+
+    for line in text.splitlines():
+        level = _pdf_heading_level(line)
+        if level is not None:
+            if not headings_only:
+                flush()
+                lines = []
+            headings_only = True
+            path[:] = [(lvl, title) for lvl, title in path if lvl < level]
+            path.append((level, line.strip()))
+        elif line.strip():
+            headings_only = False
+        lines.append(line)
+    flush()
+    return sections
+
+
+class StructureAwareSplitter:
+    """
+    与 RecursiveCharacterTextSplitter.split_documents 接口一致的结构感知切分器
+
+    Args:
+        max_chars: 单块最大字符数
+        fallback: 非 Markdown / PDF 文档使用的切分器（需提供 split_documents），None 时按段落装箱
+    """
+
+    def __init__(self, max_chars: int = 1000, fallback=None):
+        self.max_chars = max_chars
+        self.fallback = fallback
+
+    def _make(self, doc, text: str, heading_path: list[str], index: int):
+        metadata = dict(doc.metadata)
+        metadata["heading_path"] = HEADING_SEPARATOR.join(heading_path)
+        metadata["section_chunk"] = index
+        return type(doc)(page_content=text, metadata=metadata)
+
+    def _split_sections(self, doc, sections) -> list[Any]:
+        chunks = []
+        for heading_path, body in sections:
+            texts = _pack(body.split("\n\n"), self.max_chars)
+            if len(texts) > 1 and _is_heading_block(texts[0]):
+                # 标题后紧跟超长段落时，标题不单独成块，并入第一个正文块
+                texts[1] = f"{texts[0]}\n\n{texts[1]}"
+                del texts[0]
+            for i, text in enumerate(texts):
+                chunks.append(self._make(doc, text, heading_path, i))
+        return chunks
+
+    def split_documents(self, documents: Iterable[Any]) -> list[Any]:
+        chunks, others = [], []
+        pdf_paths: dict[str, list[tuple[int, str]]] = {}
+        for doc in documents:
+            extension = os.path.splitext(doc.metadata.get("source", ""))[1].lower()
+            if extension in (".md", ".markdown"):
+                chunks.extend(self._split_sections(doc, markdown_sections(doc.page_content)))
+            elif extension == ".pdf":
+                # PyPDFLoader 每页一个 Document：块不跨页，标题栈在同一文件的页之间延续
+                path = pdf_paths.setdefault(doc.metadata.get("source", ""), [])
+                chunks.extend(self._split_sections(doc, pdf_sections(doc.page_content, path)))
+            else:
+                others.append(doc)
+        if others:
+            if self.fallback is not None:
+                chunks.extend(self.fallback.split_documents(others))
+            else:
+                for doc in others:
+                    chunks.extend(self._split_sections(doc, [([], doc.page_content)]))
+        return chunks
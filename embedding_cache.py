@@ -0,0 +1,133 @@
+"""
+Aura 持久化嵌入缓存
+- 两级缓存：内存 LRU → SQLite（float32 BLOB），键为 sha256(模型名 + 文本)
+- 包装任意提供 embed_documents / embed_query 的嵌入模型，可直接交给 Chroma 使用
+- 重复评测同一批文档和问题时，嵌入几乎全部命中缓存
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+
+from cache import LRUCache
+
+logger = logging.getLogger("AuraEmbeddingCache")
+
+_SQLITE_MAX_VARS = 500
+
+
+class CachedEmbeddings:
+    """带内存 LRU + SQLite 磁盘缓存的嵌入模型包装器"""
+
+    def __init__(self, embeddings, model_name: str, path: str, memory_size: int = 10_000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.memory = LRUCache(maxsize=memory_size)
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _disk_get(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQLITE_MAX_VARS):
+                part = keys[i:i + _SQLITE_MAX_VARS]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _disk_put(self, items: dict[str, list[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: dict[str, list[float]] = {}
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                vectors[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            from_disk = self._disk_get(missing)
+            self.disk_hits += len(from_disk)
+            for key, vector in from_disk.items():
+                self.memory.set(key, vector)
+            vectors.update(from_disk)
+
+        todo = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                todo.setdefault(key, text)
+        if todo:
+            self.misses += len(todo)
+            computed = dict(zip(todo, self.embeddings.embed_documents(list(todo.values()))))
+            computed = {key: [float(x) for x in vector] for key, vector in computed.items()}
+            self._disk_put(computed)
+            for key, vector in computed.items():
+                self.memory.set(key, vector)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+        from_disk = self._disk_get([key])
+        if key in from_disk:
+            self.disk_hits += 1
+            vector = from_disk[key]
+        else:
+            self.misses += 1
+            vector = [float(x) for x in self.embeddings.embed_query(text)]
+            self._disk_put({key: vector})
+        self.memory.set(key, vector)
+        return vector
+
+    def stats(self) -> dict:
+        memory_hits = self.memory.hits
+        total = memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory_hits": memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory_hits + self.disk_hits) / total, 4) if total else 0.0,
+            "memory_size": len(self.memory),
+        }
+
+    def vacuum(self) -> bool:
+        """压缩 SQLite 文件（知识库 compact 时调用）"""
+        with self._lock:
+            try:
+                self._conn.execute("VACUUM")
+                return True
+            except sqlite3.OperationalError as e:
+                logger.warning("嵌入缓存 VACUUM 失败: %s", e)
+                return False
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
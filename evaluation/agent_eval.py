@@ -746,3 +746,65 @@ class ModelComparator:
             for r in self.results
         ]
 
+
+
+@dataclass
+class RouterBenchResult:
+    """单个路由器的准确率与延迟"""
+    name: str
+    accuracy: float
+    avg_ms: float
+    p95_ms: float
+    llm_calls: int
+    total_cases: int
+
+
+def benchmark_router(routers: Dict[str, Any], cases: List[tuple]) -> List[RouterBenchResult]:
+    """
+    对比多个路由器：routers 为 {名称: 提供 route(query) 的路由器}，cases 为 [(问题, 期望路由)]。
+    带 decide() 的路由器（FastRouter）按决策来源统计 LLM 调用次数，否则每次都计为一次 LLM 调用。
+    """
+    results = []
+    for name, router in routers.items():
+        correct = 0
+        llm_calls = 0
+        latencies = []
+        for query, expected in cases:
+            start = time.perf_counter()
+            if hasattr(router, "decide"):
+                decision = router.decide(query)
+                route = decision.route
+                llm_calls += decision.source == "llm"
+            else:
+                route = router.route(query)
+                llm_calls += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+            correct += route == expected
+        n = len(cases)
+        latencies.sort()
+        results.append(RouterBenchResult(
+            name=name,
+            accuracy=correct / n if n else 0.0,
+            avg_ms=sum(latencies) / n if n else 0.0,
+            p95_ms=latencies[min(n - 1, int(n * 0.95))] if n else 0.0,
+            llm_calls=llm_calls,
+            total_cases=n,
+        ))
+    return results
+
+
+def router_report(results: List[RouterBenchResult], baseline: str = "llm") -> str:
+    """路由器对比表；以 baseline 为基准给出每次路由节省的平均耗时"""
+    base = next((r for r in results if r.name == baseline), None)
+    lines = [
+        "## 🧭 路由器对比\n",
+        "| 路由器 | 准确率 | 平均耗时 | P95 | LLM 调用 | 相对基准节省 |",
+        "|--------|--------|---------|-----|---------|------------|",
+    ]
+    for r in results:
+        saved = f"{base.avg_ms - r.avg_ms:.1f}ms" if base and r is not base else "-"
+        lines.append(
+            f"| `{r.name}` | {r.accuracy:.2%} | {r.avg_ms:.2f}ms | {r.p95_ms:.2f}ms "
+            f"| {r.llm_calls}/{r.total_cases} | {saved} |"
+        )
+    return "\n".join(lines)
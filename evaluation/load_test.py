@@ -0,0 +1,139 @@
+"""
+/chat 并发负载测试：按不同并发度发送请求，统计吞吐与延迟，观察吞吐随并发的扩展情况
+
+使用方法:
+    python -m evaluation.load_test --url http://127.0.0.1:8000              # 压测运行中的 API 服务
+    python -m evaluation.load_test --url http://127.0.0.1:8000 --levels 1 2 4 8 16 --requests 64
+    python -m evaluation.load_test --inprocess                             # 直接调用进程内 Agent（不经过 HTTP）
+
+每个请求使用独立的 session_id，避免同一会话的请求被串行化。
+"""
+
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from evaluation.retrieval_bench import _latency_row, _ms
+
+DEFAULT_QUERIES = [
+    "你好，你是谁",
+    "解释一下什么是机器学习",
+    "1+1等于几",
+    "用一句话介绍一下 RAG",
+]
+
+
+def load_queries(dataset: str | None) -> List[str]:
+    """从评测数据集取问题；数据集不可用时使用内置问题"""
+    if dataset:
+        try:
+            with open(dataset, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            queries = [case["question"] for key in ("agent_tests", "rag_tests") for case in data.get(key, [])]
+            if queries:
+                return queries
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"数据集不可用，使用内置问题: {e}")
+    return list(DEFAULT_QUERIES)
+
+
+def run_load(call: Callable[[int], Any], concurrency: int, requests: int) -> Dict[str, Any]:
+    """以 concurrency 个并发客户端执行 call(0..requests-1)，返回延迟 / 吞吐统计（异常计入 errors）"""
+    latencies, errors = [], []
+
+    def one(i: int):
+        start = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            errors.append(i)
+            print(f"请求 {i} 失败: {e}")
+        latencies.append(_ms(start))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    row = _latency_row(f"c={concurrency}", latencies, time.perf_counter() - start)
+    row.update(concurrency=concurrency, errors=len(errors))
+    return row
+
+
+def scaling(call: Callable[[int], Any], levels=(1, 2, 4, 8), requests: int = 32) -> List[Dict[str, Any]]:
+    """依次以各并发度压测，speedup 为相对第一个并发度的吞吐倍数"""
+    rows = []
+    for concurrency in levels:
+        row = run_load(call, concurrency, requests)
+        base = rows[0]["qps"] if rows else row["qps"]
+        row["speedup"] = round(row["qps"] / base, 2) if base else 0.0
+        print(row)
+        rows.append(row)
+    return rows
+
+
+def load_report(rows: List[Dict[str, Any]]) -> str:
+    lines = [
+        "",
+        "=" * 60,
+        "/chat 并发负载测试",
+        "=" * 60,
+        f"{'并发':>6} {'请求':>6} {'QPS':>8} {'p50(ms)':>10} {'p99(ms)':>10} {'加速比':>8} {'错误':>6}",
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['concurrency']:>6} {row['requests']:>6} {row['qps']:>8.2f} {row['p50_ms']:>10.1f} "
+            f"{row['p99_ms']:>10.1f} {row['speedup']:>8.2f} {row['errors']:>6}"
+        )
+    lines.append("=" * 60)
+    return "\n".join(lines)
+
+
+def http_chat(url: str, queries: List[str], api_key: str | None = None,
+              timeout: float = 120.0) -> Callable[[int], Any]:
+    """POST {url}/chat，第 i 个请求使用会话 load-i；success=false 视为失败"""
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["X-API-Key"] = api_key
+
+    def call(i: int):
+        body = json.dumps({"query": queries[i % len(queries)], "session_id": f"load-{i}"}).encode("utf-8")
+        request = urllib.request.Request(f"{url.rstrip('/')}/chat", data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read().decode("utf-8"))
+        if not result.get("success"):
+            raise RuntimeError(result.get("error"))
+        return result
+
+    return call
+
+
+def inprocess_chat(agent, queries: List[str]) -> Callable[[int], Any]:
+    """直接调用 agent.process_query，第 i 个请求使用会话 load-i"""
+    return lambda i: agent.process_query(queries[i % len(queries)], session_id=f"load-{i}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aura /chat 并发负载测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API 服务地址")
+    parser.add_argument("--api-key", default=None, help="X-API-Key（服务端设置了 AURA_API_KEY 时需要）")
+    parser.add_argument("--inprocess", action="store_true", help="不经过 HTTP，直接调用进程内 Agent")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8], help="并发度")
+    parser.add_argument("--requests", type=int, default=32, help="每个并发度的请求数")
+    parser.add_argument("--dataset", default="evaluation/test_dataset.json")
+    args = parser.parse_args()
+
+    queries = load_queries(args.dataset)
+    if args.inprocess:
+        from aura_react import AuraReActAgent
+        call = inprocess_chat(AuraReActAgent(), queries)
+    else:
+        call = http_chat(args.url, queries, api_key=args.api_key)
+
+    rows = scaling(call, levels=args.levels, requests=args.requests)
+    print(load_report(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,8 @@ RAG系统评估模块
 import json
 import re
 import time
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, field
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
 
 
@@ -62,10 +62,544 @@ class RAGEvalResults:
     evaluation_time: str = ""
 
 
+def _rank_metrics(retrieved_sources: List[str], relevant_docs: List[str]) -> Tuple[bool, float, float]:
+    """计算单个查询的 Hit / Reciprocal Rank / Recall@K（相关文档按来源子串匹配）"""
+    def is_relevant(src: str) -> bool:
+        return any(rel.lower() in src.lower() for rel in relevant_docs)
+
+    # Hit（是否命中任何相关文档）
+    hit = any(is_relevant(src) for src in retrieved_sources)
+
+    # MRR（第一个相关文档排名的倒数）
+    reciprocal_rank = 0.0
+    for i, src in enumerate(retrieved_sources):
+        if is_relevant(src):
+            reciprocal_rank = 1.0 / (i + 1)
+            break
+
+    # Recall@K
+    if relevant_docs:
+        recalled = sum(
+            1 for rel in relevant_docs
+            if any(rel.lower() in src.lower() for src in retrieved_sources)
+        )
+        recall = recalled / len(relevant_docs)
+    else:
+        recall = 1.0  # 如果没有标注相关文档，默认召回率为1
+    return hit, reciprocal_rank, recall
+
+
+@dataclass
+class TokenizerBenchResult:
+    """单个 BM25 分词器的检索质量与建索引吞吐"""
+    tokenizer: str
+    hit_rate: float
+    mrr: float
+    avg_recall: float
+    build_chunks_per_sec: float
+    build_mb_per_sec: float
+    avg_query_ms: float
+    vocab_size: int
+
+
+def benchmark_tokenizers(test_cases: List[Dict], chunks: List[Tuple[str, str]],
+                         tokenizers=("whitespace", "bigram", "jieba"), k: int = 3) -> List[Dict[str, Any]]:
+    """
+    对比不同分词器下纯 BM25 检索的 Hit Rate / MRR 与建索引吞吐
+
+    Args:
+        test_cases: 与 evaluate_retrieval 相同格式的测试用例
+        chunks: [(source, text)] 待索引的文本块
+        tokenizers: 参与对比的分词器名称
+        k: Top-K检索数量
+    """
+    from bm25_index import BM25Index, get_tokenizer
+
+    total_mb = sum(len(text.encode("utf-8")) for _, text in chunks) / 1024 / 1024
+    rows = []
+    for name in tokenizers:
+        tokenizer = get_tokenizer(name)
+        if tokenizer.name != name:
+            print(f"分词器 {name} 不可用，跳过")
+            continue
+
+        index = BM25Index(tokenizer=tokenizer)
+        start = time.perf_counter()
+        index.add_many((f"{i}", text) for i, (_, text) in enumerate(chunks))
+        build_s = max(time.perf_counter() - start, 1e-9)
+
+        hit_count, mrr_sum, recall_sum, query_s = 0, 0.0, 0.0, 0.0
+        for case in test_cases:
+            start = time.perf_counter()
+            hits = index.search(case["question"], k=k)
+            query_s += time.perf_counter() - start
+            retrieved_sources = [chunks[int(chunk_id)][0] for chunk_id, _ in hits]
+            hit, reciprocal_rank, recall = _rank_metrics(retrieved_sources, case.get("relevant_docs", []))
+            hit_count += hit
+            mrr_sum += reciprocal_rank
+            recall_sum += recall
+
+        n = max(len(test_cases), 1)
+        rows.append(asdict(TokenizerBenchResult(
+            tokenizer=name,
+            hit_rate=hit_count / n,
+            mrr=mrr_sum / n,
+            avg_recall=recall_sum / n,
+            build_chunks_per_sec=len(chunks) / build_s,
+            build_mb_per_sec=total_mb / build_s,
+            avg_query_ms=query_s * 1000 / n,
+            vocab_size=len(index._postings),
+        )))
+    return rows
+
+
+def tokenizer_report(rows: List[Dict[str, Any]], k: int = 3) -> str:
+    """生成分词器对比的 Markdown 表格"""
+    report = f"""## 🔤 BM25 分词器对比
+
+| 分词器 | Hit Rate@{k} | MRR | Avg Recall | 建索引 (chunk/s) | 建索引 (MB/s) | 查询耗时 | 词表大小 |
+|--------|------|-----|------|------|------|------|------|
+"""
+    for r in rows:
+        report += (
+            f"| {r['tokenizer']} | {r['hit_rate']:.2%} | {r['mrr']:.3f} | {r['avg_recall']:.2%} "
+            f"| {r['build_chunks_per_sec']:.0f} | {r['build_mb_per_sec']:.2f} "
+            f"| {r['avg_query_ms']:.2f}ms | {r['vocab_size']} |\n"
+        )
+    return report
+
+
+@dataclass
+class ChunkerBenchResult:
+    """单个切分方式的索引规模与 BM25 检索质量"""
+    chunker: str
+    chunks: int
+    total_chars: int
+    avg_chunk_chars: float
+    overlap_ratio: float
+    bm25_index_bytes: int
+    hit_rate: float
+    mrr: float
+    avg_recall: float
+
+
+def benchmark_chunkers(test_cases: List[Dict], documents: List[Any],
+                       chunkers: Dict[str, Any], k: int = 3) -> List[Dict[str, Any]]:
+    """
+    对比不同切分方式：块数 / 总字符数（含重叠）/ BM25 索引体积，以及 BM25(bigram) 的 Hit Rate / MRR
+
+    Args:
+        test_cases: 与 evaluate_retrieval 相同格式的测试用例
+        documents: 待切分的文档（需有 page_content 与 metadata["source"]）
+        chunkers: {名称: 提供 split_documents 的切分器}
+    """
+    import os
+    import tempfile
+
+    from bm25_index import BM25Index
+
+    source_chars = sum(len(doc.page_content) for doc in documents)
+    rows = []
+    for name, splitter in chunkers.items():
+        chunks = splitter.split_documents(documents)
+        total_chars = sum(len(c.page_content) for c in chunks)
+        with tempfile.TemporaryDirectory() as directory:
+            index = BM25Index.open(directory, tokenizer="bigram")
+            index.add_many((str(i), c.page_content) for i, c in enumerate(chunks))
+            index.save()
+            index_bytes = sum(
+                os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+            )
+
+            hit_count, mrr_sum, recall_sum = 0, 0.0, 0.0
+            for case in test_cases:
+                hits = index.search(case["question"], k=k)
+                retrieved_sources = [
+                    os.path.basename(chunks[int(chunk_id)].metadata.get("source", "")) for chunk_id, _ in hits
+                ]
+                hit, reciprocal_rank, recall = _rank_metrics(retrieved_sources, case.get("relevant_docs", []))
+                hit_count += hit
+                mrr_sum += reciprocal_rank
+                recall_sum += recall
+            index.close()
+
+        n = max(len(test_cases), 1)
+        rows.append(asdict(ChunkerBenchResult(
+            chunker=name,
+            chunks=len(chunks),
+            total_chars=total_chars,
+            avg_chunk_chars=total_chars / max(len(chunks), 1),
+            overlap_ratio=total_chars / max(source_chars, 1) - 1,
+            bm25_index_bytes=index_bytes,
+            hit_rate=hit_count / n,
+            mrr=mrr_sum / n,
+            avg_recall=recall_sum / n,
+        )))
+    return rows
+
+
+def chunker_report(rows: List[Dict[str, Any]], k: int = 3) -> str:
+    """生成切分方式对比的 Markdown 表格"""
+    report = f"""## ✂️ 切分方式对比
+
+| 切分 | 块数 | 总字符 | 平均块长 | 重叠冗余 | BM25 索引 | Hit Rate@{k} | MRR | Avg Recall |
+|------|------|------|------|------|------|------|-----|------|
+"""
+    for r in rows:
+        report += (
+            f"| {r['chunker']} | {r['chunks']} | {r['total_chars']} | {r['avg_chunk_chars']:.0f} "
+            f"| {r['overlap_ratio']:.1%} | {r['bm25_index_bytes'] / 1024:.1f}KB "
+            f"| {r['hit_rate']:.2%} | {r['mrr']:.3f} | {r['avg_recall']:.2%} |\n"
+        )
+    return report
+
+
+@dataclass
+class BackendBenchResult:
+    """单个推理后端的吞吐、延迟与检索质量"""
+    backend: str
+    embed_chunks_per_sec: float
+    query_p50_ms: float
+    query_p99_ms: float
+    rerank_p50_ms: float
+    rerank_p99_ms: float
+    dense_hit_rate: float
+    dense_mrr: float
+    rerank_hit_rate: float
+    rerank_mrr: float
+
+
+def benchmark_backends(test_cases: List[Dict], chunks: List[Tuple[str, str]],
+                       backends=("torch", "onnx", "onnx-int8"), k: int = 3,
+                       candidates: int = 10) -> List[Dict[str, Any]]:
+    """
+    对比不同推理后端下 m3e-base 嵌入与 MiniLM 重排序的性能和效果
+
+    - 嵌入吞吐：对全部 chunk 编码的 chunk/s
+    - 查询延迟：单条问题编码 / 对 candidates 个候选重排序的 p50、p99
+    - 检索质量：稠密检索 Top-K 与 稠密 Top-candidates + 重排序 Top-K 的 Hit Rate / MRR
+    """
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    from backends import embedding_model_args, load_cross_encoder, resolve_backend
+    from rerank import percentile
+
+    texts = [text for _, text in chunks]
+    rows = []
+    for name in backends:
+        if resolve_backend(name) != name:
+            print(f"推理后端 {name} 不可用，跳过")
+            continue
+        path, kwargs = embedding_model_args("moka-ai/m3e-base", name)
+        embedder = SentenceTransformer(path, **kwargs)
+        reranker = load_cross_encoder("cross-encoder/ms-marco-MiniLM-L-6-v2", name, max_length=512)
+
+        start = time.perf_counter()
+        matrix = embedder.encode(texts, batch_size=32, normalize_embeddings=True)
+        embed_s = max(time.perf_counter() - start, 1e-9)
+
+        query_ms, rerank_ms = [], []
+        dense = {"hit": 0, "mrr": 0.0}
+        reranked = {"hit": 0, "mrr": 0.0}
+        for case in test_cases:
+            relevant = case.get("relevant_docs", [])
+            start = time.perf_counter()
+            query_vec = embedder.encode(case["question"], normalize_embeddings=True)
+            query_ms.append((time.perf_counter() - start) * 1000)
+            top = np.argsort(-(matrix @ query_vec))[:candidates]
+
+            hit, rr, _ = _rank_metrics([chunks[i][0] for i in top[:k]], relevant)
+            dense["hit"] += hit
+            dense["mrr"] += rr
+
+            start = time.perf_counter()
+            scores = reranker.predict([[case["question"], texts[i]] for i in top])
+            rerank_ms.append((time.perf_counter() - start) * 1000)
+            order = [top[i] for i in np.argsort(-np.asarray(scores))[:k]]
+            hit, rr, _ = _rank_metrics([chunks[i][0] for i in order], relevant)
+            reranked["hit"] += hit
+            reranked["mrr"] += rr
+
+        n = max(len(test_cases), 1)
+        rows.append(asdict(BackendBenchResult(
+            backend=name,
+            embed_chunks_per_sec=len(texts) / embed_s,
+            query_p50_ms=percentile(query_ms, 50),
+            query_p99_ms=percentile(query_ms, 99),
+            rerank_p50_ms=percentile(rerank_ms, 50),
+            rerank_p99_ms=percentile(rerank_ms, 99),
+            dense_hit_rate=dense["hit"] / n,
+            dense_mrr=dense["mrr"] / n,
+            rerank_hit_rate=reranked["hit"] / n,
+            rerank_mrr=reranked["mrr"] / n,
+        )))
+    return rows
+
+
+def backend_report(rows: List[Dict[str, Any]], k: int = 3) -> str:
+    """生成推理后端对比的 Markdown 表格"""
+    report = f"""## ⚡ 推理后端对比（CPU）
+
+| 后端 | 嵌入 (chunk/s) | 查询编码 p50/p99 | 重排序 p50/p99 | 稠密 Hit@{k} | 稠密 MRR | 重排序 Hit@{k} | 重排序 MRR |
+|------|------|------|------|------|------|------|------|
+"""
+    for r in rows:
+        report += (
+            f"| {r['backend']} | {r['embed_chunks_per_sec']:.1f} "
+            f"| {r['query_p50_ms']:.1f}/{r['query_p99_ms']:.1f}ms "
+            f"| {r['rerank_p50_ms']:.1f}/{r['rerank_p99_ms']:.1f}ms "
+            f"| {r['dense_hit_rate']:.2%} | {r['dense_mrr']:.3f} "
+            f"| {r['rerank_hit_rate']:.2%} | {r['rerank_mrr']:.3f} |\n"
+        )
+    return report
+
+
+@dataclass
+class FusionBenchResult:
+    """单个融合方式（可选重排序）的检索质量"""
+    config: str
+    rerank: bool
+    hit_rate: float
+    mrr: float
+    avg_recall: float
+    avg_query_ms: float
+
+
+def _concat_dedup(result_lists: List[List[Tuple[Any, float]]]) -> List[Tuple[Any, float]]:
+    """融合前的旧实现：各路结果直接拼接，按正文前 100 字去重"""
+    seen, merged = set(), []
+    for results in result_lists:
+        for doc, score in results:
+            key = hash(doc.page_content[:100])
+            if key not in seen:
+                seen.add(key)
+                merged.append((doc, score))
+    return merged
+
+
+def benchmark_fusion(test_cases: List[Dict], chunks: List[Tuple[str, str]],
+                     recall_legs: Dict[str, Callable[[str, int], List[Tuple[int, float]]]],
+                     rerank_fn: Optional[Callable[[str, List[str]], List[float]]] = None,
+                     methods=("concat", "rrf", "weighted"), k: int = 3, candidates: int = 10,
+                     rerank_top_n: int = 6) -> List[Dict[str, Any]]:
+    """
+    对比多路召回的合并方式：不重排序（use_rerank=False）时各融合方式的 Hit Rate / MRR，
+    以及融合后只对前 rerank_top_n 条重排序的效果
+
+    Args:
+        test_cases: 与 evaluate_retrieval 相同格式的测试用例
+        chunks: [(source, text)] 文本块
+        recall_legs: {路名: (question, n) -> [(chunk 下标, 分数)]}，按相关度降序，分数越大越相关
+        rerank_fn: (question, [text]) -> [score]，为 None 时只对比不重排序的结果
+        methods: concat（旧实现：拼接 + 前 100 字去重）/ rrf / weighted
+    """
+    from types import SimpleNamespace
+
+    from fusion import fuse
+
+    docs = [SimpleNamespace(page_content=text, metadata={"source": source, "chunk_id": str(i)})
+            for i, (source, text) in enumerate(chunks)]
+    configs = [(method, False) for method in methods]
+    if rerank_fn is not None:
+        configs += [(method, True) for method in methods if method != "concat"]
+
+    rows = []
+    for method, rerank in configs:
+        hit_count, mrr_sum, recall_sum, query_s = 0, 0.0, 0.0, 0.0
+        for case in test_cases:
+            question = case["question"]
+            start = time.perf_counter()
+            lists = [[(docs[i], score) for i, score in leg(question, candidates)] for leg in recall_legs.values()]
+            merged = _concat_dedup(lists) if method == "concat" else fuse(lists, method=method)
+            if rerank:
+                top = merged[:max(k, rerank_top_n)]
+                scores = rerank_fn(question, [doc.page_content for doc, _ in top])
+                merged = [item for item, _ in sorted(zip(top, scores), key=lambda x: x[1], reverse=True)]
+            query_s += time.perf_counter() - start
+            retrieved_sources = [doc.metadata["source"] for doc, _ in merged[:k]]
+            hit, reciprocal_rank, recall = _rank_metrics(retrieved_sources, case.get("relevant_docs", []))
+            hit_count += hit
+            mrr_sum += reciprocal_rank
+            recall_sum += recall
+
+        n = max(len(test_cases), 1)
+        rows.append(asdict(FusionBenchResult(
+            config=f"{method}+rerank" if rerank else method,
+            rerank=rerank,
+            hit_rate=hit_count / n,
+            mrr=mrr_sum / n,
+            avg_recall=recall_sum / n,
+            avg_query_ms=query_s * 1000 / n,
+        )))
+    return rows
+
+
+def fusion_report(rows: List[Dict[str, Any]], k: int = 3) -> str:
+    """生成融合方式对比的 Markdown 表格"""
+    report = f"""## 🔀 多路召回融合对比
+
+| 配置 | 重排序 | Hit Rate@{k} | MRR | Avg Recall | 查询耗时 |
+|------|------|------|-----|------|------|
+"""
+    for r in rows:
+        report += (
+            f"| {r['config']} | {'是' if r['rerank'] else '否'} | {r['hit_rate']:.2%} | {r['mrr']:.3f} "
+            f"| {r['avg_recall']:.2%} | {r['avg_query_ms']:.2f}ms |\n"
+        )
+    return report
+
+
+@dataclass
+class VectorStoreBenchResult:
+    """单个向量存储的构建 / 加载 / 查询性能与检索质量"""
+    store: str
+    vectors: int
+    build_s: float
+    open_ms: float
+    query_p50_ms: float
+    query_p99_ms: float
+    qps: float
+    disk_bytes: int
+    memory_bytes: Optional[int]
+    hit_rate: float
+    mrr: float
+    recall_vs_exact: float
+
+
+def _open_bench_store(kind: str, directory: str, hnsw_params: Dict[str, Any], rescore_factor: int = 4):
+    from vector_store import ChromaStore, chroma_hnsw_metadata, open_store
+
+    if kind == "chroma":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.get_or_create_collection(
+            "bench", metadata=chroma_hnsw_metadata(
+                hnsw_params.get("M"), hnsw_params.get("ef_construction"), hnsw_params.get("ef_search"),
+            ),
+        )
+        return ChromaStore(collection)
+    if kind.startswith("numpy-"):
+        # numpy-int8 / numpy-binary：量化第一轮 + 全精度重打分
+        return open_store("numpy", directory, quantization=kind.split("-", 1)[1], rescore_factor=rescore_factor)
+    if kind == "numpy":
+        return open_store(kind, directory)
+    return open_store(kind, directory, **hnsw_params)
+
+
+def benchmark_vector_stores(test_cases: List[Dict], chunks: List[Tuple[str, str]],
+                            stores=("numpy", "numpy-int8", "numpy-binary", "hnsw", "chroma"), k: int = 3,
+                            distractors: int = 0, hnsw_params: Optional[Dict[str, Any]] = None,
+                            rescore_factor: int = 4, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    在同一评测集上对比向量存储（向量只编码一次，各存储使用相同输入）
+
+    - 构建耗时 / 重新打开耗时（冷启动，含首次查询）/ 单查询 p50、p99 与 QPS / 磁盘与常驻内存占用
+    - numpy-int8 / numpy-binary 为量化存储（第一轮用编码，前 k * rescore_factor 个候选用全精度重打分）
+    - Hit Rate / MRR（按 relevant_docs）与相对精确检索 Top-K 的召回率
+    - distractors > 0 时追加随机单位向量作为干扰项，用于观察语料规模增大后的表现
+    """
+    import os
+    import tempfile
+
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    from ingest import directory_size
+    from rerank import percentile
+    from vector_store import normalize_rows
+
+    hnsw_params = hnsw_params or {}
+    embedder = SentenceTransformer("moka-ai/m3e-base", device="cpu")
+    matrix = embedder.encode([text for _, text in chunks], batch_size=32, normalize_embeddings=True)
+    if distractors:
+        rng = np.random.default_rng(seed)
+        matrix = np.vstack([matrix, normalize_rows(rng.standard_normal((distractors, matrix.shape[1])))])
+    matrix = np.asarray(matrix, dtype=np.float32)
+    ids = [str(i) for i in range(len(matrix))]
+    sources = [source for source, _ in chunks] + ["distractor"] * distractors
+    texts = [text for _, text in chunks] + [""] * distractors
+    queries = embedder.encode([case["question"] for case in test_cases], normalize_embeddings=True)
+    exact = [set(np.argsort(-(matrix @ q))[:k].tolist()) for q in queries]
+
+    rows = []
+    for kind in stores:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                store = _open_bench_store(kind, directory, hnsw_params, rescore_factor)
+            except ImportError as e:
+                print(f"向量存储 {kind} 不可用，跳过: {e}")
+                continue
+            start = time.perf_counter()
+            for i in range(0, len(ids), 1000):
+                store.upsert(ids[i:i + 1000], matrix[i:i + 1000], texts[i:i + 1000],
+                             [{"source": src} for src in sources[i:i + 1000]])
+            store.save()
+            build_s = time.perf_counter() - start
+            del store
+
+            start = time.perf_counter()
+            store = _open_bench_store(kind, directory, hnsw_params, rescore_factor)
+            store.query(queries[0], k)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            latencies, hit_count, mrr_sum, overlap = [], 0, 0.0, 0.0
+            wall = time.perf_counter()
+            for case, q, truth in zip(test_cases, queries, exact):
+                start = time.perf_counter()
+                hits = store.query(q, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                got = [int(chunk_id) for chunk_id, _, _, _ in hits]
+                hit, reciprocal_rank, _ = _rank_metrics(
+                    [sources[i] for i in got], case.get("relevant_docs", [])
+                )
+                hit_count += hit
+                mrr_sum += reciprocal_rank
+                overlap += len(truth & set(got)) / max(len(truth), 1)
+            wall_s = max(time.perf_counter() - wall, 1e-9)
+
+            n = max(len(test_cases), 1)
+            rows.append(asdict(VectorStoreBenchResult(
+                store=kind,
+                vectors=len(ids),
+                build_s=build_s,
+                open_ms=open_ms,
+                query_p50_ms=percentile(latencies, 50),
+                query_p99_ms=percentile(latencies, 99),
+                qps=len(latencies) / wall_s,
+                disk_bytes=directory_size(directory),
+                memory_bytes=store.nbytes(),
+                hit_rate=hit_count / n,
+                mrr=mrr_sum / n,
+                recall_vs_exact=overlap / n,
+            )))
+            del store
+    return rows
+
+
+def vector_store_report(rows: List[Dict[str, Any]], k: int = 3) -> str:
+    """生成向量存储对比的 Markdown 表格"""
+    report = f"""## 🗄️ 向量存储对比
+
+| 存储 | 向量数 | 构建 | 冷启动 | 查询 p50/p99 | QPS | 磁盘 | 内存 | Hit@{k} | MRR | 相对精确召回@{k} |
+|------|------|------|------|------|------|------|------|------|-----|------|
+"""
+    for r in rows:
+        memory = f"{r['memory_bytes'] / 1e6:.1f}MB" if r["memory_bytes"] is not None else "-"
+        report += (
+            f"| {r['store']} | {r['vectors']} | {r['build_s']:.2f}s | {r['open_ms']:.0f}ms "
+            f"| {r['query_p50_ms']:.2f}/{r['query_p99_ms']:.2f}ms | {r['qps']:.0f} "
+            f"| {r['disk_bytes'] / 1e6:.1f}MB | {memory} "
+            f"| {r['hit_rate']:.2%} | {r['mrr']:.3f} | {r['recall_vs_exact']:.2%} |\n"
+        )
+    return report
+
+
 class RAGEvaluator:
     """RAG系统评估器"""
     
-    def __init__(self, rag_system, retrieval_qa=None, llm=None, agent=None):
+    def __init__(self, rag_system, retrieval_qa=None, llm=None, agent=None, llm_cache=None):
         """
         初始化RAG评估器
         
@@ -74,11 +608,13 @@ class RAGEvaluator:
             retrieval_qa: RetrievalQA链，用于生成评估（可选）
             llm: LLM实例，用于自动评估生成质量（可选）
             agent: Agent实例，用于生成回答进行评估（可选）
+            llm_cache: LLMCache实例，缓存 LLM 打分结果，重复评测同一批回答时不再调用 LLM（可选）
         """
         self.rag = rag_system
         self.retrieval_qa = retrieval_qa
         self.llm = llm
         self.agent = agent
+        self.llm_cache = llm_cache
         self.results = RAGEvalResults()
     
     def evaluate_retrieval(self, test_cases: List[Dict], k: int = 3) -> Dict[str, Any]:
@@ -122,31 +658,10 @@ class RAGEvaluator:
                     source = doc.page_content[:50] if doc.page_content else ""
                 retrieved_sources.append(source)
             
-            # 计算Hit（是否命中任何相关文档）
-            hit = any(
-                any(rel.lower() in src.lower() for src in retrieved_sources)
-                for rel in relevant_docs
-            )
+            hit, reciprocal_rank, recall = _rank_metrics(retrieved_sources, relevant_docs)
             if hit:
                 hit_count += 1
-            
-            # 计算MRR（Mean Reciprocal Rank）
-            reciprocal_rank = 0.0
-            for i, src in enumerate(retrieved_sources):
-                if any(rel.lower() in src.lower() for rel in relevant_docs):
-                    reciprocal_rank = 1.0 / (i + 1)
-                    break
             mrr_sum += reciprocal_rank
-            
-            # 计算Recall@K
-            if relevant_docs:
-                recalled = sum(
-                    1 for rel in relevant_docs
-                    if any(rel.lower() in src.lower() for src in retrieved_sources)
-                )
-                recall = recalled / len(relevant_docs)
-            else:
-                recall = 1.0  # 如果没有标注相关文档，默认召回率为1
             recall_sum += recall
             
             # 保存详细结果
@@ -387,8 +902,7 @@ class RAGEvaluator:
 请只回复一个数字（1-5）："""
         
         try:
-            response = self.llm.invoke(prompt)
-            return self._extract_score(response)
+            return self._extract_score(self._judge(prompt))
         except Exception as e:
             print(f"LLM评估失败: {e}")
             return 3.0
@@ -413,12 +927,17 @@ class RAGEvaluator:
 请只回复一个数字（1-5）："""
         
         try:
-            response = self.llm.invoke(prompt)
-            return self._extract_score(response)
+            return self._extract_score(self._judge(prompt))
         except Exception as e:
             print(f"LLM评估失败: {e}")
             return 3.0
     
+    def _judge(self, prompt: str) -> str:
+        """调用评测 LLM；配置了 llm_cache 时相同 prompt 直接复用上次的打分（无法解析出分数的输出不缓存）"""
+        from llm_cache import cached_invoke
+        return cached_invoke(self.llm_cache, self.llm, prompt, "judge",
+                             validate=lambda text: re.search(r'[1-5]', text) is not None)
+    
     def _extract_score(self, response: str) -> float:
         """从LLM回复中提取分数"""
         if not response:
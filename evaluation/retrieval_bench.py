@@ -0,0 +1,407 @@
+"""
+检索性能基准测试
+
+使用方法:
+    python -m evaluation.retrieval_bench bm25                       # 增量索引 vs 全量重建
+    python -m evaluation.retrieval_bench bm25 --sizes 10000 100000
+    python -m evaluation.retrieval_bench bm25-load                  # 持久化索引的加载耗时
+    python -m evaluation.retrieval_bench tokenizers                 # BM25 分词器对比（eval_docs）
+    python -m evaluation.retrieval_bench rerank --concurrency 8     # 重排序：逐请求 vs 微批 + 截断 + 缓存
+    python -m evaluation.retrieval_bench backends                   # 推理后端：torch vs onnx vs onnx-int8
+    python -m evaluation.retrieval_bench chunking                   # 结构感知切分 vs 固定 1000/100 切分
+    python -m evaluation.retrieval_bench fusion                     # 召回融合：拼接去重 vs RRF / 加权，有无重排序
+    python -m evaluation.retrieval_bench vectorstores --distractors 100000 --hnsw-m 32 --hnsw-ef-search 128
+    python -m evaluation.retrieval_bench vectorstores --stores numpy numpy-int8 numpy-binary --rescore-factor 8
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List, Dict, Any
+
+
+def synthetic_chunks(n: int, words_per_chunk: int = 150, vocab_size: int = 50_000,
+                     seed: int = 42) -> List[str]:
+    """生成服从 Zipf 分布词频的合成 chunk（可复现）"""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]
+    return [
+        " ".join(rng.choices(vocab, weights=weights, k=words_per_chunk))
+        for _ in range(n)
+    ]
+
+
+def load_eval_chunks(docs_dir: str = "data/eval_docs", chunk_size: int = 500) -> List[tuple]:
+    """把评测文档按段落合并成约 chunk_size 字的块，返回 [(source, text)]"""
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(docs_dir, "*.md"))):
+        with open(path, "r", encoding="utf-8") as f:
+            paragraphs = [p.strip() for p in f.read().split("\n\n") if p.strip()]
+        buf = ""
+        for para in paragraphs:
+            if buf and len(buf) + len(para) > chunk_size:
+                chunks.append((os.path.basename(path), buf))
+                buf = ""
+            buf = f"{buf}\n\n{para}" if buf else para
+        if buf:
+            chunks.append((os.path.basename(path), buf))
+    return chunks
+
+
+def _ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_bm25_ingest(sizes=(10_000, 100_000), upload_size: int = 50,
+                      n_queries: int = 50) -> List[Dict[str, Any]]:
+    """
+    对比「一次上传」的 BM25 更新代价：
+    - 增量索引：只对新上传的 upload_size 个 chunk 做 add
+    - 全量重建：BM25Retriever.from_documents 重建整个语料（旧实现）
+    """
+    from bm25_index import BM25Index
+
+    try:
+        from langchain_community.retrievers import BM25Retriever
+        from langchain_core.documents import Document
+    except ImportError:
+        BM25Retriever = None
+        print("未安装 langchain_community / rank_bm25，跳过全量重建对比")
+
+    rows = []
+    for size in sizes:
+        corpus = synthetic_chunks(size + upload_size)
+        base, upload = corpus[:size], corpus[size:]
+        queries = [" ".join(text.split()[:3]) for text in random.Random(7).sample(base, n_queries)]
+
+        index = BM25Index()
+        start = time.perf_counter()
+        index.add_many((f"c{i}", text) for i, text in enumerate(base))
+        initial_build_ms = _ms(start)
+
+        start = time.perf_counter()
+        index.add_many((f"u{i}", text) for i, text in enumerate(upload))
+        incremental_ms = _ms(start)
+
+        start = time.perf_counter()
+        for q in queries:
+            index.search(q, k=10)
+        incremental_query_ms = _ms(start) / n_queries
+
+        row = {
+            "chunks": size,
+            "initial_build_ms": round(initial_build_ms, 1),
+            "incremental_upload_ms": round(incremental_ms, 2),
+            "incremental_query_ms": round(incremental_query_ms, 2),
+        }
+
+        if BM25Retriever is not None:
+            docs = [Document(page_content=text) for text in corpus]
+            start = time.perf_counter()
+            retriever = BM25Retriever.from_documents(docs)
+            row["rebuild_upload_ms"] = round(_ms(start), 1)
+            retriever.k = 10
+            start = time.perf_counter()
+            for q in queries:
+                retriever.invoke(q)
+            row["rebuild_query_ms"] = round(_ms(start) / n_queries, 2)
+
+        rows.append(row)
+        print(row)
+    return rows
+
+
+def bench_bm25_load(sizes=(10_000, 100_000), n_queries: int = 50) -> List[Dict[str, Any]]:
+    """持久化 BM25 索引：快照写入、冷启动打开、首批查询（倒排表按需解码）的耗时"""
+    from bm25_index import BM25Index
+
+    rows = []
+    for size in sizes:
+        corpus = synthetic_chunks(size)
+        queries = [" ".join(text.split()[:3]) for text in random.Random(7).sample(corpus, n_queries)]
+        with tempfile.TemporaryDirectory() as directory:
+            index = BM25Index.open(directory)
+            index.add_many((f"c{i}", text) for i, text in enumerate(corpus))
+            start = time.perf_counter()
+            index.save()
+            save_ms = _ms(start)
+            index.close()
+
+            start = time.perf_counter()
+            index = BM25Index.open(directory)
+            open_ms = _ms(start)
+
+            start = time.perf_counter()
+            for q in queries:
+                index.search(q, k=10)
+            cold_query_ms = _ms(start) / n_queries
+            index.close()
+
+        row = {
+            "chunks": size,
+            "save_ms": round(save_ms, 1),
+            "open_ms": round(open_ms, 1),
+            "cold_query_ms": round(cold_query_ms, 2),
+        }
+        rows.append(row)
+        print(row)
+    return rows
+
+
+def bench_tokenizers(docs_dir: str = "data/eval_docs",
+                     dataset: str = "evaluation/test_dataset.json", k: int = 3) -> List[Dict[str, Any]]:
+    """在评测集上对比 BM25 分词器的 Hit Rate / MRR 与建索引吞吐"""
+    from evaluation.rag_eval import benchmark_tokenizers, tokenizer_report
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("rag_tests", [])
+    chunks = load_eval_chunks(docs_dir)
+    print(f"{len(chunks)} 个文本块, {len(test_cases)} 条测试用例")
+    rows = benchmark_tokenizers(test_cases, chunks, k=k)
+    print(tokenizer_report(rows, k=k))
+    return rows
+
+
+def _latency_row(name: str, latencies: List[float], wall_s: float) -> Dict[str, Any]:
+    from rerank import percentile
+
+    return {
+        "mode": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "qps": round(len(latencies) / wall_s, 2) if wall_s > 0 else 0.0,
+    }
+
+
+def bench_rerank(docs_dir: str = "data/eval_docs", dataset: str = "evaluation/test_dataset.json",
+                 candidates: int = 10, concurrency: int = 8, rounds: int = 2,
+                 max_tokens: int = 256,
+                 model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2") -> List[Dict[str, Any]]:
+    """
+    模拟 concurrency 个并发客户端，对比每个请求的重排序延迟：
+    - direct：逐请求 predict 整块正文（旧实现）
+    - batched：微批合并 + 按 token 预算截断（分数缓存为空）
+    - batched-warm：同一批查询再跑一遍，命中 (query, chunk_id) 分数缓存
+    """
+    from sentence_transformers import CrossEncoder
+    from rerank import RerankBatcher
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        queries = [case["question"] for case in json.load(f).get("rag_tests", [])]
+    chunks = load_eval_chunks(docs_dir, chunk_size=1000)
+    docs = [SimpleNamespace(page_content=text, metadata={"source": source}) for source, text in chunks]
+    rng = random.Random(7)
+    requests = [(q, rng.sample(docs, min(candidates, len(docs)))) for q in queries * rounds]
+
+    model = CrossEncoder(model_name, max_length=512)
+    model.predict([["warmup", docs[0].page_content]])
+
+    def run(name, fn):
+        latencies = []
+
+        def one(request):
+            start = time.perf_counter()
+            fn(*request)
+            latencies.append(_ms(start))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, requests))
+        row = _latency_row(name, latencies, time.perf_counter() - start)
+        print(row)
+        return row
+
+    rows = [run("direct", lambda q, ds: model.predict([[q, d.page_content] for d in ds]))]
+    batcher = RerankBatcher(model, max_tokens=max_tokens)
+    rows.append(run("batched", batcher.score))
+    rows.append(run("batched-warm", batcher.score))
+    print(batcher.stats())
+    return rows
+
+
+def bench_backends(docs_dir: str = "data/eval_docs", dataset: str = "evaluation/test_dataset.json",
+                   backends=("torch", "onnx", "onnx-int8"), k: int = 3) -> List[Dict[str, Any]]:
+    """在评测集上对比推理后端的吞吐、延迟与检索质量"""
+    from evaluation.rag_eval import benchmark_backends, backend_report
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("rag_tests", [])
+    chunks = load_eval_chunks(docs_dir)
+    print(f"{len(chunks)} 个文本块, {len(test_cases)} 条测试用例")
+    rows = benchmark_backends(test_cases, chunks, backends=backends, k=k)
+    print(backend_report(rows, k=k))
+    return rows
+
+
+def bench_chunking(docs_dir: str = "data/eval_docs", dataset: str = "evaluation/test_dataset.json",
+                   k: int = 3, max_chars: int = 1000) -> List[Dict[str, Any]]:
+    """对比结构感知切分与 RecursiveCharacterTextSplitter(1000/100) 的索引规模和 BM25 检索质量"""
+    from chunking import StructureAwareSplitter
+    from evaluation.rag_eval import benchmark_chunkers, chunker_report
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("rag_tests", [])
+    documents = []
+    for path in sorted(glob.glob(os.path.join(docs_dir, "**", "*.md"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            documents.append(SimpleNamespace(page_content=f.read(), metadata={"source": path}))
+
+    chunkers = {"structure": StructureAwareSplitter(max_chars=max_chars)}
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        chunkers["recursive-1000/100"] = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=100)
+    except ImportError:
+        print("未安装 langchain_text_splitters，跳过固定切分对比")
+
+    print(f"{len(documents)} 个文档, {len(test_cases)} 条测试用例")
+    rows = benchmark_chunkers(test_cases, documents, chunkers, k=k)
+    print(chunker_report(rows, k=k))
+    return rows
+
+
+def bench_fusion(docs_dir: str = "data/eval_docs", dataset: str = "evaluation/test_dataset.json",
+                 k: int = 3, candidates: int = 10, rerank_top_n: int = 6,
+                 embed_model: str = "moka-ai/m3e-base",
+                 rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2") -> List[Dict[str, Any]]:
+    """在评测集上对比向量 + BM25(bigram) 两路召回的合并方式，及 use_rerank=False 与重排序的质量差距"""
+    import numpy as np
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    from bm25_index import BM25Index
+    from evaluation.rag_eval import benchmark_fusion, fusion_report
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("rag_tests", [])
+    chunks = load_eval_chunks(docs_dir)
+    texts = [text for _, text in chunks]
+    print(f"{len(chunks)} 个文本块, {len(test_cases)} 条测试用例")
+
+    embedder = SentenceTransformer(embed_model)
+    matrix = embedder.encode(texts, batch_size=32, normalize_embeddings=True)
+    index = BM25Index(tokenizer="bigram")
+    index.add_many((str(i), text) for i, text in enumerate(texts))
+    reranker = CrossEncoder(rerank_model, max_length=512)
+
+    def vector_leg(question, n):
+        scores = matrix @ embedder.encode(question, normalize_embeddings=True)
+        return [(int(i), float(scores[i])) for i in np.argsort(-scores)[:n]]
+
+    def bm25_leg(question, n):
+        return [(int(chunk_id), score) for chunk_id, score in index.search(question, k=n)]
+
+    rows = benchmark_fusion(
+        test_cases, chunks, {"vector": vector_leg, "bm25": bm25_leg},
+        rerank_fn=lambda question, passages: reranker.predict([[question, p] for p in passages]),
+        k=k, candidates=candidates, rerank_top_n=rerank_top_n,
+    )
+    print(fusion_report(rows, k=k))
+    return rows
+
+
+def bench_vector_stores(docs_dir: str = "data/eval_docs", dataset: str = "evaluation/test_dataset.json",
+                        stores=("numpy", "numpy-int8", "numpy-binary", "hnsw", "chroma"), k: int = 3,
+                        distractors: int = 0, hnsw_params: Dict[str, Any] | None = None,
+                        rescore_factor: int = 4) -> List[Dict[str, Any]]:
+    """在评测集上对比 numpy（含 int8 / binary 量化）/ hnsw / chroma 向量存储"""
+    from evaluation.rag_eval import benchmark_vector_stores, vector_store_report
+
+    with open(dataset, "r", encoding="utf-8") as f:
+        test_cases = json.load(f).get("rag_tests", [])
+    chunks = load_eval_chunks(docs_dir)
+    print(f"{len(chunks)} 个文本块（另加 {distractors} 个干扰向量）, {len(test_cases)} 条测试用例")
+    rows = benchmark_vector_stores(test_cases, chunks, stores=stores, k=k,
+                                   distractors=distractors, hnsw_params=hnsw_params,
+                                   rescore_factor=rescore_factor)
+    print(vector_store_report(rows, k=k))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aura 检索性能基准")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_bm25 = sub.add_parser("bm25", help="BM25 增量索引 vs 全量重建")
+    p_bm25.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    p_bm25.add_argument("--upload-size", type=int, default=50, help="单次上传的 chunk 数")
+
+    p_load = sub.add_parser("bm25-load", help="持久化 BM25 索引的加载耗时")
+    p_load.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+
+    p_tok = sub.add_parser("tokenizers", help="BM25 分词器对比")
+    p_tok.add_argument("--docs", default="data/eval_docs")
+    p_tok.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_tok.add_argument("--k", type=int, default=3)
+
+    p_rerank = sub.add_parser("rerank", help="重排序延迟 p50/p99：逐请求 vs 微批")
+    p_rerank.add_argument("--docs", default="data/eval_docs")
+    p_rerank.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_rerank.add_argument("--candidates", type=int, default=10, help="每个请求的候选文档数")
+    p_rerank.add_argument("--concurrency", type=int, default=8)
+    p_rerank.add_argument("--max-tokens", type=int, default=256)
+
+    p_backends = sub.add_parser("backends", help="推理后端对比（torch / onnx / onnx-int8）")
+    p_backends.add_argument("--docs", default="data/eval_docs")
+    p_backends.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_backends.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    p_backends.add_argument("--k", type=int, default=3)
+
+    p_chunk = sub.add_parser("chunking", help="结构感知切分 vs 固定切分")
+    p_chunk.add_argument("--docs", default="data/eval_docs")
+    p_chunk.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_chunk.add_argument("--k", type=int, default=3)
+    p_chunk.add_argument("--max-chars", type=int, default=1000)
+
+    p_fusion = sub.add_parser("fusion", help="召回融合方式对比（拼接去重 / RRF / 加权，有无重排序）")
+    p_fusion.add_argument("--docs", default="data/eval_docs")
+    p_fusion.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_fusion.add_argument("--k", type=int, default=3)
+    p_fusion.add_argument("--candidates", type=int, default=10, help="每路召回数")
+    p_fusion.add_argument("--rerank-top-n", type=int, default=6, help="重排序的融合候选数")
+
+    p_vs = sub.add_parser("vectorstores", help="向量存储对比（numpy / numpy-int8 / numpy-binary / hnsw / chroma）")
+    p_vs.add_argument("--docs", default="data/eval_docs")
+    p_vs.add_argument("--dataset", default="evaluation/test_dataset.json")
+    p_vs.add_argument("--stores", nargs="+", default=["numpy", "numpy-int8", "numpy-binary", "hnsw", "chroma"])
+    p_vs.add_argument("--k", type=int, default=3)
+    p_vs.add_argument("--distractors", type=int, default=0, help="追加的随机干扰向量数")
+    p_vs.add_argument("--hnsw-m", type=int, default=None)
+    p_vs.add_argument("--hnsw-ef-construction", type=int, default=None)
+    p_vs.add_argument("--hnsw-ef-search", type=int, default=None)
+    p_vs.add_argument("--rescore-factor", type=int, default=4, help="量化存储重打分候选倍数")
+
+    args = parser.parse_args()
+    if args.bench == "bm25":
+        bench_bm25_ingest(sizes=args.sizes, upload_size=args.upload_size)
+    elif args.bench == "bm25-load":
+        bench_bm25_load(sizes=args.sizes)
+    elif args.bench == "tokenizers":
+        bench_tokenizers(docs_dir=args.docs, dataset=args.dataset, k=args.k)
+    elif args.bench == "rerank":
+        bench_rerank(docs_dir=args.docs, dataset=args.dataset, candidates=args.candidates,
+                     concurrency=args.concurrency, max_tokens=args.max_tokens)
+    elif args.bench == "backends":
+        bench_backends(docs_dir=args.docs, dataset=args.dataset, backends=args.backends, k=args.k)
+    elif args.bench == "chunking":
+        bench_chunking(docs_dir=args.docs, dataset=args.dataset, k=args.k, max_chars=args.max_chars)
+    elif args.bench == "fusion":
+        bench_fusion(docs_dir=args.docs, dataset=args.dataset, k=args.k,
+                     candidates=args.candidates, rerank_top_n=args.rerank_top_n)
+    elif args.bench == "vectorstores":
+        hnsw_params = {key: value for key, value in (
+            ("M", args.hnsw_m), ("ef_construction", args.hnsw_ef_construction), ("ef_search", args.hnsw_ef_search),
+        ) if value is not None}
+        bench_vector_stores(docs_dir=args.docs, dataset=args.dataset, stores=args.stores, k=args.k,
+                            distractors=args.distractors, hnsw_params=hnsw_params,
+                            rescore_factor=args.rescore_factor)
+
+
+if __name__ == "__main__":
+    main()
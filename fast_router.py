@@ -0,0 +1,171 @@
+"""
+Aura 本地快速路由
+- RouteClassifier：字 bigram 多项式朴素贝叶斯（类别先验取均匀，避免 RETRIEVE 样本过多导致偏置），
+  从评测数据集的 rag_tests + 内置种子样本训练（agent_tests 留给评测），单次预测为微秒级
+- FastRouter：先查决策缓存 → 本地分类器（置信度达到阈值即采用）→ 否则回退 LLM 路由
+- 决策带来源（cache / local / llm）和耗时，便于 trace 与评测统计
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable
+
+from bm25_index import bigram_tokenize
+from cache import LRUCache
+
+logger = logging.getLogger("AuraRouter")
+
+ROUTES = ("RETRIEVE", "TOOL", "DIRECT")
+DEFAULT_ROUTE = "RETRIEVE"
+
+# 数据集之外的种子样本：保证没有评测数据时三类都有基本覆盖
+SEED_EXAMPLES = [
+    ("查一下我论文里关于 GAN 的内容", "RETRIEVE"),
+    ("请查询知识库回答", "RETRIEVE"),
+    ("文档里是怎么描述这个方法的", "RETRIEVE"),
+    ("我上传的笔记中提到了哪些实验", "RETRIEVE"),
+    ("根据资料，这个项目的负责人是谁", "RETRIEVE"),
+    ("今天北京天气怎么样", "TOOL"),
+    ("搜索一下最新的科技新闻", "TOOL"),
+    ("帮我查一下今天的股票行情", "TOOL"),
+    ("上网搜一下这部电影的评分", "TOOL"),
+    ("请记住我的生日是五月一日", "TOOL"),
+    ("我之前告诉过你我喜欢什么吗", "TOOL"),
+    ("1+1等于几", "DIRECT"),
+    ("用中文写一首关于秋天的诗", "DIRECT"),
+    ("解释一下什么是机器学习", "DIRECT"),
+    ("把这句话翻译成英文", "DIRECT"),
+    ("你好，你是谁", "DIRECT"),
+    ("总结一下我们刚才的对话", "DIRECT"),
+]
+
+# 评测数据集中 expected_tool → 路由
+_TOOL_ROUTES = {"search_knowledge": "RETRIEVE"}
+
+# 评测数据集中可用于训练路由的部分；agent_tests / edge_cases 由 Agent 评估与路由对比评测，不能参与训练
+TRAIN_SPLITS = ("rag_tests",)
+
+
+def examples_from_dataset(dataset: dict) -> list[tuple[str, str]]:
+    """评测数据集 → [(问题, 路由)]：rag_tests 均为 RETRIEVE；agent_tests 按 expected_tool 映射"""
+    examples = [(case["question"], "RETRIEVE") for case in dataset.get("rag_tests", [])]
+    for case in dataset.get("agent_tests", []):
+        tool = case.get("expected_tool")
+        examples.append((case["question"], _TOOL_ROUTES.get(tool, "TOOL") if tool else "DIRECT"))
+    return examples
+
+
+class RouteClassifier:
+    """字 bigram 朴素贝叶斯路由分类器"""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.counts: dict[str, Counter] = {route: Counter() for route in ROUTES}
+        self.totals: dict[str, int] = {route: 0 for route in ROUTES}
+        self.vocab: set[str] = set()
+
+    @staticmethod
+    def features(text: str) -> list[str]:
+        return bigram_tokenize(text)
+
+    def fit(self, examples: Iterable[tuple[str, str]]) -> "RouteClassifier":
+        for text, route in examples:
+            if route not in self.counts:
+                raise ValueError(f"未知路由: {route}，可选: {', '.join(ROUTES)}")
+            tokens = self.features(text)
+            self.counts[route].update(tokens)
+            self.totals[route] += len(tokens)
+            self.vocab.update(tokens)
+        return self
+
+    @classmethod
+    def from_dataset(cls, path: str | None = None, seed: bool = True,
+                     splits: Iterable[str] = TRAIN_SPLITS) -> "RouteClassifier":
+        """用种子样本 +（可选）评测数据集的 splits 部分训练；数据集不存在时只用种子样本"""
+        examples = list(SEED_EXAMPLES) if seed else []
+        if path:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    dataset = json.load(f)
+                examples += examples_from_dataset({split: dataset.get(split, []) for split in splits})
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("路由训练数据不可用，只使用种子样本: %s", e)
+        return cls().fit(examples)
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """返回 (路由, 后验概率)；没有已知特征时后验为均匀分布"""
+        tokens = [t for t in self.features(text) if t in self.vocab]
+        vocab_size = len(self.vocab) or 1
+        scores = {}
+        for route in ROUTES:
+            denom = self.totals[route] + self.alpha * vocab_size
+            counts = self.counts[route]
+            scores[route] = sum(math.log((counts[t] + self.alpha) / denom) for t in tokens)
+        best = max(scores.values())
+        weights = {route: math.exp(score - best) for route, score in scores.items()}
+        total = sum(weights.values())
+        route = max(ROUTES, key=lambda r: weights[r])
+        return route, weights[route] / total
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    source: str          # cache / local / llm
+    confidence: float
+    ms: float
+
+
+class FastRouter:
+    """
+    本地分类器优先、LLM 兜底的路由器（与 QueryRouter 同样提供 route(query) -> str）
+
+    Args:
+        classifier: RouteClassifier
+        fallback: 提供 route(query) 的 LLM 路由器；None 时低置信度直接取分类器结果
+        threshold: 本地分类器后验达到该值才采用
+    """
+
+    def __init__(self, classifier: RouteClassifier, fallback=None, threshold: float = 0.8,
+                 cache_size: int = 1024):
+        self.classifier = classifier
+        self.fallback = fallback
+        self.threshold = threshold
+        self.cache = LRUCache(maxsize=cache_size)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def decide(self, query: str) -> RouteDecision:
+        start = time.perf_counter()
+        key = " ".join(query.lower().split())
+        cached = self.cache.get(key)
+        if cached is not None:
+            decision = RouteDecision(cached.route, "cache", cached.confidence, 0.0)
+        else:
+            route, confidence = self.classifier.predict(query)
+            source = "local"
+            if confidence < self.threshold and self.fallback is not None:
+                route, source = self.fallback.route(query), "llm"
+            decision = RouteDecision(route, source, round(confidence, 4), 0.0)
+            self.cache.set(key, decision)
+        decision.ms = round((time.perf_counter() - start) * 1000, 3)
+        with self._lock:
+            self.counts[decision.source] += 1
+        return decision
+
+    def route(self, query: str) -> str:
+        return self.decide(query).route
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        return {
+            **{source: counts.get(source, 0) for source in ("cache", "local", "llm")},
+            "llm_rate": round(counts.get("llm", 0) / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,144 @@
+"""
+Aura 检索过滤条件
+- 按来源文件（文件名或完整路径）、扩展名、导入时间过滤
+- 向量检索下推为 Chroma where 子句（依赖导入时写入的 file_name / extension / ingested_at 元数据）
+- BM25 检索通过导入清单解析出候选 chunk ID，只对候选打分
+- 进程内向量存储（NumPy / HNSW）用 match_where 在元数据上求值同一套 where 子句
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+
+def parse_timestamp(value: Any) -> float | None:
+    """接受 epoch 秒或 ISO 8601 日期/时间字符串"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"无法解析时间: {value}（支持 epoch 秒或 ISO 8601，如 2024-05-01）") from None
+
+
+def _normalize_extension(ext: str) -> str:
+    ext = ext.strip().lower()
+    return ext if ext.startswith(".") else f".{ext}"
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """不可变、可哈希，可直接作为检索缓存键的一部分"""
+    sources: tuple[str, ...] = ()
+    extensions: tuple[str, ...] = ()
+    ingested_after: float | None = None
+    ingested_before: float | None = None
+
+    @classmethod
+    def from_params(cls, sources: Iterable[str] | str | None = None,
+                    extensions: Iterable[str] | str | None = None,
+                    ingested_after: Any = None, ingested_before: Any = None) -> "SearchFilter":
+        if isinstance(sources, str):
+            sources = [sources]
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        return cls(
+            sources=tuple(sorted({s.strip() for s in sources or () if s and s.strip()})),
+            extensions=tuple(sorted({_normalize_extension(e) for e in extensions or () if e and e.strip()})),
+            ingested_after=parse_timestamp(ingested_after),
+            ingested_before=parse_timestamp(ingested_before),
+        )
+
+    @classmethod
+    def coerce(cls, value: "SearchFilter | dict | None") -> "SearchFilter | None":
+        """None / 空条件返回 None，dict 按 from_params 的参数名解析"""
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = cls.from_params(**value)
+        return value if value else None
+
+    def __bool__(self) -> bool:
+        return bool(self.sources or self.extensions
+                    or self.ingested_after is not None or self.ingested_before is not None)
+
+    def matches(self, source: str, ingested_at: float | None = None) -> bool:
+        """判断一个来源文件是否满足条件（供 BM25 侧按导入清单筛选）"""
+        if self.sources and source not in self.sources and os.path.basename(source) not in self.sources:
+            return False
+        if self.extensions and os.path.splitext(source)[1].lower() not in self.extensions:
+            return False
+        if self.ingested_after is not None and (ingested_at is None or ingested_at < self.ingested_after):
+            return False
+        if self.ingested_before is not None and (ingested_at is None or ingested_at >= self.ingested_before):
+            return False
+        return True
+
+    def to_where(self) -> dict | None:
+        """转换为 Chroma where 子句"""
+        clauses = []
+        if self.sources:
+            clauses.append({"$or": [
+                {"source": {"$in": list(self.sources)}},
+                {"file_name": {"$in": list(self.sources)}},
+            ]})
+        if self.extensions:
+            clauses.append({"extension": {"$in": list(self.extensions)}})
+        if self.ingested_after is not None:
+            clauses.append({"ingested_at": {"$gte": self.ingested_after}})
+        if self.ingested_before is not None:
+            clauses.append({"ingested_at": {"$lt": self.ingested_before}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def file_metadata(source: str, ingested_at: float) -> dict:
+    """导入时写入每个 chunk 的可过滤字段"""
+    return {
+        "file_name": os.path.basename(source),
+        "extension": os.path.splitext(source)[1].lower(),
+        "ingested_at": ingested_at,
+    }
+
+
+_WHERE_OPS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+}
+
+
+def match_where(metadata: dict, where: dict | None) -> bool:
+    """按 Chroma where 语法判断一条元数据是否满足条件（支持 $and / $or 与常用比较运算符）"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, arg in condition.items():
+                if op not in _WHERE_OPS:
+                    raise ValueError(f"不支持的 where 运算符: {op}")
+                if not _WHERE_OPS[op](value, arg):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
@@ -0,0 +1,74 @@
+"""
+Aura 多路召回融合
+- RRF（Reciprocal Rank Fusion）：只看名次，score = Σ w / (rrf_k + rank)，对各路分数尺度不敏感
+- 加权分数融合：每路分数先 min-max 归一化到 [0, 1] 再加权求和
+- 文档按稳定 chunk ID 去重（metadata["chunk_id"]，缺失时由来源 + 正文计算）
+"""
+
+import hashlib
+from typing import Any, Callable, Sequence
+
+FUSION_METHODS = ("rrf", "weighted")
+
+
+def make_chunk_id(doc) -> str:
+    """稳定的 chunk ID：来源路径 + 正文的 sha1，同一内容重复导入得到同一 ID"""
+    source = doc.metadata.get("source", "")
+    return hashlib.sha1(f"{source}\n{doc.page_content}".encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_key(doc) -> str:
+    """文档的去重键：优先使用导入时写入的 chunk_id"""
+    return (doc.metadata or {}).get("chunk_id") or make_chunk_id(doc)
+
+
+def _weights(weights: Sequence[float] | None, n: int) -> list[float]:
+    if weights is None:
+        return [1.0] * n
+    if len(weights) != n:
+        raise ValueError(f"融合权重数量({len(weights)})与召回路数({n})不一致")
+    return [float(w) for w in weights]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[tuple[Any, float]]],
+                           weights: Sequence[float] | None = None, rrf_k: int = 60,
+                           key_fn: Callable[[Any], str] = chunk_key) -> list[tuple[Any, float]]:
+    """RRF 融合，输入每路为按相关度降序的 [(doc, score)]，返回按融合分数降序的 [(doc, score)]"""
+    weights = _weights(weights, len(result_lists))
+    fused: dict[str, list] = {}
+    for weight, results in zip(weights, result_lists):
+        for rank, (doc, _) in enumerate(results, start=1):
+            entry = fused.setdefault(key_fn(doc), [doc, 0.0])
+            entry[1] += weight / (rrf_k + rank)
+    # sorted 是稳定排序：同分时保持首次出现的顺序
+    return sorted(((doc, score) for doc, score in fused.values()), key=lambda x: x[1], reverse=True)
+
+
+def weighted_score_fusion(result_lists: Sequence[Sequence[tuple[Any, float]]],
+                          weights: Sequence[float] | None = None,
+                          key_fn: Callable[[Any], str] = chunk_key) -> list[tuple[Any, float]]:
+    """加权分数融合，输入分数需越大越相关（向量距离请先取负）"""
+    weights = _weights(weights, len(result_lists))
+    fused: dict[str, list] = {}
+    for weight, results in zip(weights, result_lists):
+        if not results:
+            continue
+        scores = [float(score) for _, score in results]
+        low, high = min(scores), max(scores)
+        span = high - low
+        for (doc, _), score in zip(results, scores):
+            norm = (score - low) / span if span > 0 else 1.0
+            entry = fused.setdefault(key_fn(doc), [doc, 0.0])
+            entry[1] += weight * norm
+    return sorted(((doc, score) for doc, score in fused.values()), key=lambda x: x[1], reverse=True)
+
+
+def fuse(result_lists: Sequence[Sequence[tuple[Any, float]]], method: str = "rrf",
+         weights: Sequence[float] | None = None, rrf_k: int = 60,
+         key_fn: Callable[[Any], str] = chunk_key) -> list[tuple[Any, float]]:
+    """按 method 选择融合方式"""
+    if method == "rrf":
+        return reciprocal_rank_fusion(result_lists, weights=weights, rrf_k=rrf_k, key_fn=key_fn)
+    if method == "weighted":
+        return weighted_score_fusion(result_lists, weights=weights, key_fn=key_fn)
+    raise ValueError(f"未知融合方式: {method}，可选: {', '.join(FUSION_METHODS)}")
@@ -0,0 +1,383 @@
+"""
+Aura 流式导入流水线
+load(线程池 / 进程池，逐文件) → split → embed(工作池，按 batch) → write(批量写入，串行)
+
+- 文件加载与切分在线程池中并行，先加载完的文件先进入后续阶段
+- PDF / DOCX 等解析开销大的格式交给进程池加载，绕开 GIL
+- 文本块攒满 batch_size 即提交嵌入，同时在途的批次数有上限（背压）
+- 写入在调用线程串行执行，避免并发写向量库
+- 每个阶段统计条目数与耗时，汇总为 docs/sec
+- IngestManifest 记录每个文件的内容哈希与 chunk ID，重复导入时跳过未变化的文件
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Set
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger("AuraIngest")
+
+
+@dataclass
+class StageStats:
+    """单个阶段的统计（seconds 为各 worker 忙碌时间之和）"""
+    name: str
+    items: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class IngestReport:
+    """一次导入的汇总"""
+    files: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    unchanged_chunks: int = 0
+    wall_seconds: float = 0.0
+    stages: dict[str, StageStats] = field(default_factory=lambda: {
+        name: StageStats(name) for name in ("load", "split", "embed", "write")
+    })
+    errors: list[tuple[str, str]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        parts = [f"{s.name}: {s.items}条 {s.seconds:.2f}s ({s.rate:.1f}/s)" for s in self.stages.values()]
+        return (
+            f"导入 {self.files} 个文件 → {self.chunks} 个文本块"
+            f"（去重 {self.duplicates}，未变化 {self.unchanged_chunks}），"
+            f"总耗时 {self.wall_seconds:.2f}s | " + " | ".join(parts)
+        )
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def directory_size(path: str) -> int:
+    """目录下全部文件的字节数"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def discover_files(directory: str, extensions: Iterable[str], recursive: bool = False) -> list[str]:
+    """查找 directory 下指定扩展名的文件（绝对路径，排序）；recursive 时遍历子目录，跳过隐藏目录"""
+    directory = os.path.abspath(directory)
+    extensions = tuple(ext.lower() for ext in extensions)
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        found.extend(
+            os.path.join(root, name) for name in files
+            if name.lower().endswith(extensions) and not name.startswith(".")
+        )
+        if not recursive:
+            break
+    return sorted(found)
+
+
+@dataclass(frozen=True)
+class FileVersion:
+    """check() 时的文件版本：内容哈希 + 哈希前取得的 stat，由 update() 原样写入清单"""
+    sha256: str
+    mtime_ns: int
+    size: int
+
+
+class ChunkSelection(Set):
+    """
+    IngestManifest.select 的结果：只记录命中的文件，不把全库 chunk ID 展开成集合。
+    成员判断经清单的 chunk → 文件索引查表，过滤条件很宽时每次查询的代价仍只与文件数成正比
+    """
+
+    def __init__(self, files: dict[str, list[str]], chunk_files: dict[str, str]):
+        self._files = files
+        self._chunk_files = chunk_files
+        self._len = sum(len(chunks) for chunks in files.values())
+
+    def __contains__(self, chunk_id) -> bool:
+        return self._chunk_files.get(chunk_id) in self._files
+
+    def __iter__(self):
+        for chunks in self._files.values():
+            yield from chunks
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class IngestManifest:
+    """
+    导入清单：{绝对路径: {sha256, mtime_ns, size, ingested_at, chunks: [chunk_id]}}
+
+    先比较 mtime/size（不读文件），变化了才计算内容哈希，
+    因此对一个大部分文件未变的目录重复导入几乎是瞬时的。
+    读写都持有 _lock：过滤检索（select）可能与导入 / 删除并发；
+    另维护 chunk ID → 文件路径的索引，供 ChunkSelection 按文件判断成员。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        self._chunk_files: dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.reload()
+
+    def reload(self):
+        files = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    files = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("导入清单损坏，将视为全部文件未导入: %s", e)
+        with self._lock:
+            self.files = files
+            self._chunk_files = {
+                chunk_id: path for path, entry in files.items() for chunk_id in entry.get("chunks", [])
+            }
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.files, ensure_ascii=False)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.files
+
+    def check(self, path: str) -> FileVersion | None:
+        """
+        文件未变化返回 None，否则返回新的 FileVersion。
+        stat 在计算哈希之前取得：哈希期间文件又被修改时，清单记下的是旧 stat，下次 check() 会重新哈希
+        """
+        entry = self.files.get(path)
+        stat = os.stat(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return None
+        digest = file_sha256(path)
+        if entry and entry["sha256"] == digest:
+            # 只是 touch 过，刷新 stat 即可
+            with self._lock:
+                entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+            return None
+        return FileVersion(digest, stat.st_mtime_ns, stat.st_size)
+
+    def chunks(self, path: str) -> list[str]:
+        return self.files.get(path, {}).get("chunks", [])
+
+    def update(self, path: str, version: FileVersion, chunk_ids: list[str], ingested_at: float | None = None):
+        """记录文件的 chunk ID；version 必须是导入前 check() 的结果，不在提交时重新 stat"""
+        with self._lock:
+            self._forget(path)
+            self.files[path] = {
+                "sha256": version.sha256,
+                "mtime_ns": version.mtime_ns,
+                "size": version.size,
+                "ingested_at": time.time() if ingested_at is None else ingested_at,
+                "chunks": chunk_ids,
+            }
+            for chunk_id in chunk_ids:
+                self._chunk_files[chunk_id] = path
+
+    def _forget(self, path: str) -> dict:
+        entry = self.files.pop(path, {})
+        for chunk_id in entry.get("chunks", []):
+            if self._chunk_files.get(chunk_id) == path:
+                del self._chunk_files[chunk_id]
+        return entry
+
+    def select(self, predicate: Callable[[str, float | None], bool]) -> ChunkSelection:
+        """满足 predicate(路径, 导入时间) 的文件的全部 chunk ID"""
+        with self._lock:
+            files = {
+                path: entry.get("chunks", [])
+                for path, entry in self.files.items() if predicate(path, entry.get("ingested_at"))
+            }
+            return ChunkSelection(files, self._chunk_files)
+
+    def remove(self, path: str) -> list[str]:
+        """移除文件记录，返回它的 chunk ID"""
+        with self._lock:
+            return self._forget(path).get("chunks", [])
+
+    def match_source(self, source: str) -> list[str]:
+        """
+        按来源解析清单中的文件：文件路径精确匹配、目录匹配其下全部文件；
+        不含路径分隔符时还按文件名匹配（同名文件会全部命中）
+        """
+        target = os.path.abspath(source)
+        prefix = os.path.join(target, "")
+        by_name = os.path.basename(source) == source
+        with self._lock:
+            paths = list(self.files)
+        return [
+            path for path in paths
+            if path == target or path.startswith(prefix)
+            or (by_name and os.path.basename(path) == source)
+        ]
+
+    def missing_files(self, directory: str, extension: str | tuple[str, ...] = "",
+                      recursive: bool = True) -> list[str]:
+        """清单中位于 directory 下（同扩展名）但已被删除的文件；recursive=False 时只看这一层"""
+        directory = os.path.join(os.path.abspath(directory), "")
+        with self._lock:
+            paths = list(self.files)
+        return [
+            path for path in paths
+            if path.startswith(directory) and path.lower().endswith(extension)
+            and (recursive or os.path.dirname(path) == directory.rstrip(os.sep))
+            and not os.path.exists(path)
+        ]
+
+
+class IngestPipeline:
+    """
+    Args:
+        load_fn: path -> list[doc]
+        split_fn: list[doc] -> list[chunk]
+        embed_fn: list[str] -> list[vector]
+        write_fn: (list[chunk], list[vector]) -> None
+        filter_fn: (path, list[chunk]) -> list[chunk]（可选），在调用线程中决定哪些块需要嵌入
+        key_fn: chunk -> 去重键（可选），同一次导入中重复的块只写一次
+        text_fn: chunk -> 用于嵌入的文本
+        process_extensions: 这些扩展名的文件在进程池中加载（load_fn 需可被 pickle，即模块级函数）
+        process_workers: 进程池大小，0 表示全部在线程池中加载
+    """
+
+    def __init__(self, load_fn: Callable, split_fn: Callable, embed_fn: Callable, write_fn: Callable,
+                 filter_fn: Callable | None = None, key_fn: Callable | None = None,
+                 text_fn: Callable[[Any], str] = lambda chunk: chunk.page_content,
+                 batch_size: int = 64, load_workers: int = 4, embed_workers: int = 2,
+                 process_extensions: Iterable[str] = (), process_workers: int = 0):
+        self.load_fn = load_fn
+        self.split_fn = split_fn
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.filter_fn = filter_fn
+        self.key_fn = key_fn
+        self.text_fn = text_fn
+        self.batch_size = max(1, batch_size)
+        self.load_workers = max(1, load_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.process_extensions = tuple(ext.lower() for ext in process_extensions)
+        self.process_workers = max(0, process_workers)
+        self._process_pool = None
+
+    def _load(self, path):
+        if self._process_pool is not None and str(path).lower().endswith(self.process_extensions):
+            # 线程在此等待子进程解析完成，加载并发度仍由 load_workers 控制
+            return self._process_pool.submit(self.load_fn, path).result()
+        return self.load_fn(path)
+
+    def _load_and_split(self, path):
+        start = time.perf_counter()
+        docs = self._load(path)
+        loaded = time.perf_counter()
+        chunks = self.split_fn(docs)
+        return docs, chunks, loaded - start, time.perf_counter() - loaded
+
+    def _embed(self, batch):
+        start = time.perf_counter()
+        vectors = self.embed_fn([self.text_fn(chunk) for chunk in batch])
+        return batch, vectors, time.perf_counter() - start
+
+    def run(self, paths: Iterable[str]) -> IngestReport:
+        report = IngestReport()
+        stages = report.stages
+        seen = set()
+        buffer = []
+        pending = set()
+        wall_start = time.perf_counter()
+        paths = list(paths)
+
+        def write(future):
+            batch, vectors, embed_s = future.result()
+            stages["embed"].items += len(batch)
+            stages["embed"].seconds += embed_s
+            start = time.perf_counter()
+            self.write_fn(batch, vectors)
+            stages["write"].items += len(batch)
+            stages["write"].seconds += time.perf_counter() - start
+            report.chunks += len(batch)
+            logger.info("已写入 %d 个文本块", report.chunks)
+
+        def submit(batch):
+            pending.add(embed_pool.submit(self._embed, batch))
+            # 背压：在途批次过多时先消费已完成的
+            while len(pending) >= self.embed_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    write(future)
+
+        with ExitStack() as stack:
+            if self.process_workers and any(str(p).lower().endswith(self.process_extensions) for p in paths):
+                # spawn：子进程只导入 load_fn 所在模块，不继承父进程的模型与线程
+                self._process_pool = stack.enter_context(ProcessPoolExecutor(
+                    self.process_workers, mp_context=multiprocessing.get_context("spawn")
+                ))
+                stack.callback(setattr, self, "_process_pool", None)
+            load_pool = stack.enter_context(ThreadPoolExecutor(self.load_workers, thread_name_prefix="ingest-load"))
+            embed_pool = stack.enter_context(ThreadPoolExecutor(self.embed_workers, thread_name_prefix="ingest-embed"))
+
+            futures = {load_pool.submit(self._load_and_split, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    docs, chunks, load_s, split_s = future.result()
+                except Exception as e:
+                    logger.warning("加载文件 %s 时出错: %s", path, e)
+                    report.errors.append((str(path), str(e)))
+                    continue
+                report.files += 1
+                stages["load"].items += len(docs)
+                stages["load"].seconds += load_s
+                stages["split"].items += len(chunks)
+                stages["split"].seconds += split_s
+
+                if self.filter_fn is not None:
+                    kept = self.filter_fn(path, chunks)
+                    report.unchanged_chunks += len(chunks) - len(kept)
+                    chunks = kept
+                for chunk in chunks:
+                    if self.key_fn is not None:
+                        key = self.key_fn(chunk)
+                        if key in seen:
+                            report.duplicates += 1
+                            continue
+                        seen.add(key)
+                    buffer.append(chunk)
+                while len(buffer) >= self.batch_size:
+                    submit(buffer[:self.batch_size])
+                    buffer = buffer[self.batch_size:]
+
+            if buffer:
+                submit(buffer)
+            for future in as_completed(pending):
+                write(future)
+
+        report.wall_seconds = time.perf_counter() - wall_start
+        return report
@@ -23,6 +23,7 @@ class Config:
     ollama_url: str = "http://localhost:11434"
     temperature: float = 0.3
     num_ctx: int = 32000
+    llm_cache: bool = True  # 缓存表单映射的 LLM 输出（同一页面 + 简历重复填写时不再调用 LLM）
 
     # 爬取
     target_positions: list = field(default_factory=lambda: [
@@ -18,6 +18,7 @@ from typing import Optional
 from playwright.async_api import async_playwright
 from langchain_ollama import ChatOllama
 
+from llm_cache import LLMCache, cached_invoke
 from .config import Config, load_resume_data, DATA_DIR
 from .models import Job
 
@@ -259,14 +260,18 @@ async def _find_or_open_page(browser, url: str):
 class FormFiller:
     """网页表单自动填写器 — CDP + 单次LLM"""
 
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, llm_cache: Optional[LLMCache] = None):
         self.config = config or Config.load()
         self.llm = ChatOllama(
             model=self.config.model,
             base_url=self.config.ollama_url,
-            temperature=0.1,
+            temperature=0,  # 映射结果会被缓存，需确定性输出
             num_ctx=self.config.num_ctx,
         )
+        if llm_cache is None and self.config.llm_cache:
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            llm_cache = LLMCache(str(DATA_DIR / "llm_cache.sqlite"))
+        self.llm_cache = llm_cache
         self.resume = load_resume_data()
 
     async def diagnose(self, url: str) -> list:
@@ -313,8 +318,8 @@ class FormFiller:
             # 2. 单次 LLM 映射（/no_think 跳过推理）
             logger.info("AI 映射中...")
             prompt = _build_prompt(fields, self.resume, job)
-            resp = self.llm.invoke(prompt)
-            raw = resp.content
+            raw = cached_invoke(self.llm_cache, self.llm, prompt, "form_mapping",
+                                validate=lambda text: bool(_parse_mapping(text)))
             logger.debug(f"LLM 原始输出: {raw[:500]}")
             mapping = _parse_mapping(raw)
             if not mapping:
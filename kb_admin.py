@@ -0,0 +1,218 @@
+"""
+Aura 知识库维护
+- 按来源删除文档（向量 + BM25 倒排）
+- 压缩持久化目录：BM25 快照合并日志、SQLite VACUUM、清理孤立的 Chroma 段目录
+  Chroma 部分（chroma.sqlite3 VACUUM + 段目录清理）只能离线执行：需先停止 API 服务，
+  且在本进程打开 Chroma 客户端之前完成，否则会在客户端持有连接 / 段文件时改动它们
+
+使用方法:
+    python kb_admin.py delete data/old.md        # 删除单个文件的全部文本块
+    python kb_admin.py delete data/papers        # 删除目录下所有已导入文件
+    python kb_admin.py delete old.md             # 按文件名删除（同名文件全部删除）
+    python kb_admin.py compact                   # 回收 db 目录空间（先停止 API 服务）
+    python kb_admin.py --store hnsw compact      # 进程内向量存储（numpy / hnsw）的知识库
+    python kb_admin.py stats                     # 查看知识库规模与占用
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from bm25_index import META_FILE as BM25_META_FILE
+from bm25_index import BM25Index
+from ingest import directory_size
+from vector_store import QUANTIZATIONS, VECTOR_STORES, HnswStore, open_store
+
+logger = logging.getLogger("AuraKBAdmin")
+
+CHROMA_SQLITE = "chroma.sqlite3"
+CACHE_FILES = ("embedding_cache.sqlite", "llm_cache.sqlite")
+
+
+def vacuum_sqlite(path: str) -> bool:
+    """对 SQLite 文件执行 VACUUM 回收删除留下的空闲页；文件不存在或被占用时返回 False"""
+    if not os.path.exists(path):
+        return False
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+        return True
+    except sqlite3.OperationalError as e:
+        logger.warning("VACUUM %s 失败: %s", path, e)
+        return False
+    finally:
+        conn.close()
+
+
+def _is_uuid(name: str) -> bool:
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+def orphan_segment_dirs(persist_directory: str) -> list[str]:
+    """
+    Chroma 按段 ID 建立 HNSW 目录，删除 / 重建集合后旧目录不会被清理。
+    返回 chroma.sqlite3 segments 表中已不存在的 UUID 目录。
+    """
+    db_path = os.path.join(persist_directory, CHROMA_SQLITE)
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    except sqlite3.OperationalError as e:
+        logger.warning("无法读取 Chroma 段信息，跳过孤立目录清理: %s", e)
+        return []
+    finally:
+        conn.close()
+    return [
+        os.path.join(persist_directory, name)
+        for name in os.listdir(persist_directory)
+        if _is_uuid(name) and name not in live and os.path.isdir(os.path.join(persist_directory, name))
+    ]
+
+
+def remove_dirs(paths: list[str]) -> int:
+    """删除目录，返回回收的字节数"""
+    reclaimed = 0
+    for path in paths:
+        reclaimed += directory_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info("已删除孤立段目录: %s", path)
+    return reclaimed
+
+
+def compact_chroma(persist_directory: str) -> dict:
+    """离线压缩 Chroma：VACUUM chroma.sqlite3 并删除孤立段目录。调用时不能有任何进程打开该 Chroma 库"""
+    vacuumed = [CHROMA_SQLITE] if vacuum_sqlite(os.path.join(persist_directory, CHROMA_SQLITE)) else []
+    orphans = orphan_segment_dirs(persist_directory)
+    remove_dirs(orphans)
+    return {"vacuumed": vacuumed, "orphan_segments_removed": len(orphans)}
+
+
+def _open_bm25(directory: str) -> BM25Index:
+    """按快照记录的分词器打开 BM25 索引；分词器不一致时 open() 会丢弃快照，维护工具不能替用户改分词器"""
+    tokenizer = "bigram"
+    try:
+        with open(os.path.join(directory, BM25_META_FILE), "r", encoding="utf-8") as f:
+            tokenizer = json.load(f).get("tokenizer", tokenizer)
+    except (OSError, ValueError):
+        pass
+    return BM25Index.open(directory, tokenizer=tokenizer)
+
+
+def compact_vectors(directory: str, kind: str, quantization: str | None = None) -> None:
+    """压缩进程内向量存储：落盘并清理旧版本向量文件；hnsw 按保存时的 M 重建索引，丢弃 mark_deleted 留下的节点"""
+    params = {}
+    labels_path = os.path.join(directory, HnswStore.LABELS_FILE)
+    if kind == "hnsw" and os.path.exists(labels_path):
+        # 沿用保存时的 M，避免按默认参数重建后服务端再重建一次
+        with open(labels_path, "r", encoding="utf-8") as f:
+            params["M"] = json.load(f).get("M")
+    open_store(kind, directory, quantization=quantization, **params).compact()
+
+
+def _offline_compact(db: str, store: str = "chroma", quantization: str | None = None) -> dict:
+    """
+    离线压缩：只打开配置的向量存储与 BM25 索引，不加载嵌入模型。
+    chroma 在本进程未打开客户端时直接 VACUUM 并清理孤立段目录；numpy / hnsw 落盘并清理旧版本文件
+    """
+    start = time.time()
+    before = directory_size(db)
+    vacuumed, orphans = [], 0
+    if store == "chroma":
+        if os.path.isdir(db):
+            chroma = compact_chroma(db)
+            vacuumed, orphans = chroma["vacuumed"], chroma["orphan_segments_removed"]
+    elif os.path.isdir(os.path.join(db, "vectors")):
+        compact_vectors(os.path.join(db, "vectors"), store, quantization)
+    bm25_dir = os.path.join(db, "bm25")
+    if os.path.isdir(bm25_dir):
+        # 打开时重放日志，save() 写入快照并截断日志
+        index = _open_bm25(bm25_dir)
+        try:
+            index.save()
+        finally:
+            index.close()
+    vacuumed += [name for name in CACHE_FILES if vacuum_sqlite(os.path.join(db, name))]
+    after = directory_size(db)
+    return {
+        "bytes_before": before,
+        "bytes_after": after,
+        "reclaimed_bytes": before - after,
+        "vacuumed": vacuumed,
+        "orphan_segments_removed": orphans,
+        "seconds": round(time.time() - start, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aura 知识库维护")
+    parser.add_argument("--db", default="db", help="知识库目录（默认 db）")
+    parser.add_argument("--store", default="chroma", choices=VECTOR_STORES, help="向量存储（与服务端配置一致，默认 chroma）")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, help="numpy 存储的量化方式（与服务端配置一致）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    delete = sub.add_parser("delete", help="按来源删除文档")
+    delete.add_argument("sources", nargs="+", help="文件路径、目录或文件名")
+    delete.add_argument("--compact", action="store_true", help="删除后立即压缩")
+    # 内部参数：--compact 的子进程把 JSON 结果写入该文件，而不是从混有加载日志的 stdout 中解析
+    delete.add_argument("--result", help=argparse.SUPPRESS)
+    sub.add_parser("compact", help="回收持久化目录空间")
+    sub.add_parser("stats", help="知识库规模与磁盘占用")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        print(json.dumps(_offline_compact(args.db, args.store, args.quantization), ensure_ascii=False, indent=2))
+        return 0
+    if args.command == "delete" and args.compact:
+        # 删除会打开 Chroma 客户端：放在子进程中执行，子进程退出后本进程再离线压缩
+        fd, result_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            cmd = [sys.executable, os.path.abspath(__file__), "--db", args.db, "--store", args.store]
+            if args.quantization:
+                cmd += ["--quantization", args.quantization]
+            proc = subprocess.run(
+                [*cmd, "delete", "--result", result_path, *args.sources],
+                capture_output=True, text=True, encoding="utf-8",
+            )
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr)
+                return proc.returncode
+            with open(result_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        finally:
+            os.remove(result_path)
+        result["compact"] = _offline_compact(args.db, args.store, args.quantization)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    from rag import RAGSystem
+
+    # 维护操作不需要重排序模型
+    rag = RAGSystem(persist_directory=args.db, enable_reranker=False,
+                    vector_store=args.store, vector_quantization=args.quantization)
+    if args.command == "delete":
+        result = {"deleted": [rag.delete_source(source) for source in args.sources]}
+        if args.result:
+            with open(args.result, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+    else:
+        result = rag.knowledge_stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Aura 检索延迟预算
+- LatencyModel：按阶段记录实测延迟的指数滑动平均（各路召回 / 每个重排序候选）
+- plan_pipeline：给定预算（毫秒）时按固定顺序降级，直到预估耗时落入预算：
+  缩小重排序候选 → 跳过重排序 → 只保留主召回通道（默认向量）并缩小召回深度
+- 预算只是计划依据，执行时还会把剩余时间作为各路召回的超时、并在召回后按剩余时间重新决定重排序
+- 被降级跳过的阶段不再产生新样本，因此估计值按距上次观测的时间向默认值衰减（半衰期 half_life_s），
+  负载消失后计划会自动恢复完整流水线
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+
+# 尚无实测数据时的预估值（毫秒）
+DEFAULT_ESTIMATES_MS = {
+    "vector": 40.0,
+    "bm25": 10.0,
+    "rerank_per_candidate": 8.0,
+    "overhead": 2.0,
+}
+
+
+class LatencyModel:
+    """各阶段延迟的指数滑动平均（线程安全）；half_life_s 为 None 时不衰减"""
+
+    def __init__(self, alpha: float = 0.2, defaults: dict[str, float] | None = None,
+                 half_life_s: float | None = 60.0):
+        self.alpha = alpha
+        self.defaults = dict(DEFAULT_ESTIMATES_MS if defaults is None else defaults)
+        self.half_life_s = half_life_s
+        self._ewma: dict[str, tuple[float, float]] = {}   # stage -> (估计值, 最近观测时刻)
+        self._lock = threading.Lock()
+
+    def _decayed(self, stage: str, now: float) -> float | None:
+        entry = self._ewma.get(stage)
+        if entry is None:
+            return None
+        value, observed_at = entry
+        if not self.half_life_s:
+            return value
+        prior = self.defaults.get(stage, 0.0)
+        return prior + (value - prior) * 0.5 ** ((now - observed_at) / self.half_life_s)
+
+    def observe(self, stage: str, ms: float):
+        now = time.monotonic()
+        with self._lock:
+            previous = self._decayed(stage, now)
+            value = ms if previous is None else previous + self.alpha * (ms - previous)
+            self._ewma[stage] = (value, now)
+
+    def estimate(self, stage: str) -> float:
+        with self._lock:
+            value = self._decayed(stage, time.monotonic())
+        # 保留到微秒：刚观测过的阶段估计值不受纳秒级衰减影响
+        return self.defaults.get(stage, 0.0) if value is None else round(value, 3)
+
+    def snapshot(self) -> dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            merged = {**self.defaults, **{stage: self._decayed(stage, now) for stage in self._ewma}}
+        return {stage: round(ms, 2) for stage, ms in merged.items()}
+
+
+@dataclass
+class PipelinePlan:
+    """一次检索的执行计划；rerank_n 为 0 表示不重排序"""
+    legs: tuple[str, ...]
+    depth: int
+    rerank_n: int
+    estimate_ms: float
+    degraded: list[str] = field(default_factory=list)
+
+
+def plan_cost(model: LatencyModel, legs, rerank_n: int) -> float:
+    """预估耗时：各路并发召回取最慢一路 + 重排序 + 固定开销"""
+    recall = max((model.estimate(leg) for leg in legs), default=0.0)
+    return recall + rerank_n * model.estimate("rerank_per_candidate") + model.estimate("overhead")
+
+
+def rerank_fit(model: LatencyModel, remaining_ms: float) -> int:
+    """剩余时间内能重排序的候选数"""
+    per_candidate = model.estimate("rerank_per_candidate")
+    if per_candidate <= 0:
+        return 1 << 30
+    return max(0, int((remaining_ms - model.estimate("overhead")) / per_candidate))
+
+
+def plan_pipeline(budget_ms: float | None, model: LatencyModel, legs, k: int, rerank_top_n: int,
+                  use_rerank: bool = True, primary: str = "vector") -> PipelinePlan:
+    """
+    按预算生成执行计划。budget_ms 为 None 时返回完整流水线。
+    降级顺序：重排序候选从 rerank_top_n 缩小到 k → 跳过重排序 → 只走 primary 一路、召回深度降到 k。
+    """
+    legs = tuple(legs)
+    depth = k * 2
+    rerank_n = max(k, rerank_top_n) if use_rerank else 0
+    plan = PipelinePlan(legs, depth, rerank_n, plan_cost(model, legs, rerank_n))
+    if budget_ms is None or plan.estimate_ms <= budget_ms:
+        return plan
+
+    if rerank_n:
+        fit = rerank_fit(model, budget_ms - plan_cost(model, legs, 0) + model.estimate("overhead"))
+        if fit >= k:
+            plan.rerank_n = min(rerank_n, fit)
+            plan.degraded.append(f"rerank_pool:{rerank_n}->{plan.rerank_n}")
+        else:
+            plan.rerank_n = 0
+            plan.degraded.append("skip_rerank")
+        plan.estimate_ms = plan_cost(model, legs, plan.rerank_n)
+        if plan.estimate_ms <= budget_ms:
+            return plan
+
+    if primary in legs and len(legs) > 1:
+        plan.legs = (primary,)
+        plan.depth = k
+        plan.degraded.append(f"{primary}_only")
+        plan.estimate_ms = plan_cost(model, plan.legs, plan.rerank_n)
+    return plan
@@ -0,0 +1,194 @@
+"""
+Aura LLM 响应缓存
+- 两级缓存：内存 LRU → SQLite，键为 sha256(模型 + 生成参数 + prompt)
+- 只用于确定性调用（temperature=0 的路由 / 评测打分 / 表单映射）：相同输入直接返回上次的输出，
+  temperature 非 0 的调用直接透传、不读写缓存
+- SQLite 表按 max_age（秒）与 max_entries 清理：打开时及每写入 PRUNE_EVERY 条清理一次
+- 组件按需接入：cached_invoke(cache, llm, prompt, namespace)，cache 为 None 时等同直接调用
+- 命中率按 namespace（router / judge / form_mapping ...）分别统计
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable
+
+from cache import LRUCache
+
+logger = logging.getLogger("AuraLLMCache")
+
+# 参与缓存键的生成参数（存在且为标量时才计入）
+_PARAM_FIELDS = ("temperature", "top_p", "top_k", "num_ctx", "num_predict", "max_tokens", "seed")
+
+
+def llm_identity(llm) -> tuple[str, dict]:
+    """(模型标识, 生成参数)：兼容 ChatOpenAI(model_name) / Ollama(model) / 自定义包装器"""
+    model = next(
+        (value for value in (getattr(llm, "model_name", None), getattr(llm, "model", None))
+         if isinstance(value, str)),
+        "",
+    )
+    params = {}
+    for name in _PARAM_FIELDS:
+        value = getattr(llm, name, None)
+        if isinstance(value, (bool, int, float, str)):
+            params[name] = value
+    return f"{type(llm).__name__}:{model}", params
+
+
+def is_deterministic(params: dict) -> bool:
+    """未设置 temperature 或 temperature 为 0 时，输出才可缓存"""
+    try:
+        return float(params.get("temperature", 0)) == 0
+    except (TypeError, ValueError):
+        return False
+
+
+def response_text(raw) -> str:
+    return raw.content if hasattr(raw, "content") else str(raw)
+
+
+class LLMCache:
+    """prompt → completion 缓存；path 为 None 时只用内存"""
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str | None = None, memory_size: int = 2048,
+                 max_entries: int | None = 50_000, max_age: float | None = 30 * 86400):
+        self.path = path
+        self.memory = LRUCache(maxsize=memory_size)
+        self.counts: dict[str, Counter] = defaultdict(Counter)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, completion TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS completions_created ON completions (created)")
+            self._conn.commit()
+            self.prune()
+
+    @staticmethod
+    def key(model: str, prompt: str, params: dict | None = None) -> str:
+        payload = json.dumps({"model": model, "params": params or {}, "prompt": prompt},
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, namespace: str = "default") -> str | None:
+        value = self.memory.get(key)
+        outcome = "memory_hits"
+        if value is None and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT completion FROM completions WHERE key = ? AND created >= ?", (key, self._cutoff())
+                ).fetchone()
+            if row is not None:
+                value = row[0]
+                self.memory.set(key, value)
+                outcome = "disk_hits"
+        if value is None:
+            outcome = "misses"
+        with self._lock:
+            self.counts[namespace][outcome] += 1
+        return value
+
+    def set(self, key: str, completion: str, model: str = ""):
+        self.memory.set(key, completion)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, completion, created) VALUES (?, ?, ?, ?)",
+                    (key, model, completion, time.time()),
+                )
+                self._conn.commit()
+                self._writes += 1
+                due = self._writes % self.PRUNE_EVERY == 0
+            if due:
+                self.prune()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.max_age if self.max_age is not None else float("-inf")
+
+    def prune(self) -> int:
+        """删除超过 max_age 的条目，并只保留最新的 max_entries 条；返回删除条数"""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM completions WHERE created < ?", (self._cutoff(),)).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    "SELECT key FROM completions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info("LLM 响应缓存清理 %d 条", removed)
+        return removed
+
+    def clear(self):
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM completions")
+                self._conn.commit()
+
+    @staticmethod
+    def _rates(counts: Counter) -> dict:
+        hits = counts["memory_hits"] + counts["disk_hits"]
+        total = hits + counts["misses"]
+        return {
+            "memory_hits": counts["memory_hits"],
+            "disk_hits": counts["disk_hits"],
+            "misses": counts["misses"],
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {namespace: Counter(c) for namespace, c in self.counts.items()}
+        total = sum(counts.values(), Counter())
+        return {
+            **self._rates(total),
+            "memory_size": len(self.memory),
+            "namespaces": {namespace: self._rates(c) for namespace, c in sorted(counts.items())},
+        }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+def cached_invoke(cache: LLMCache | None, llm, prompt: str, namespace: str = "default",
+                  call: Callable[[], Any] | None = None,
+                  validate: Callable[[str], bool] | None = None) -> str:
+    """
+    返回 LLM 对 prompt 的输出文本。
+    cache 不为 None 时先查缓存，未命中再执行 call()（默认 llm.invoke(prompt)）并写入；
+    validate 返回 False 的输出（如无法解析）不写入缓存，下次仍会重新调用；
+    temperature 非 0 的 LLM 输出不确定，直接调用、不读写缓存
+    """
+    call = call or (lambda: llm.invoke(prompt))
+    if cache is None:
+        return response_text(call())
+    model, params = llm_identity(llm)
+    if not is_deterministic(params):
+        return response_text(call())
+    key = cache.key(model, prompt, params)
+    text = cache.get(key, namespace)
+    if text is None:
+        text = response_text(call())
+        if validate is None or validate(text):
+            cache.set(key, text, model)
+    return text
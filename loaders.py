@@ -0,0 +1,31 @@
+"""
+Aura 文档加载器
+- 按扩展名注册加载器，新增格式只需在 LOADERS 中加一行
+- 本模块只依赖 langchain 加载器，可被导入流水线的进程池直接 import（不加载嵌入模型）
+"""
+
+import os
+
+from langchain_community.document_loaders import CSVLoader, Docx2txtLoader, PyPDFLoader, TextLoader
+
+# 扩展名 → 加载器工厂
+LOADERS = {
+    ".md": lambda path: TextLoader(path, encoding="utf-8"),
+    ".txt": lambda path: TextLoader(path, encoding="utf-8"),
+    ".pdf": PyPDFLoader,
+    ".csv": CSVLoader,
+    ".doc": Docx2txtLoader,
+    ".docx": Docx2txtLoader,
+}
+
+SUPPORTED_EXTENSIONS = tuple(LOADERS)
+
+# 解析开销大、适合放进进程池的格式
+CPU_HEAVY_EXTENSIONS = (".pdf", ".doc", ".docx")
+
+
+def load_file(path: str):
+    """根据扩展名选择加载器；未注册的扩展名按 UTF-8 文本加载"""
+    extension = os.path.splitext(path)[1].lower()
+    factory = LOADERS.get(extension, LOADERS[".txt"])
+    return factory(path).load()
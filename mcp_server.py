@@ -59,20 +59,28 @@ def get_rag_system():
 
 # ============== MCP 工具函数 ==============
 
-def search_knowledge(query: str, top_k: int = 5) -> dict:
+def search_knowledge(query: str, top_k: int = 5, sources: list | None = None,
+                     extensions: list | None = None, ingested_after: str | None = None) -> dict:
     """
     语义搜索私有知识库
     
     Args:
         query: 搜索关键词或问题
         top_k: 返回结果数量
+        sources: 只在这些文档中搜索（文件名或完整路径）
+        extensions: 只搜索这些格式，如 ["pdf", "md"]
+        ingested_after: 只搜索该时间之后导入的文档（ISO 8601 或 epoch 秒）
     
     Returns:
         匹配的文档片段列表
     """
     try:
+        from filters import SearchFilter
+        filters = SearchFilter.from_params(
+            sources=sources, extensions=extensions, ingested_after=ingested_after
+        ) or None
         rag = get_rag_system()
-        results = rag.search(query, k=top_k)
+        results = rag.search(query, k=top_k, filters=filters)
         
         matches = []
         for i, doc in enumerate(results):
@@ -84,6 +92,11 @@ def search_knowledge(query: str, top_k: int = 5) -> dict:
         
         return {
             "query": query,
+            "filters": {
+                "sources": list(filters.sources),
+                "extensions": list(filters.extensions),
+                "ingested_after": filters.ingested_after,
+            } if filters else None,
             "total_matches": len(matches),
             "matches": matches
         }
@@ -177,6 +190,20 @@ MCP_TOOLS = {
                     "type": "integer",
                     "description": "返回结果数量，默认5",
                     "default": 5
+                },
+                "sources": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "只在这些文档中搜索（文件名，如 paper.pdf）。用户点名某个文档时使用"
+                },
+                "extensions": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "只搜索这些格式，如 [\"pdf\", \"md\"]"
+                },
+                "ingested_after": {
+                    "type": "string",
+                    "description": "只搜索该时间之后导入的文档，ISO 8601 日期，如 2024-05-01"
                 }
             },
             "required": ["query"]
@@ -248,7 +275,10 @@ def handle_request(request: dict) -> dict:
             if tool_name == "search_knowledge":
                 tool_result = search_knowledge(
                     query=tool_args.get("query", ""),
-                    top_k=tool_args.get("top_k", 5)
+                    top_k=tool_args.get("top_k", 5),
+                    sources=tool_args.get("sources"),
+                    extensions=tool_args.get("extensions"),
+                    ingested_after=tool_args.get("ingested_after"),
                 )
             elif tool_name == "list_documents":
                 tool_result = list_documents()
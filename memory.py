@@ -6,6 +6,7 @@ Aura AI - 长期记忆模块
 import json
 import os
 import logging
+import threading
 from datetime import datetime
 from typing import Dict, List, Any
 
@@ -28,6 +29,8 @@ def _should_encrypt() -> bool:
 class LongTermMemory:
     def __init__(self, memory_file="memory.json"):
         self.memory_file = memory_file
+        # 多个会话并发读写同一份长期记忆：修改与落盘都在锁内完成
+        self._lock = threading.RLock()
         self.memories = self._load_memories()
 
     # ------------------------------------------------------------------
@@ -75,54 +78,59 @@ class LongTermMemory:
             return default
 
     def _save_memories(self):
-        """保存记忆到文件"""
-        payload = json.dumps(self.memories, ensure_ascii=False, indent=2)
+        """保存记忆到文件（先写临时文件再替换，避免并发或中断时留下半截文件）"""
+        with self._lock:
+            payload = json.dumps(self.memories, ensure_ascii=False, indent=2)
 
-        if _should_encrypt():
-            try:
-                encrypted = encrypt_text(payload)
-                with open(self.memory_file, "w", encoding="utf-8") as f:
-                    f.write(ENCRYPTED_MARKER + encrypted)
-                return
-            except Exception as e:
-                logger.error("加密保存失败，回退为明文: %s", e)
+            if _should_encrypt():
+                try:
+                    payload = ENCRYPTED_MARKER + encrypt_text(payload)
+                except Exception as e:
+                    logger.error("加密保存失败，回退为明文: %s", e)
 
-        with open(self.memory_file, "w", encoding="utf-8") as f:
-            f.write(payload)
+            tmp_file = f"{self.memory_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_file, self.memory_file)
 
     # ------------------------------------------------------------------
     # 对话记录
     # ------------------------------------------------------------------
-    def add_conversation(self, user_input: str, ai_response: str):
-        """添加对话记录"""
+    def add_conversation(self, user_input: str, ai_response: str, session_id: str | None = None):
+        """添加对话记录（session_id 可选，用于区分并发会话）"""
         conversation = {
             "timestamp": datetime.now().isoformat(),
             "user_input": user_input,
             "ai_response": ai_response,
         }
-        self.memories["conversations"].append(conversation)
+        if session_id is not None:
+            conversation["session_id"] = session_id
+
+        with self._lock:
+            self.memories["conversations"].append(conversation)
 
-        max_conversations = 500
-        if len(self.memories["conversations"]) > max_conversations:
-            self.memories["conversations"] = self.memories["conversations"][
-                -max_conversations:
-            ]
+            max_conversations = 500
+            if len(self.memories["conversations"]) > max_conversations:
+                self.memories["conversations"] = self.memories["conversations"][
+                    -max_conversations:
+                ]
 
-        self._save_memories()
+            self._save_memories()
 
     # ------------------------------------------------------------------
     # 事实 / 偏好
     # ------------------------------------------------------------------
     def add_fact(self, category: str, key: str, value: Any):
         """添加事实性知识"""
-        if category not in self.memories["facts"]:
-            self.memories["facts"][category] = {}
+        with self._lock:
+            if category not in self.memories["facts"]:
+                self.memories["facts"][category] = {}
 
-        self.memories["facts"][category][key] = {
-            "value": value,
-            "timestamp": datetime.now().isoformat(),
-        }
-        self._save_memories()
+            self.memories["facts"][category][key] = {
+                "value": value,
+                "timestamp": datetime.now().isoformat(),
+            }
+            self._save_memories()
 
     def get_fact(self, category: str, key: str) -> Any:
         """获取事实性知识"""
@@ -134,11 +142,12 @@ class LongTermMemory:
 
     def set_preference(self, key: str, value: Any):
         """设置用户偏好"""
-        self.memories["preferences"][key] = {
-            "value": value,
-            "timestamp": datetime.now().isoformat(),
-        }
-        self._save_memories()
+        with self._lock:
+            self.memories["preferences"][key] = {
+                "value": value,
+                "timestamp": datetime.now().isoformat(),
+            }
+            self._save_memories()
 
     def get_preference(self, key: str) -> Any:
         """获取用户偏好"""
@@ -153,8 +162,9 @@ class LongTermMemory:
 
     def clear_conversations(self):
         """清除所有对话记录（隐私操作）"""
-        self.memories["conversations"] = []
-        self._save_memories()
+        with self._lock:
+            self.memories["conversations"] = []
+            self._save_memories()
         logger.info("对话记录已清除")
 
 
@@ -13,13 +13,34 @@ except ImportError:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from langchain_community.document_loaders import DirectoryLoader, TextLoader, PyPDFLoader, CSVLoader, UnstructuredMarkdownLoader, Docx2txtLoader
-from langchain_community.retrievers import BM25Retriever
+from langchain_core.documents import Document
 
 try:
     from langchain_classic.retrievers import EnsembleRetriever
 except ImportError:
     from langchain.retrievers import EnsembleRetriever
+import asyncio
+import contextvars
 import os
+import time
+import unicodedata
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from backends import cache_model_name, embedding_model_args, load_cross_encoder, resolve_backend
+from bm25_index import BM25Index
+from cache import LRUCache
+from chunking import StructureAwareSplitter
+from filters import SearchFilter, file_metadata
+from fusion import FUSION_METHODS, chunk_key, fuse, make_chunk_id
+from rerank import RerankBatcher
+from startup import DEGRADED, DISABLED, timeline
+from tracing import trace_event
+from embedding_cache import CachedEmbeddings
+from ingest import IngestManifest, IngestPipeline, directory_size, discover_files
+from latency_budget import LatencyModel, plan_pipeline, rerank_fit
+from loaders import CPU_HEAVY_EXTENSIONS, SUPPORTED_EXTENSIONS, load_file
+from vector_store import VECTOR_STORES, ChromaStore, chroma_hnsw_metadata, open_store
 
 # 可选：重排序模型（首次使用会自动下载）
 try:
@@ -29,195 +50,808 @@ except ImportError:
     RERANKER_AVAILABLE = False
     print("提示: 安装 sentence-transformers 可启用重排序功能")
 
+
+def normalize_query(query: str) -> str:
+    """查询归一化（全角转半角、小写、合并空白、去掉末尾标点），让近似重复的查询命中同一缓存"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    return " ".join(query.split()).rstrip("?？!！。.，, ")
+
+
 class RAGSystem:
-    def __init__(self, persist_directory="db", use_m3e=True, enable_reranker=True):
-        # 初始化嵌入模型
-        if use_m3e:
-            # 使用 m3e-base（中文语义匹配专用，效果最好）
-            print("正在加载 m3e-base 嵌入模型...")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="moka-ai/m3e-base", 
-                model_kwargs={'device': 'cpu'}
-            )
-            print("已加载 m3e-base 嵌入模型")
-        else:
-            # 使用 Ollama（通用但效果一般）
-            try:
-                self.embeddings = OllamaEmbeddings(
-                    model="qwen2.5:7b",
-                    base_url="http://localhost:11434"
-                )
-                print("已连接到Ollama嵌入模型")
-            except Exception as e:
-                print(f"Ollama失败: {e}，回退到 m3e-base")
+    def __init__(self, persist_directory="db", use_m3e=True, enable_reranker=True,
+                 bm25_tokenizer="bigram", embedding_cache=True,
+                 query_cache_size=256, query_cache_ttl=600,
+                 fusion="rrf", fusion_weights=(1.0, 1.0), rrf_k=60, rerank_top_n=6,
+                 rerank_max_tokens=256, rerank_batch_size=64, rerank_wait_ms=2.0,
+                 inference_backend="torch", chunking="structure", search_workers=8,
+                 recall_timeout=2.0, vector_store="chroma", hnsw_m=None, hnsw_ef_construction=None,
+                 hnsw_ef_search=None, vector_quantization=None, rescore_factor=4):
+        # 推理后端：torch / onnx / onnx-int8（ONNX 依赖缺失时回退 torch）
+        self.inference_backend = resolve_backend(inference_backend)
+        
+        self.persist_directory = persist_directory
+        with timeline.track("embeddings"):
+            # 初始化嵌入模型
+            embedding_model_name = cache_model_name("moka-ai/m3e-base", self.inference_backend)
+            if use_m3e:
+                # 使用 m3e-base（中文语义匹配专用，效果最好）
+                print(f"正在加载 m3e-base 嵌入模型（{self.inference_backend}）...")
+                m3e_path, m3e_kwargs = embedding_model_args("moka-ai/m3e-base", self.inference_backend)
                 self.embeddings = HuggingFaceEmbeddings(
-                    model_name="moka-ai/m3e-base", 
-                    model_kwargs={'device': 'cpu'}
+                    model_name=m3e_path, 
+                    model_kwargs=m3e_kwargs
+                )
+                print("已加载 m3e-base 嵌入模型")
+            else:
+                # 使用 Ollama（通用但效果一般）
+                try:
+                    self.embeddings = OllamaEmbeddings(
+                        model="qwen2.5:7b",
+                        base_url="http://localhost:11434"
+                    )
+                    embedding_model_name = "ollama/qwen2.5:7b"
+                    print("已连接到Ollama嵌入模型")
+                except Exception as e:
+                    print(f"Ollama失败: {e}，回退到 m3e-base")
+                    m3e_path, m3e_kwargs = embedding_model_args("moka-ai/m3e-base", self.inference_backend)
+                    self.embeddings = HuggingFaceEmbeddings(
+                        model_name=m3e_path, 
+                        model_kwargs=m3e_kwargs
+                    )
+        
+            # 持久化嵌入缓存（内存 LRU + SQLite），按 模型名 + 文本哈希 命中
+            if embedding_cache:
+                os.makedirs(persist_directory, exist_ok=True)
+                self.embeddings = CachedEmbeddings(
+                    self.embeddings,
+                    model_name=embedding_model_name,
+                    path=os.path.join(persist_directory, "embedding_cache.sqlite"),
                 )
         
-        # 初始化或连接到向量存储
-        self.vectorstore = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=self.embeddings
-        )
-        print(f"已连接到知识库位置: {persist_directory}")
+        # 初始化或连接到向量存储：chroma（默认）/ numpy（小语料精确检索）/ hnsw（大语料近似检索）
+        # hnsw_m / hnsw_ef_construction / hnsw_ef_search 同时作用于 chroma 新建集合与 hnsw 存储，None 为默认值
+        # vector_quantization="int8" / "binary"（仅 numpy）：量化编码做第一轮检索，再用全精度向量重打分前 k*rescore_factor 个
+        if vector_store not in VECTOR_STORES:
+            raise ValueError(f"未知向量存储: {vector_store}，可选: {', '.join(VECTOR_STORES)}")
+        if vector_quantization is not None and vector_store != "numpy":
+            raise ValueError(f"量化检索只支持 numpy 向量存储，当前为 {vector_store}")
+        with timeline.track("vectorstore"):
+            if vector_store == "chroma":
+                self.vectorstore = Chroma(
+                    persist_directory=persist_directory,
+                    embedding_function=self.embeddings,
+                    collection_metadata=chroma_hnsw_metadata(hnsw_m, hnsw_ef_construction, hnsw_ef_search),
+                )
+                self.store = ChromaStore(self.vectorstore._collection)
+            else:
+                # 进程内存储没有 langchain VectorStore 对象，检索统一走 self.store
+                self.vectorstore = None
+                self.store = open_store(
+                    vector_store, os.path.join(persist_directory, "vectors"),
+                    M=hnsw_m, ef_construction=hnsw_ef_construction, ef_search=hnsw_ef_search,
+                    quantization=vector_quantization, rescore_factor=rescore_factor,
+                )
+        print(f"已连接到知识库位置: {persist_directory}（向量存储: {vector_store}）")
+        
+        # 增量 BM25 索引（持久化在 persist_directory/bm25，只存 chunk ID，正文按 ID 从向量库取回）
+        # 中文语料默认用字 bigram 分词；安装 jieba 后可选 bm25_tokenizer="jieba"
+        self.bm25_tokenizer = bm25_tokenizer
+        with timeline.track("bm25"):
+            self.bm25_index = self._load_bm25_index()
+        self.bm25_k = 5  # BM25返回数量
+        
+        # 多路召回融合：rrf / weighted，权重顺序为 (向量, BM25)
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"未知融合方式: {fusion}，可选: {', '.join(FUSION_METHODS)}")
+        self.fusion = fusion
+        self.fusion_weights = tuple(fusion_weights)
+        self.rrf_k = rrf_k
+        self.rerank_top_n = rerank_top_n  # 只对融合后的前 N 条做重排序
+        
+        # 文本分割器：structure 按 Markdown 标题 / PDF 页与章节切分并记录 heading_path，
+        # 其他格式及 chunking="recursive" 时使用固定 1000/100 的递归切分
+        recursive_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        if chunking == "structure":
+            self.text_splitter = StructureAwareSplitter(max_chars=1000, fallback=recursive_splitter)
+        elif chunking == "recursive":
+            self.text_splitter = recursive_splitter
+        else:
+            raise ValueError(f"未知切分方式: {chunking}，可选: structure, recursive")
+        self.last_ingest_report = None
+        
+        # 检索结果缓存：知识库版本号变化即失效
+        self.collection_version = 0
+        self.query_cache = LRUCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        
+        # 异步检索（ahybrid_search / asearch）专用线程池，与 Web 框架的通用线程池隔离
+        self.search_executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="aura-search")
+        
+        # 同步 hybrid_search 的各路召回并发执行；recall_timeout 为单路超时秒数（或 {路名: 秒}，None 不限），
+        # 超时的一路降级为空结果而不拖慢整体
+        self.recall_executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="aura-recall")
+        self.recall_timeout = recall_timeout
+        self.recall_stats = {}
+        self._recall_lock = threading.Lock()
         
-        # 初始化BM25检索器（延迟加载，需要文档）
-        self.bm25_retriever = None
-        self.all_documents = []  # 保存文档用于BM25
+        # 延迟预算（budget_ms）：按各阶段实测耗时的滑动平均规划降级
+        self.latency_model = LatencyModel()
+        self.budget_stats = {"searches": 0, "degraded": 0, "missed": 0}
+        
+        # 导入清单：文件内容哈希 + chunk ID，重复导入时跳过未变化的文件
+        self.manifest = IngestManifest(os.path.join(persist_directory, "ingest_manifest.json"))
         
         # 初始化重排序模型（可通过 enable_reranker=False 关闭以节省显存）
         self.reranker = None
+        self.rerank_batcher = None
         if enable_reranker and RERANKER_AVAILABLE:
             try:
-                self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', max_length=512)
+                with timeline.track("reranker"):
+                    self.reranker = load_cross_encoder(
+                        'cross-encoder/ms-marco-MiniLM-L-6-v2', self.inference_backend, max_length=512
+                    )
+                    # 并发请求微批合并 + (query, chunk_id) 分数缓存 + 正文按 token 预算预截断
+                    self.rerank_batcher = RerankBatcher(
+                        self.reranker,
+                        max_batch_size=rerank_batch_size,
+                        max_wait_ms=rerank_wait_ms,
+                        max_tokens=rerank_max_tokens,
+                    )
                 print("已加载重排序模型")
             except Exception as e:
+                # 重排序是可选阶段：加载失败时降级为只做召回融合，不影响 /ready
                 print(f"重排序模型加载失败: {e}")
+                timeline.mark("reranker", DEGRADED, error=str(e))
+        else:
+            timeline.mark("reranker", DISABLED)
+    
+    def warmup(self):
+        """
+        预热：各跑一次嵌入与重排序推理，触发权重加载 / ONNX 会话初始化等一次性开销，
+        避免由第一个真实请求承担。
+        嵌入绕过 CachedEmbeddings 直接调用模型，否则第二次启动起探针命中磁盘缓存，模型根本不会运行。
+        """
+        with timeline.track("warmup"):
+            model = self.embeddings.embeddings if isinstance(self.embeddings, CachedEmbeddings) else self.embeddings
+            model.embed_query("预热")
+            if self.reranker is not None:
+                self.reranker.predict([["预热", "预热"]])
     
-    def add_documents(self, docs_path, extension=".md"):
-        """添加文档到知识库"""
+    def add_documents(self, docs_path, extension=".md", recursive=False, batch_size=64,
+                      load_workers=4, embed_workers=2, process_workers=2):
+        """
+        添加文档到知识库
+        
+        Args:
+            extension: 扩展名，或扩展名元组；None 表示全部支持的格式（见 loaders.SUPPORTED_EXTENSIONS）
+            recursive: 是否递归子目录
+            batch_size: 每批嵌入的文本块数
+            load_workers: 并行加载/切分文件的线程数
+            embed_workers: 并行嵌入批次的线程数
+            process_workers: PDF / DOCX 等解析的进程池大小，0 表示不用进程池
+        """
         # 确保文档路径存在
         if not os.path.exists(docs_path):
             raise FileNotFoundError(f"文档路径不存在: {docs_path}")
-            
-        # 检查是否有匹配的文件
-        import glob
-        # 将文件路径转换为绝对路径
+        
+        if extension is None:
+            extensions = SUPPORTED_EXTENSIONS
+        elif isinstance(extension, str):
+            extensions = (extension,)
+        else:
+            extensions = tuple(extension)
+        
+        # 将文件路径转换为绝对路径，一次遍历找出所有格式的文件
         absolute_path = os.path.abspath(docs_path)
-        pattern = os.path.join(absolute_path, f"*{extension}")
-        matching_files = glob.glob(pattern)
+        matching_files = discover_files(absolute_path, extensions, recursive=recursive)
         
-        print(f"搜索模式: {pattern}")
-        print(f"当前工作目录: {os.getcwd()}")
-        print(f"目标目录内容: {os.listdir(docs_path)}")
+        print(f"搜索目录: {absolute_path}（{'递归' if recursive else '单层'}，格式: {', '.join(extensions)}）")
         
         if not matching_files:
-            raise ValueError(f"在{docs_path}中没有找到{extension}格式的文件")
+            raise ValueError(f"在{docs_path}中没有找到{'/'.join(extensions)}格式的文件")
             
-        print(f"找到{len(matching_files)}个{extension}文件: {matching_files}")
+        print(f"找到{len(matching_files)}个文件: {matching_files}")
             
-        # 根据文件类型选择加载器
+        # 增量导入：跳过内容未变化的文件，清理已删除文件的文本块
+        for missing in self.manifest.missing_files(absolute_path, extensions, recursive=recursive):
+            stale = self.manifest.remove(missing)
+            self._delete_chunks(stale)
+            print(f"文件已删除，移除 {len(stale)} 个文本块: {missing}")
+        
+        file_versions = {}
+        for file_path in matching_files:
+            version = self.manifest.check(file_path)
+            if version is not None:
+                file_versions[file_path] = version
+        print(f"{len(matching_files) - len(file_versions)} 个文件未变化已跳过，{len(file_versions)} 个文件需要导入")
+        
+        # 流式导入：线程池加载/切分 → 分批嵌入 → 批量写入
+        # 旧块删除与清单更新先记在 pending 中，新块全部写入后才提交
+        pending = {}
         try:
-            # 直接处理每个找到的文件
-            documents = []
-            
-            for file_path in matching_files:
-                try:
-                    print(f"正在加载文件: {file_path}")
-                    if extension == ".pdf":
-                        loader = PyPDFLoader(file_path)
-                    elif extension == ".csv":
-                        loader = CSVLoader(file_path)
-                    elif extension in [".doc", ".docx"]:
-                        loader = Docx2txtLoader(file_path)
-                    else:
-                        # 对于MD和其他文本文件使用TextLoader
-                        loader = TextLoader(file_path, encoding='utf-8')
-                        
-                    file_docs = loader.load()
-                    documents.extend(file_docs)
-                    print(f"成功加载文件 {file_path}, 包含 {len(file_docs)} 个文档")
-                except Exception as e:
-                    print(f"加载文件 {file_path} 时出错: {str(e)}")
-            
-            print(f"总计加载了 {len(documents)} 个文档")
-            
-            if not documents:
-                raise ValueError(f"无法加载任何文档内容，请检查文件格式和权限")
-            
-            # 文本分割（论文等长文档建议用较大的chunk）
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,  # 增大块大小，保持上下文完整性
-                chunk_overlap=100
+            pipeline = IngestPipeline(
+                load_fn=load_file,
+                split_fn=self._split_documents,
+                embed_fn=self.embeddings.embed_documents,
+                write_fn=self._write_chunks,
+                filter_fn=lambda path, chunks: self._diff_file_chunks(path, chunks, file_versions[path], pending),
+                key_fn=lambda doc: doc.metadata["chunk_id"],
+                batch_size=batch_size,
+                load_workers=load_workers,
+                embed_workers=embed_workers,
+                process_extensions=CPU_HEAVY_EXTENSIONS,
+                process_workers=process_workers,
             )
-            splits = text_splitter.split_documents(documents)
-            print(f"创建了 {len(splits)} 个文本块")
-            
-            if not splits:
-                raise ValueError(f"文档分割后没有产生任何文本块，请检查文档内容")
+            report = pipeline.run(list(file_versions))
+            self.last_ingest_report = report
+            print(report.summary())
+            for file_path, error in report.errors:
+                print(f"加载文件 {file_path} 时出错: {error}")
             
-            # 添加到向量库
-            self.vectorstore.add_documents(splits)
-            print("文档已添加到知识库")
-            
-            # 更新BM25检索器
-            self.all_documents.extend(splits)
-            self._init_bm25_retriever()
+            if file_versions and not report.files:
+                raise ValueError(f"无法加载任何文档内容，请检查文件格式和权限")
             
+            self._commit_file_chunks(pending)
+            self.store.save()
+            self.manifest.save()
+            print(f"文档已添加到知识库，BM25索引文档数: {len(self.bm25_index)}")
             return True
         except Exception as e:
             import traceback
+            # 清单只在全部写入成功后落盘，失败时回到磁盘上的状态，下次导入会重试
+            self.manifest.reload()
             print(f"加载文档时出错: {str(e)}")
             print(traceback.format_exc())
             raise e
     
-    def _init_bm25_retriever(self):
-        """初始化BM25检索器"""
-        if self.all_documents:
-            self.bm25_retriever = BM25Retriever.from_documents(self.all_documents)
-            self.bm25_retriever.k = 5  # BM25返回数量
-            print(f"BM25检索器已初始化，文档数: {len(self.all_documents)}")
+    def _split_documents(self, documents):
+        """文本分割（论文等长文档建议用较大的chunk），并分配稳定 chunk ID"""
+        splits = self.text_splitter.split_documents(documents)
+        for doc in splits:
+            doc.metadata["chunk_id"] = make_chunk_id(doc)
+        return splits
+    
+    def _diff_file_chunks(self, file_path, chunks, version, pending):
+        """
+        对比文件新旧 chunk ID，只返回需要重新嵌入的新块。
+        同时给所有块写入可过滤字段（file_name / extension / ingested_at）。
+        删除消失的旧块、更新保留块的元数据和清单都记入 pending，
+        由 _commit_file_chunks 在新块写入成功后执行：中途失败时旧块与清单保持原样，下次导入重试。
+        清单记录的是 check() 时的 version（哈希与 stat），导入期间文件被修改的话下次仍会重新导入。
+        """
+        if file_path in self.manifest:
+            old_ids = set(self.manifest.chunks(file_path))
+        else:
+            # 清单之前导入的文件：按 source 找回已有文本块
+            old_ids = set(self.store.get(where={"source": file_path}, include=())["ids"])
+        ingested_at = time.time()
+        for doc in chunks:
+            doc.metadata.update(file_metadata(file_path, ingested_at))
+        new_ids = [doc.metadata["chunk_id"] for doc in chunks]
+        kept = [doc for doc in chunks if doc.metadata["chunk_id"] in old_ids]
+        pending[file_path] = (old_ids - set(new_ids), kept, version, new_ids, ingested_at)
+        return [doc for doc in chunks if doc.metadata["chunk_id"] not in old_ids]
+    
+    def _commit_file_chunks(self, pending):
+        """新块写入完成后：删除各文件消失的旧块，更新保留块的元数据，推进清单"""
+        for file_path, (stale_ids, kept, version, new_ids, ingested_at) in pending.items():
+            self._delete_chunks(stale_ids)
+            if kept:
+                self.store.update_metadata(
+                    [doc.metadata["chunk_id"] for doc in kept],
+                    [doc.metadata for doc in kept],
+                )
+            self.manifest.update(file_path, version, new_ids, ingested_at=ingested_at)
+    
+    def _delete_chunks(self, ids):
+        """从向量库和BM25索引中删除文本块"""
+        ids = list(ids)
+        if not ids:
+            return
+        self.store.delete(ids)
+        for chunk_id in ids:
+            self.bm25_index.remove(chunk_id)
+        self._bump_version()
+    
+    def _write_chunks(self, docs, vectors):
+        """把已嵌入的一批文本块批量写入向量库，并增量更新BM25索引"""
+        ids = [doc.metadata["chunk_id"] for doc in docs]
+        texts = [doc.page_content for doc in docs]
+        self.store.upsert(ids, vectors, texts, [doc.metadata for doc in docs])
+        self.bm25_index.add_many(zip(ids, texts))
+        self._bump_version()
+    
+    def delete_source(self, source):
+        """
+        按来源删除文档：向量库中的文本块、BM25 倒排及导入清单记录一并移除
+
+        Args:
+            source: 文件路径、目录（删除其下全部文件）或不含路径的文件名
+        Returns:
+            {"source", "files": [删除的文件], "chunks": 删除的文本块数}
+        """
+        paths = self.manifest.match_source(source)
+        ids = set()
+        for path in paths:
+            ids.update(self.manifest.remove(path))
+        if not paths:
+            # 清单之前导入的文件：按 source 元数据找回文本块
+            target = os.path.abspath(source)
+            got = self.store.get(where={"source": target}, include=())
+            if got["ids"]:
+                paths = [target]
+                ids.update(got["ids"])
+        self._delete_chunks(ids)
+        self.store.save()
+        self.manifest.save()
+        print(f"已删除 {len(paths)} 个文件的 {len(ids)} 个文本块: {source}")
+        return {"source": source, "files": paths, "chunks": len(ids)}
+
+    def compact(self):
+        """
+        压缩持久化目录中服务运行时可安全处理的部分，回收删除 / 重新导入留下的空间：
+        BM25 写快照并截断日志，进程内向量存储落盘，嵌入缓存 SQLite 执行 VACUUM。
+        Chroma（chroma.sqlite3 VACUUM + 孤立段目录清理）会改动本进程客户端正在使用的文件，
+        只能停服后通过 python kb_admin.py compact 离线执行
+        """
+        start = time.time()
+        before = directory_size(self.persist_directory)
+        self.bm25_index.save()
+        self.store.save()
+        vacuumed = []
+        if hasattr(self.embeddings, "vacuum") and self.embeddings.vacuum():
+            vacuumed.append(os.path.basename(self.embeddings.path))
+        after = directory_size(self.persist_directory)
+        result = {
+            "bytes_before": before,
+            "bytes_after": after,
+            "reclaimed_bytes": before - after,
+            "vacuumed": vacuumed,
+            "orphan_segments_removed": 0,
+            "seconds": round(time.time() - start, 3),
+        }
+        if self.vectorstore is not None:
+            result["chroma_compaction"] = "offline: 停止服务后运行 python kb_admin.py compact"
+        print(f"知识库压缩完成: {before / 1e6:.1f}MB → {after / 1e6:.1f}MB")
+        return result
+
+    def knowledge_stats(self):
+        """知识库规模与磁盘占用"""
+        return {
+            "files": len(self.manifest.files),
+            "vector_store": self.store.name,
+            "chunks": self.store.count(),
+            "bm25_docs": len(self.bm25_index),
+            "disk_bytes": directory_size(self.persist_directory),
+        }
+
+    def _bump_version(self):
+        """知识库内容变化：递增版本号，旧版本的检索缓存随之失效"""
+        self.collection_version += 1
+        self.query_cache.clear()
+    
+    def cache_stats(self):
+        """检索缓存与嵌入缓存的命中统计"""
+        stats = {"query_cache": self.query_cache.stats(), "collection_version": self.collection_version}
+        if hasattr(self.embeddings, "stats"):
+            stats["embedding_cache"] = self.embeddings.stats()
+        if self.rerank_batcher is not None:
+            stats["reranker"] = self.rerank_batcher.stats()
+        with self._recall_lock:
+            stats["recall"] = {
+                name: {
+                    "calls": entry["calls"],
+                    "timeouts": entry["timeouts"],
+                    "errors": entry["errors"],
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0,
+                }
+                for name, entry in self.recall_stats.items()
+            }
+            stats["budget"] = dict(self.budget_stats)
+        stats["latency_model"] = self.latency_model.snapshot()
+        return stats
+    
+    def _load_bm25_index(self):
+        """加载持久化的 BM25 索引，并与向量库核对文档数，不一致时从向量库重建"""
+        start = time.time()
+        index = BM25Index.open(
+            os.path.join(self.persist_directory, "bm25"),
+            tokenizer=self.bm25_tokenizer,
+        )
+        try:
+            expected = self.store.count()
+        except Exception as e:
+            print(f"无法读取向量库文档数，跳过一致性检查: {e}")
+            return index
+        if len(index) != expected:
+            print(f"BM25索引({len(index)})与向量库({expected})不一致，从向量库重建...")
+            self._rebuild_bm25_index(index)
+        print(f"BM25索引已加载，文档数: {len(index)}，耗时 {(time.time() - start) * 1000:.0f}ms")
+        return index
+    
+    def _rebuild_bm25_index(self, index, batch_size=5000):
+        """分页读取向量库中的全部 chunk，在内存中重建 BM25 索引后写一次快照"""
+        def chunks():
+            offset = 0
+            while True:
+                got = self.store.get(include=("documents",), limit=batch_size, offset=offset)
+                yield from zip(got["ids"], got["documents"])
+                offset += len(got["ids"])
+                if len(got["ids"]) < batch_size:
+                    break
+        index.rebuild(chunks())
+    
+    def _get_documents(self, ids):
+        """按 chunk ID 从向量库取回文档，保持 ids 的顺序"""
+        if not ids:
+            return []
+        got = self.store.get(ids=list(ids))
+        by_id = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(got["ids"], got["documents"], got["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
     
-    def search(self, query, k=3):
-        """搜索相关文档（原始向量检索）"""
-        results = self.vectorstore.similarity_search(query, k=k)
-        return results
+    def _filter_candidates(self, filters):
+        """把过滤条件解析为候选 chunk（按导入清单逐文件匹配的 ChunkSelection，不展开全库 ID），无条件时返回 None"""
+        if not filters:
+            return None
+        return self.manifest.select(filters.matches)
     
-    def hybrid_search(self, query, k=3, use_rerank=True):
+    def bm25_search(self, query, k=5, filters=None):
+        """BM25关键词检索"""
+        return [doc for doc, _ in self.bm25_search_with_scores(query, k=k, filters=filters)]
+    
+    def bm25_search_with_scores(self, query, k=5, filters=None):
+        """BM25关键词检索，返回 [(doc, bm25分数)]；filters 下推为候选 chunk 集合，只对候选打分"""
+        filters = SearchFilter.coerce(filters)
+        hits = self.bm25_index.search(query, k=k, candidates=self._filter_candidates(filters))
+        docs = self._get_documents([chunk_id for chunk_id, _ in hits])
+        scores = dict(hits)
+        return [(doc, scores[doc.metadata.get("chunk_id")]) for doc in docs]
+    
+    def search(self, query, k=3, filters=None):
+        """
+        搜索相关文档（原始向量检索）
+        
+        Args:
+            filters: SearchFilter 或 dict(sources=..., extensions=..., ingested_after=..., ingested_before=...)，
+                     下推为 Chroma where 子句
+        """
+        filters = SearchFilter.coerce(filters)
+        where = filters.to_where() if filters else None
+        return [doc for doc, _ in self._query_store(query, k, where)]
+    
+    def _query_store(self, query, k, where=None):
+        """查询向量经嵌入缓存编码后交给向量存储，返回 [(doc, 距离)]"""
+        embedding = self.embeddings.embed_query(query)
+        return [
+            (Document(page_content=text, metadata=metadata or {}), distance)
+            for _, text, metadata, distance in self.store.query(embedding, k, where)
+        ]
+    
+    def hybrid_search(self, query, k=3, use_rerank=True, filters=None, budget_ms=None):
         """
         多路召回 + 重排序
         1. 向量检索（语义相似）
         2. BM25检索（关键词匹配）
         3. 融合结果
         4. 重排序优化
+        
+        filters 同时下推到向量检索（Chroma where）和 BM25（候选 chunk 集合），而不是召回后再过滤。
+        结果按 (知识库版本, 归一化查询, k, use_rerank, filters) 缓存，导入/删除文档后自动失效。
+        budget_ms 为延迟预算（毫秒），给出时按 search_with_budget 降级执行。
         """
-        # 向量检索
-        vector_results = self.vectorstore.similarity_search(query, k=k*2)
+        if budget_ms is not None:
+            return self.search_with_budget(query, budget_ms, k=k, use_rerank=use_rerank, filters=filters)[0]
+        filters = SearchFilter.coerce(filters)
+        key = (self.collection_version, normalize_query(query), k, use_rerank, filters)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        results = self._hybrid_search(query, k=k, use_rerank=use_rerank, filters=filters)
+        self.query_cache.set(key, results)
+        return list(results)
+    
+    def search_with_budget(self, query, budget_ms, k=3, use_rerank=True, filters=None):
+        """
+        延迟预算模式的混合检索，返回 (results, report)。
+        
+        按 latency_model 中各阶段的实测耗时规划（plan_pipeline）：预算不够时依次缩小重排序候选、
+        跳过重排序、只走向量召回；执行时剩余时间同时作为各路召回的超时上限，召回结束后再按剩余时间
+        决定重排序几条。report 记录预算、实际耗时、实际执行的阶段和全部降级项；
+        有降级的结果不写入缓存，以免完整检索命中降级结果。
+        """
+        start = time.perf_counter()
+        filters = SearchFilter.coerce(filters)
+        key = (self.collection_version, normalize_query(query), k, use_rerank, filters)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return list(cached), self._budget_report(budget_ms, start, None, {}, ["cache"], [])
+        plan = self.plan_search(k, use_rerank, budget_ms)
+        recalled = self._recall(
+            query, plan.depth, filters, legs=plan.legs, deadline=self._recall_deadline(start, budget_ms)
+        )
+        results, report = self._finish_budgeted(query, k, plan, recalled, start, budget_ms)
+        if not report["degraded"]:
+            self.query_cache.set(key, results)
+        return list(results), report
+    
+    def plan_search(self, k, use_rerank, budget_ms):
+        """按当前延迟模型为一次检索生成执行计划"""
+        return plan_pipeline(
+            budget_ms, self.latency_model, [name for name, _ in self._recall_legs()],
+            k, self.rerank_top_n, use_rerank=use_rerank and self.rerank_batcher is not None,
+        )
+    
+    def _recall_deadline(self, start, budget_ms):
+        """召回阶段的截止时刻：为融合预留固定开销"""
+        return start + max(0.0, budget_ms - self.latency_model.estimate("overhead")) / 1000
+    
+    def _finish_budgeted(self, query, k, plan, recalled, start, budget_ms):
+        """融合 + 按剩余预算重排序，汇总执行报告"""
+        degraded = list(plan.degraded)
+        statuses = {name: status for name, status, _ in recalled}
+        degraded += [f"{name}_{status}" for name, status in statuses.items() if status != "ok"]
+        stages = [name for name, status in statuses.items() if status == "ok"] + ["fuse"]
+        merged = self._fuse(recalled)
+        rerank_n = plan.rerank_n
+        if rerank_n:
+            remaining = budget_ms - (time.perf_counter() - start) * 1000
+            fit = min(rerank_n, rerank_fit(self.latency_model, remaining))
+            if fit < min(k, len(merged)):
+                degraded.append("skip_rerank")
+                rerank_n = 0
+            elif fit < rerank_n:
+                degraded.append(f"rerank_pool:{rerank_n}->{fit}")
+                rerank_n = fit
+        results = None
+        if rerank_n and merged:
+            results = self._rerank(query, merged[:rerank_n], k)
+            if results is not None:
+                stages.append("rerank")
+        if results is None:
+            results = merged[:k]
+        report = self._budget_report(budget_ms, start, plan, statuses, stages, degraded)
+        if degraded:
+            print(f"延迟预算 {budget_ms:.0f}ms 降级: {', '.join(degraded)}")
+        return results, report
+    
+    def _budget_report(self, budget_ms, start, plan, statuses, stages, degraded):
+        elapsed = (time.perf_counter() - start) * 1000
+        report = {
+            "budget_ms": budget_ms,
+            "elapsed_ms": round(elapsed, 1),
+            "estimate_ms": round(plan.estimate_ms, 1) if plan else 0.0,
+            "met": elapsed <= budget_ms,
+            "stages": stages,
+            "legs": statuses,
+            "degraded": degraded,
+        }
+        with self._recall_lock:
+            self.budget_stats["searches"] += 1
+            self.budget_stats["degraded"] += bool(degraded)
+            self.budget_stats["missed"] += not report["met"]
+        trace_event("retrieval_budget", report)
+        return report
+    
+    async def ahybrid_search(self, query, k=3, use_rerank=True, filters=None, budget_ms=None):
+        """
+        hybrid_search 的异步版本：嵌入 / Chroma / BM25 / CrossEncoder 都在专用检索线程池中执行，
+        各路召回并发进行（单路超时按 recall_timeout 降级），不阻塞事件循环。
         
-        # BM25检索（如果可用）
-        bm25_results = []
-        if self.bm25_retriever:
+        调用方取消（如客户端断开）时，尚未开始的阶段不再执行；已在线程中运行的阶段无法中断，
+        结果被丢弃且不写入缓存。
+        """
+        if budget_ms is not None:
+            return (await self.asearch_with_budget(query, budget_ms, k=k, use_rerank=use_rerank, filters=filters))[0]
+        filters = SearchFilter.coerce(filters)
+        key = (self.collection_version, normalize_query(query), k, use_rerank, filters)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        recalled = await self._arecall(query, k * 2, filters)
+        results = await self._run_in_search_executor(self._fuse_and_rerank, query, k, use_rerank, recalled)
+        self.query_cache.set(key, results)
+        return list(results)
+    
+    async def asearch_with_budget(self, query, budget_ms, k=3, use_rerank=True, filters=None):
+        """search_with_budget 的异步版本"""
+        start = time.perf_counter()
+        filters = SearchFilter.coerce(filters)
+        key = (self.collection_version, normalize_query(query), k, use_rerank, filters)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return list(cached), self._budget_report(budget_ms, start, None, {}, ["cache"], [])
+        plan = self.plan_search(k, use_rerank, budget_ms)
+        recalled = await self._arecall(
+            query, plan.depth, filters, legs=plan.legs, deadline=self._recall_deadline(start, budget_ms)
+        )
+        results, report = await self._run_in_search_executor(
+            self._finish_budgeted, query, k, plan, recalled, start, budget_ms
+        )
+        if not report["degraded"]:
+            self.query_cache.set(key, results)
+        return list(results), report
+    
+    async def asearch(self, query, k=3, filters=None):
+        """search 的异步版本（在检索线程池中执行）"""
+        return await self._run_in_search_executor(self.search, query, k, filters)
+    
+    def _run_in_search_executor(self, fn, *args):
+        """
+        在 search_executor 中执行 fn(*args)，返回可 await 的 future。
+        run_in_executor 不会传递 contextvars，这里带上调用方的上下文副本，
+        线程中的 trace_event（rerank / fusion / retrieval_budget 等）仍写入当前请求的 trace
+        """
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.search_executor, context.run, fn, *args)
+    
+    def _recall_legs(self):
+        """
+        召回通道，顺序与 fusion_weights 一一对应；新增召回方式在此注册。
+        每路签名为 fn(query, n, filters) -> [(doc, 分数)]，n 为召回深度（默认 k*2），各路可再自行截断。
+        """
+        return [("vector", self._vector_recall), ("bm25", self._bm25_recall)]
+    
+    def _vector_recall(self, query, n, filters=None):
+        """向量召回 n 条，返回 [(doc, 分数)]（距离越小越相似，取负后作为分数）"""
+        where = filters.to_where() if filters else None
+        return [
+            (doc, -distance)
+            for doc, distance in self._query_store(query, n, where)
+        ]
+    
+    def _bm25_recall(self, query, n, filters=None):
+        """BM25 召回（最多 bm25_k 条），索引为空时返回空列表"""
+        if not len(self.bm25_index):
+            return []
+        return self.bm25_search_with_scores(query, k=min(self.bm25_k, n), filters=filters)
+    
+    def _leg_timeout(self, name, deadline=None):
+        """单路超时秒数：recall_timeout 与截止时刻（perf_counter）剩余时间取较小者"""
+        timeout = self.recall_timeout.get(name) if isinstance(self.recall_timeout, dict) else self.recall_timeout
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.perf_counter())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+    
+    def _selected_legs(self, legs=None):
+        return [(name, fn) for name, fn in self._recall_legs() if legs is None or name in legs]
+    
+    @staticmethod
+    def _timed_leg(fn, query, n, filters):
+        start = time.perf_counter()
+        hits = fn(query, n, filters)
+        return hits, (time.perf_counter() - start) * 1000
+    
+    def _record_leg(self, name, status, ms, hits, error=None):
+        """累计单路召回统计，写入延迟模型和当前 trace"""
+        with self._recall_lock:
+            entry = self.recall_stats.setdefault(
+                name, {"calls": 0, "timeouts": 0, "errors": 0, "total_ms": 0.0}
+            )
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            if status == "timeout":
+                entry["timeouts"] += 1
+            elif status == "error":
+                entry["errors"] += 1
+        if status != "error":
+            # 超时的耗时是下限，同样计入，让模型尽快感知变慢的一路
+            self.latency_model.observe(name, ms)
+        data = {"leg": name, "status": status, "ms": round(ms, 1), "hits": hits}
+        if error:
+            data["error"] = error
+            print(f"{name}召回失败，降级为空结果: {error}")
+        elif status == "timeout":
+            print(f"{name}召回超时（{ms:.0f}ms），降级为空结果")
+        trace_event("recall", data)
+    
+    def _recall(self, query, n, filters=None, legs=None, deadline=None):
+        """
+        各路召回在 recall_executor 中并发执行，按 _recall_legs 的顺序返回 [(路名, 状态, hits)]。
+        单路超时或出错时该路记为空结果，其余路照常融合；超时的线程无法中断，会在后台跑完后丢弃。
+        legs 限定只执行其中几路；deadline（perf_counter 时刻）限制所有路的最晚返回时间。
+        """
+        start = time.perf_counter()
+        futures = [
+            (name, self.recall_executor.submit(self._timed_leg, fn, query, n, filters))
+            for name, fn in self._selected_legs(legs)
+        ]
+        recalled = []
+        for name, future in futures:
+            timeout = self._leg_timeout(name)
+            remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - start))
+            if deadline is not None:
+                left = max(0.0, deadline - time.perf_counter())
+                remaining = left if remaining is None else min(remaining, left)
             try:
-                bm25_results = self.bm25_retriever.invoke(query)[:k*2]
+                hits, ms = future.result(timeout=remaining)
+                status = "ok"
+                self._record_leg(name, status, ms, len(hits))
+            except FutureTimeoutError:
+                future.cancel()
+                hits, status = [], "timeout"
+                self._record_leg(name, status, (time.perf_counter() - start) * 1000, 0)
             except Exception as e:
-                print(f"BM25检索失败: {e}")
-        
-        # 融合结果（去重）
-        seen_contents = set()
-        merged_results = []
-        
-        for doc in vector_results + bm25_results:
-            content_hash = hash(doc.page_content[:100])
-            if content_hash not in seen_contents:
-                seen_contents.add(content_hash)
-                merged_results.append(doc)
-        
-        print(f"多路召回: 向量{len(vector_results)}条 + BM25{len(bm25_results)}条 → 融合{len(merged_results)}条")
-        
-        # 重排序（如果可用）
-        if use_rerank and self.reranker and merged_results:
+                hits, status = [], "error"
+                self._record_leg(name, status, (time.perf_counter() - start) * 1000, 0, error=str(e))
+            recalled.append((name, status, hits))
+        return recalled
+    
+    async def _arecall(self, query, n, filters=None, legs=None, deadline=None):
+        """_recall 的异步版本：各路在 search_executor 中并发执行，超时用 asyncio.wait_for 控制"""
+        async def run(name, fn):
+            start = time.perf_counter()
             try:
-                pairs = [[query, doc.page_content] for doc in merged_results]
-                scores = self.reranker.predict(pairs)
-                
-                scored_results = list(zip(merged_results, scores))
-                scored_results.sort(key=lambda x: x[1], reverse=True)
-                
-                reranked = [doc for doc, score in scored_results[:k]]
-                print(f"重排序完成，返回top{k}")
-                return reranked
+                hits, ms = await asyncio.wait_for(
+                    self._run_in_search_executor(self._timed_leg, fn, query, n, filters),
+                    self._leg_timeout(name, deadline),
+                )
+                self._record_leg(name, "ok", ms, len(hits))
+                return name, "ok", hits
+            except asyncio.TimeoutError:
+                self._record_leg(name, "timeout", (time.perf_counter() - start) * 1000, 0)
+                return name, "timeout", []
             except Exception as e:
-                print(f"重排序失败: {e}")
+                self._record_leg(name, "error", (time.perf_counter() - start) * 1000, 0, error=str(e))
+                return name, "error", []
         
+        return list(await asyncio.gather(*(run(name, fn) for name, fn in self._selected_legs(legs))))
+    
+    def _hybrid_search(self, query, k=3, use_rerank=True, filters=None):
+        """未缓存的混合检索"""
+        return self._fuse_and_rerank(query, k, use_rerank, self._recall(query, k * 2, filters))
+    
+    def _fuse(self, recalled):
+        """融合各路召回结果（按 chunk ID 去重，RRF / 加权分数排序），权重按路名对应 fusion_weights"""
+        weights = dict(zip((name for name, _ in self._recall_legs()), self.fusion_weights))
+        fused = fuse(
+            [hits for _, _, hits in recalled],
+            method=self.fusion,
+            weights=[weights.get(name, 1.0) for name, _, _ in recalled],
+            rrf_k=self.rrf_k,
+            key_fn=chunk_key,
+        )
+        merged_results = [doc for doc, _ in fused]
+        counts = " + ".join(f"{name} {len(hits)}条" for name, _, hits in recalled)
+        print(f"多路召回: {counts} → 融合{len(merged_results)}条")
+        return merged_results
+    
+    def _rerank(self, query, candidates, k):
+        """对候选重排序，返回 top k；重排序不可用或失败时返回 None"""
+        if not self.rerank_batcher or not candidates:
+            return None
+        try:
+            start = time.perf_counter()
+            reranked = self.rerank_batcher.rerank(query, candidates, k)
+            ms = (time.perf_counter() - start) * 1000
+            self.latency_model.observe("rerank_per_candidate", ms / len(candidates))
+            trace_event("rerank", {"candidates": len(candidates), "ms": round(ms, 1)})
+            print(f"重排序完成，返回top{k}")
+            return reranked
+        except Exception as e:
+            print(f"重排序失败: {e}")
+            return None
+    
+    def _fuse_and_rerank(self, query, k, use_rerank, recalled):
+        """融合后只对排名靠前的候选重排序（如果可用）"""
+        merged_results = self._fuse(recalled)
+        if use_rerank:
+            reranked = self._rerank(query, merged_results[:max(k, self.rerank_top_n)], k)
+            if reranked is not None:
+                return reranked
         return merged_results[:k]
 
-    def hybrid_search_with_sources(self, query, k=3, use_rerank=True):
+    def hybrid_search_with_sources(self, query, k=3, use_rerank=True, filters=None, budget_ms=None):
         """
         带来源溯源的混合检索（Citation）。
         返回 list[dict]，每个 dict 含 content / source / score（可选）。
         """
-        results = self.hybrid_search(query, k=k, use_rerank=use_rerank)
+        extra = {"filters": filters} if filters else {}
+        if budget_ms is not None:
+            extra["budget_ms"] = budget_ms
+        results = self.hybrid_search(query, k=k, use_rerank=use_rerank, **extra)
         cited = []
         for i, doc in enumerate(results):
             source = doc.metadata.get("source", "unknown")
@@ -228,13 +862,13 @@ class RAGSystem:
                 "content": doc.page_content,
                 "source": source_name,
                 "full_path": source,
+                "heading_path": doc.metadata.get("heading_path", ""),
             })
         return cited
     
     def search_with_scores(self, query, k=3):
         """搜索并返回相似度分数"""
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
-        return results
+        return self._query_store(query, k)
 
 # 使用示例
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+"""
+Aura 重排序阶段
+- 微批：并发请求的 (query, passage) 对在短时间窗口内合并为一次 predict 调用
+- 分数缓存：(query, chunk_id) → 分数，chunk_id 由内容哈希得到，不会过期
+- 预截断：按 token 预算截断正文，避免每次都把整块送进 512 长度的 CrossEncoder
+- 延迟统计：记录每次 score() 的耗时，报告 p50 / p99
+"""
+
+import logging
+import math
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Sequence
+
+from cache import LRUCache
+from fusion import chunk_key
+
+logger = logging.getLogger("AuraRerank")
+
+# 无 tokenizer 时的近似 token：中文按字，其余按空白分隔的词
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\uffef"
+_APPROX_TOKEN = re.compile(f"[{_CJK_CHARS}]|[^\\s{_CJK_CHARS}]+")
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """最近秩法百分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def truncate_passage(text: str, max_tokens: int | None, tokenizer=None) -> str:
+    """
+    按 token 预算截断正文。
+    有 fast tokenizer 时用 offset_mapping 精确截断；
+    否则近似估计：中文约 1 字 1 token，英文等按空白分隔的词计数（避免英文段落被按字符数截得过短）。
+    """
+    if not max_tokens or len(text) <= max_tokens:
+        return text
+    if tokenizer is not None:
+        try:
+            encoded = tokenizer(text, add_special_tokens=False, truncation=True,
+                                max_length=max_tokens, return_offsets_mapping=True)
+            offsets = encoded["offset_mapping"]
+            return text[:offsets[-1][1]] if offsets else text
+        except Exception:
+            pass
+    for count, match in enumerate(_APPROX_TOKEN.finditer(text), start=1):
+        if count == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+class RerankBatcher:
+    """
+    包装 CrossEncoder 风格的模型（model.predict([[query, passage], ...]) -> scores）
+
+    Args:
+        model: 重排序模型
+        max_batch_size: 单次 predict 最多合并的 pair 数（单个请求超过时不拆分）
+        max_wait_ms: 攒批等待窗口，窗口内到达的请求合并执行
+        cache_size: 分数缓存条数
+        max_tokens: 正文 token 预算，None 表示不截断
+        key_fn: doc -> 缓存键
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait_ms: float = 2.0,
+                 cache_size: int = 4096, max_tokens: int | None = 256,
+                 key_fn: Callable[[Any], str] = chunk_key, latency_window: int = 1000):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_tokens = max_tokens
+        self.key_fn = key_fn
+        self.tokenizer = getattr(model, "tokenizer", None)
+        self.cache = LRUCache(maxsize=cache_size)
+        self.batches = 0
+        self.batched_pairs = 0
+        self.latencies: deque[float] = deque(maxlen=latency_window)
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._predict(pending)
+
+    def _predict(self, pending):
+        pairs = [pair for item_pairs, _ in pending for pair in item_pairs]
+        try:
+            scores = [float(s) for s in self.model.predict(pairs)]
+        except Exception as e:
+            logger.warning("重排序 predict 失败（%d 个请求）: %s", len(pending), e)
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_pairs += len(pairs)
+        offset = 0
+        for item_pairs, future in pending:
+            future.set_result(scores[offset:offset + len(item_pairs)])
+            offset += len(item_pairs)
+
+    def score(self, query: str, docs: Sequence[Any]) -> list[float]:
+        """给 docs 打分，顺序与 docs 一致"""
+        start = time.perf_counter()
+        keys = [(query, self.key_fn(doc)) for doc in docs]
+        scores = {}
+        todo = {}
+        for key, doc in zip(keys, docs):
+            cached = self.cache.get(key)
+            if cached is not None:
+                scores[key] = cached
+            elif key not in todo:
+                todo[key] = doc
+        if todo:
+            pairs = [[query, truncate_passage(doc.page_content, self.max_tokens, self.tokenizer)]
+                     for doc in todo.values()]
+            future: Future = Future()
+            self._ensure_worker()
+            self._queue.put((pairs, future))
+            for key, value in zip(todo, future.result()):
+                self.cache.set(key, value)
+                scores[key] = value
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, docs: Sequence[Any], k: int) -> list[Any]:
+        """按重排序分数降序返回前 k 个文档"""
+        scored = sorted(zip(docs, self.score(query, docs)), key=lambda x: x[1], reverse=True)
+        return [doc for doc, _ in scored[:k]]
+
+    def stats(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "cache": self.cache.stats(),
+            "batches": self.batches,
+            "avg_batch_pairs": round(self.batched_pairs / self.batches, 2) if self.batches else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
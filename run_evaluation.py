@@ -7,6 +7,7 @@ Aura Agent 评估运行脚本
     python run_evaluation.py --agent            # 只运行Agent评估
     python run_evaluation.py --quick            # 快速模式（减少测试用例）
     python run_evaluation.py --save             # 保存评估报告到文件
+    python run_evaluation.py --router-bench     # 对比 LLM 路由与本地路由的准确率和耗时
 """
 
 import os
@@ -27,7 +28,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from aura_react import AuraReActAgent
 from evaluation.rag_eval import RAGEvaluator
-from evaluation.agent_eval import AgentEvaluator, CapabilityAnalyzer, ModelComparator
+from evaluation.agent_eval import (
+    AgentEvaluator, CapabilityAnalyzer, ModelComparator, benchmark_router, router_report,
+)
+from fast_router import SEED_EXAMPLES, TRAIN_SPLITS, FastRouter, RouteClassifier, examples_from_dataset
 
 
 class DeepSeekJudge:
@@ -40,13 +44,15 @@ class DeepSeekJudge:
             base_url="https://api.deepseek.com",
         )
         self.model = model
+        self.temperature = 0
+        self.max_tokens = 16
 
     def invoke(self, prompt: str) -> str:
         resp = self.client.chat.completions.create(
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=16,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
         )
         return resp.choices[0].message.content.strip()
 
@@ -64,6 +70,8 @@ def _build_retrieval_qa(agent: AuraReActAgent):
     except ImportError:
         from langchain_classic.chains import RetrievalQA
 
+    if agent.rag_system.vectorstore is None:
+        raise ValueError("RetrievalQA 评估需要 vector_store='chroma'（langchain VectorStore）")
     retriever = agent.rag_system.vectorstore.as_retriever(search_kwargs={"k": 3})
     return RetrievalQA.from_chain_type(
         llm=agent.llm,
@@ -87,6 +95,7 @@ def run_rag_evaluation(agent: AuraReActAgent, test_cases: list, use_llm: bool =
         retrieval_qa=retrieval_qa,
         llm=eval_llm,
         agent=None,
+        llm_cache=agent.llm_cache,
     )
 
     print("\n正在评估检索质量...")
@@ -98,6 +107,12 @@ def run_rag_evaluation(agent: AuraReActAgent, test_cases: list, use_llm: bool =
     print(f"   Avg Recall:     {retrieval_results['avg_recall']:.2%}")
     print(f"   Avg Time:       {retrieval_results['avg_retrieval_time_ms']:.0f}ms")
 
+    embeddings = agent.rag_system.embeddings
+    if hasattr(embeddings, "stats"):
+        cache_stats = embeddings.stats()
+        print(f"   嵌入缓存命中率: {cache_stats['hit_rate']:.2%} "
+              f"(内存 {cache_stats['memory_hits']} / 磁盘 {cache_stats['disk_hits']} / 未命中 {cache_stats['misses']})")
+
     if use_llm:
         print("\n正在评估 Faithfulness (RAG 直接生成 + LLM-as-Judge)...")
         faith_test_cases = test_cases[:10]
@@ -108,6 +123,11 @@ def run_rag_evaluation(agent: AuraReActAgent, test_cases: list, use_llm: bool =
         print(f"   Relevance:      {faith_results['avg_relevance']:.2f}/5")
         print(f"   Avg Gen Time:   {faith_results['avg_generation_time_ms']:.0f}ms")
         print(f"   测试用例数:     {faith_results['total_cases']}")
+        if agent.llm_cache is not None:
+            judge_stats = agent.llm_cache.stats()["namespaces"].get("judge")
+            if judge_stats:
+                print(f"   打分缓存命中率: {judge_stats['hit_rate']:.2%} "
+                      f"(内存 {judge_stats['memory_hits']} / 磁盘 {judge_stats['disk_hits']} / 未命中 {judge_stats['misses']})")
 
     return {
         "retrieval": retrieval_results,
@@ -155,6 +175,31 @@ def run_agent_evaluation(agent: AuraReActAgent, test_cases: list) -> dict:
     }
 
 
+def run_router_benchmark(agent: AuraReActAgent, dataset: dict) -> dict:
+    """
+    路由延迟对比：每次调用 LLM 路由 vs 本地分类器（低置信度回退 LLM）vs 纯本地分类器。
+    分类器与生产路由一样只用种子样本和 TRAIN_SPLITS（rag_tests）训练，在 agent_tests 上评测，避免训练集泄漏。
+    """
+    from aura_react import QueryRouter
+
+    print("\n" + "=" * 60)
+    print("路由器评估")
+    print("=" * 60)
+
+    labeled = examples_from_dataset({"agent_tests": dataset.get("agent_tests", [])})
+    train = SEED_EXAMPLES + examples_from_dataset({split: dataset.get(split, []) for split in TRAIN_SPLITS})
+    classifier = RouteClassifier().fit(train)
+    llm_router = QueryRouter(agent.llm)
+    results = benchmark_router({
+        "llm": llm_router,
+        "local+llm": FastRouter(classifier, fallback=llm_router),
+        "local": FastRouter(classifier),
+    }, labeled)
+    report = router_report(results)
+    print("\n" + report)
+    return {"results": [r.__dict__ for r in results], "report": report}
+
+
 def run_model_comparison(model_names: list, test_cases: list,
                          api_key: str = None, api_base: str = None) -> dict:
     """多模型横向对比评估"""
@@ -244,6 +289,13 @@ def main():
     parser.add_argument("--llm-eval", action="store_true", help="使用LLM评估生成质量")
     parser.add_argument("--model", type=str, default="qwen2.5:7b", help="使用的模型名称")
     parser.add_argument("--deepseek-judge", type=str, default=None, help="DeepSeek API key, 用DeepSeek当Judge替代本地模型自评")
+    parser.add_argument(
+        "--router",
+        choices=["local", "llm"],
+        default="local",
+        help="Agent 路由器：local=本地分类器优先（低置信度回退 LLM），llm=每次调用 LLM",
+    )
+    parser.add_argument("--router-bench", action="store_true", help="对比 LLM / 本地路由的准确率与耗时")
     parser.add_argument(
         "--compare",
         type=str,
@@ -322,6 +374,7 @@ def main():
             enable_reranker=False,
             api_key=args.api,
             base_url=args.api_base,
+            router=args.router,
         )
         print("   ✅ Agent初始化成功")
     except Exception as e:
@@ -355,6 +408,14 @@ def main():
         except Exception as e:
             print(f"\n❌ RAG评估出错: {e}")
     
+    # 路由器对比（在 Agent 评估前执行，agent_tests 随后会被 edge_cases 扩充）
+    if args.router_bench and dataset.get("agent_tests"):
+        try:
+            router_results = run_router_benchmark(agent, dataset)
+            agent_report += router_results["report"] + "\n\n"
+        except Exception as e:
+            print(f"\n❌ 路由器评估出错: {e}")
+
     # 运行Agent评估
     if run_agent and dataset.get("agent_tests"):
         try:
@@ -364,7 +425,7 @@ def main():
                 all_agent_tests.extend(dataset.get("edge_cases", []))
             
             agent_results = run_agent_evaluation(agent, all_agent_tests)
-            agent_report = agent_results.get("report", "")
+            agent_report += agent_results.get("report", "")
         except Exception as e:
             print(f"\n❌ Agent评估出错: {e}")
     
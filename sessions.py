@@ -0,0 +1,89 @@
+"""
+Aura 会话池
+- session_id → 会话状态（对话窗口记忆等轻量对象），首次访问时由 factory 创建
+- 超过 max_sessions 时淘汰最久未使用的会话，空闲超过 idle_ttl 秒的会话在下次访问池时清理；
+  正在执行请求的会话（busy 返回 True）不会被淘汰，否则同一 session_id 的下一个请求会拿到新会话并与其并发
+- 重量级资源（LLM 客户端 / RAG / 工具）由 Agent 共享，不在会话中
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger("AuraSessions")
+
+
+class SessionPool:
+    """线程安全的会话池（LRU + 空闲超时）"""
+
+    def __init__(self, factory: Callable[[str], Any], max_sessions: int = 256,
+                 idle_ttl: float | None = 1800.0, busy: Callable[[Any], bool] | None = None):
+        self.factory = factory
+        self.busy = busy or (lambda session: False)
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.created = 0
+        self.evicted = 0
+        self._sessions: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: Hashable) -> bool:
+        return session_id in self._sessions
+
+    def _evict_idle(self, now: float):
+        if self.idle_ttl is None:
+            return
+        expired = []
+        for session_id, (last_used, session) in self._sessions.items():
+            if now - last_used <= self.idle_ttl:
+                break
+            if not self.busy(session):
+                expired.append(session_id)
+        for session_id in expired:
+            del self._sessions[session_id]
+            self.evicted += 1
+            logger.debug("会话 %s 空闲超时，已释放", session_id)
+
+    def _evict_overflow(self, keep: Hashable):
+        """从最久未使用的一端淘汰空闲会话（keep 为刚取出的会话）；全部忙碌时暂时允许超出 max_sessions"""
+        overflow = len(self._sessions) - self.max_sessions
+        if overflow <= 0:
+            return
+        victims = [sid for sid, (_, session) in self._sessions.items()
+                   if sid != keep and not self.busy(session)][:overflow]
+        for session_id in victims:
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def get(self, session_id: Hashable) -> Any:
+        """取会话（不存在则创建），并刷新其最近使用时间"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                session = self.factory(session_id)
+                self.created += 1
+            else:
+                session = entry[1]
+            self._sessions[session_id] = (now, session)
+            self._sessions.move_to_end(session_id)
+            self._evict_overflow(session_id)
+        return session
+
+    def drop(self, session_id: Hashable) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,81 @@
+"""
+Aura 启动时间线
+记录各组件（嵌入模型 / 向量库 / BM25 / 重排序 / LLM / Agent / 预热）的加载状态与耗时，
+供 /ready 就绪检查和冷启动分析使用。
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("AuraStartup")
+
+PENDING, LOADING, READY, FAILED, DISABLED = "pending", "loading", "ready", "failed", "disabled"
+# 可选组件加载失败：服务以降级方式运行（如不做重排序），不影响就绪
+DEGRADED = "degraded"
+
+
+class StartupTimeline:
+    """线程安全的组件加载时间线，时间均相对于 t0（进程启动或 reset 时刻）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.t0 = time.perf_counter()
+            self.components: dict[str, dict] = {}
+
+    def expect(self, *names: str):
+        """登记需要加载的组件，未开始前显示为 pending"""
+        with self._lock:
+            for name in names:
+                self.components.setdefault(name, {"state": PENDING})
+
+    @contextmanager
+    def track(self, name: str):
+        """记录一个组件的加载区间；异常时标记为 failed 并继续抛出"""
+        start = time.perf_counter()
+        with self._lock:
+            self.components[name] = {"state": LOADING, "start_s": round(start - self.t0, 3)}
+        try:
+            yield
+        except BaseException as e:
+            self._finish(name, start, FAILED, error=str(e))
+            raise
+        self._finish(name, start, READY)
+
+    def _finish(self, name: str, start: float, state: str, error: str | None = None):
+        seconds = time.perf_counter() - start
+        with self._lock:
+            entry = self.components.setdefault(name, {})
+            entry.update(state=state, seconds=round(seconds, 3))
+            if error:
+                entry["error"] = error
+        logger.info("组件 %s %s，耗时 %.2fs", name, state, seconds)
+
+    def mark(self, name: str, state: str, error: str | None = None):
+        """直接设置组件状态（例如可选组件被关闭时标记为 disabled、加载失败时标记为 degraded）"""
+        with self._lock:
+            entry = self.components.setdefault(name, {})
+            entry["state"] = state
+            if error:
+                entry["error"] = error
+
+    def is_ready(self, *names: str) -> bool:
+        with self._lock:
+            names = names or tuple(self.components)
+            return all(self.components.get(n, {}).get("state") in (READY, DISABLED, DEGRADED) for n in names)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_s": round(time.perf_counter() - self.t0, 3),
+                "components": {name: dict(entry) for name, entry in self.components.items()},
+            }
+
+
+# 进程级时间线：RAGSystem / Agent / API 共用
+timeline = StartupTimeline()
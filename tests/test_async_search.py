@@ -0,0 +1,71 @@
+"""RAGSystem 异步检索（ahybrid_search / asearch）单元测试"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+
+
+def _doc(chunk_id):
+    return SimpleNamespace(page_content=chunk_id, metadata={"chunk_id": chunk_id})
+
+
+@pytest.fixture
+def rag_system(tmp_path):
+    """两路召回各耗时 0.1s 的 RAGSystem，用于验证并发与取消"""
+    with patch("rag.HuggingFaceEmbeddings"), \
+         patch("rag.Chroma"), \
+         patch("rag.CrossEncoder"):
+        from rag import RAGSystem
+        system = RAGSystem(persist_directory=str(tmp_path / "test_db"), enable_reranker=False)
+
+    def vector_recall(query, k, filters=None):
+        time.sleep(0.1)
+        return [(_doc("v1"), -0.1)]
+
+    def bm25_recall(query, k, filters=None):
+        time.sleep(0.1)
+        return [(_doc("b1"), 3.0)]
+
+    system._vector_recall = MagicMock(side_effect=vector_recall)
+    system._bm25_recall = MagicMock(side_effect=bm25_recall)
+    yield system
+    system.search_executor.shutdown(wait=True)
+
+
+class TestAsyncHybridSearch:
+    def test_recall_legs_run_concurrently(self, rag_system):
+        start = time.perf_counter()
+        results = asyncio.run(rag_system.ahybrid_search("Aura", k=2, use_rerank=False))
+        assert time.perf_counter() - start < 0.18
+        assert {doc.metadata["chunk_id"] for doc in results} == {"v1", "b1"}
+
+    def test_runs_on_dedicated_executor(self, rag_system):
+        threads = []
+        rag_system._vector_recall.side_effect = lambda *a: threads.append(threading.current_thread().name) or []
+        asyncio.run(rag_system.ahybrid_search("Aura", k=2))
+        assert threads[0].startswith("aura-search")
+
+    def test_shares_cache_with_sync_path(self, rag_system):
+        first = asyncio.run(rag_system.ahybrid_search("什么是 Aura?", k=2))
+        second = rag_system.hybrid_search("什么是 aura", k=2)
+        assert [d.metadata["chunk_id"] for d in first] == [d.metadata["chunk_id"] for d in second]
+        assert rag_system._vector_recall.call_count == 1
+
+    def test_cancel_skips_remaining_stages(self, rag_system):
+        rag_system._fuse_and_rerank = MagicMock(return_value=[])
+
+        async def cancel_midway():
+            task = asyncio.ensure_future(rag_system.ahybrid_search("Aura", k=2))
+            await asyncio.sleep(0.03)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.15)
+
+        asyncio.run(cancel_midway())
+        rag_system._fuse_and_rerank.assert_not_called()
+        assert len(rag_system.query_cache) == 0
@@ -0,0 +1,41 @@
+"""推理后端选择单元测试"""
+
+import pytest
+
+import backends
+from backends import cache_model_name, embedding_model_args, quantized_model_dir, resolve_backend
+
+
+class TestResolveBackend:
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="未知推理后端"):
+            resolve_backend("tensorrt")
+
+    def test_falls_back_without_onnx(self, monkeypatch):
+        monkeypatch.setattr(backends, "ONNX_AVAILABLE", False)
+        assert resolve_backend("onnx-int8") == "torch"
+        assert resolve_backend("torch") == "torch"
+
+    def test_keeps_onnx_when_available(self, monkeypatch):
+        monkeypatch.setattr(backends, "ONNX_AVAILABLE", True)
+        assert resolve_backend("onnx") == "onnx"
+
+
+class TestModelArgs:
+    def test_cache_name_separates_backends(self):
+        assert cache_model_name("moka-ai/m3e-base", "torch") == "moka-ai/m3e-base"
+        assert cache_model_name("moka-ai/m3e-base", "onnx-int8") != "moka-ai/m3e-base"
+
+    def test_quantized_dir_is_flat(self, tmp_path):
+        path = quantized_model_dir("moka-ai/m3e-base", str(tmp_path))
+        assert path.startswith(str(tmp_path))
+        assert "/" not in path[len(str(tmp_path)) + 1:]
+
+    def test_torch_args(self):
+        assert embedding_model_args("moka-ai/m3e-base", "torch") == ("moka-ai/m3e-base", {"device": "cpu"})
+
+    def test_onnx_args(self, monkeypatch):
+        monkeypatch.setattr(backends, "ONNX_AVAILABLE", True)
+        path, kwargs = embedding_model_args("moka-ai/m3e-base", "onnx")
+        assert path == "moka-ai/m3e-base"
+        assert kwargs["backend"] == "onnx"
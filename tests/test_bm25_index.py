@@ -0,0 +1,234 @@
+"""增量 BM25 索引单元测试"""
+
+import pytest
+
+from bm25_index import BM25Index, bigram_tokenize, get_tokenizer
+
+
+@pytest.fixture
+def index():
+    idx = BM25Index()
+    idx.add("a", "python agent framework")
+    idx.add("b", "python web server")
+    idx.add("c", "rust systems programming")
+    return idx
+
+
+class TestBM25Index:
+    def test_search_ranks_matching_docs(self, index):
+        hits = index.search("agent", k=3)
+        assert [chunk_id for chunk_id, _ in hits] == ["a"]
+
+    def test_search_respects_k(self, index):
+        hits = index.search("python", k=1)
+        assert len(hits) == 1
+
+    def test_rare_term_outweighs_common_term(self, index):
+        hits = index.search("python agent", k=3)
+        assert hits[0][0] == "a"
+        assert hits[0][1] > hits[1][1]
+
+    def test_incremental_add_updates_df(self, index):
+        assert index.df("python") == 2
+        index.add("d", "python data science")
+        assert index.df("python") == 3
+        assert len(index) == 4
+
+    def test_remove(self, index):
+        assert index.remove("a") is True
+        assert index.search("agent") == []
+        assert index.df("python") == 1
+        assert "framework" not in index._postings
+        assert len(index) == 2
+
+    def test_remove_missing(self, index):
+        assert index.remove("zzz") is False
+
+    def test_re_add_overwrites(self, index):
+        index.add("a", "golang")
+        assert index.search("agent") == []
+        assert index.search("golang")[0][0] == "a"
+        assert len(index) == 3
+
+    def test_avgdl_tracks_changes(self, index):
+        assert index.avgdl == pytest.approx(3.0)
+        index.add("d", "one")
+        assert index.avgdl == pytest.approx(10 / 4)
+        index.remove("d")
+        assert index.avgdl == pytest.approx(3.0)
+
+    def test_search_restricted_to_candidates(self, index):
+        hits = index.search("python", k=3, candidates={"b", "c"})
+        assert [chunk_id for chunk_id, _ in hits] == ["b"]
+        # 候选集内的分数与不过滤时一致（idf 仍按全库统计）
+        assert hits[0][1] == dict(index.search("python", k=3))["b"]
+        assert index.search("python", k=3, candidates=set()) == []
+
+    def test_large_candidate_set(self, index):
+        hits = index.search("python", k=3, candidates={"a", "b", "c", "x", "y"})
+        assert sorted(chunk_id for chunk_id, _ in hits) == ["a", "b"]
+
+    def test_empty_index(self):
+        assert BM25Index().search("anything") == []
+
+    def test_matches_full_rebuild(self, index):
+        """增量增删后的分数与从头构建的索引一致"""
+        index.add("d", "python agent tools")
+        index.remove("b")
+
+        fresh = BM25Index()
+        fresh.add("a", "python agent framework")
+        fresh.add("c", "rust systems programming")
+        fresh.add("d", "python agent tools")
+
+        got = index.search("python agent", k=3)
+        expected = fresh.search("python agent", k=3)
+        assert [c for c, _ in got] == [c for c, _ in expected]
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected])
+
+
+class TestTokenizers:
+    def test_bigram_chinese(self):
+        assert bigram_tokenize("天竺鲷") == ["天竺", "竺鲷"]
+
+    def test_bigram_mixed_text(self):
+        assert bigram_tokenize("用 Python 写Agent，很好") == ["用", "python", "写", "agent", "很好"]
+
+    def test_bigram_drops_punctuation(self):
+        assert bigram_tokenize("！？。，") == []
+
+    def test_chinese_recall_with_bigram(self):
+        idx = BM25Index(tokenizer="bigram")
+        idx.add("fish", "半线天竺鲷的体长可达12公分")
+        idx.add("other", "默哀是一种哀悼方式")
+        assert idx.search("天竺鲷体长多少", k=1)[0][0] == "fish"
+
+    def test_unknown_tokenizer(self):
+        with pytest.raises(ValueError, match="未知分词器"):
+            get_tokenizer("nope")
+
+    def test_tokenizer_cache(self):
+        tokenizer = get_tokenizer("bigram")
+        tokenizer("同一个文本块")
+        tokenizer("同一个文本块")
+        assert tokenizer.cache_info().hits == 1
+
+    def test_jieba_falls_back_when_missing(self, monkeypatch):
+        import bm25_index
+        monkeypatch.setattr(bm25_index, "JIEBA_AVAILABLE", False)
+        assert get_tokenizer("jieba").name == "bigram"
+
+
+class TestPersistence:
+    def _fill(self, idx):
+        idx.add("a", "python agent framework")
+        idx.add("b", "python web server")
+        idx.add("c", "rust systems programming")
+
+    def test_reload_from_journal(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        idx.remove("c")
+        expected = idx.search("python agent", k=3)
+        idx.close()
+
+        reloaded = BM25Index.open(str(tmp_path))
+        assert len(reloaded) == 2
+        assert reloaded.search("python agent", k=3) == expected
+
+    def test_reload_from_snapshot(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        idx.save()
+        expected = idx.search("python agent", k=3)
+        idx.close()
+
+        assert (tmp_path / "journal.jsonl").read_text() == ""
+        reloaded = BM25Index.open(str(tmp_path))
+        assert len(reloaded) == 3
+        # 倒排表按需解码
+        assert reloaded._postings == {}
+        assert reloaded.search("python agent", k=3) == expected
+        assert "python" in reloaded._postings
+        assert "rust" not in reloaded._postings
+
+    def test_mutations_on_top_of_snapshot(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        idx.save()
+        idx.close()
+
+        reloaded = BM25Index.open(str(tmp_path))
+        reloaded.remove("a")
+        reloaded.add("b", "golang web server")
+        assert reloaded.df("python") == 0
+        assert reloaded.search("golang")[0][0] == "b"
+        reloaded.save()
+        reloaded.close()
+
+        again = BM25Index.open(str(tmp_path))
+        assert len(again) == 2
+        assert again.search("agent") == []
+        assert again.search("golang")[0][0] == "b"
+        assert again.avgdl == pytest.approx(3.0)
+
+    def test_save_removes_old_generations(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        idx.save()
+        idx.add("d", "new doc")
+        idx.save()
+        idx.close()
+        assert len(list(tmp_path.glob("postings-*.bin"))) == 1
+        assert len(list(tmp_path.glob("vocab-*.json"))) == 1
+
+    def test_truncated_journal_tail_ignored(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        idx.close()
+        with open(tmp_path / "journal.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"op": "add", "id": "x", "tf"')
+
+        reloaded = BM25Index.open(str(tmp_path))
+        assert len(reloaded) == 3
+        reloaded.add("d", "after crash")
+        reloaded.close()
+        assert len(BM25Index.open(str(tmp_path))) == 4
+        reloaded.add("d", "after crash")
+        reloaded.close()
+        assert len(BM25Index.open(str(tmp_path))) == 4
+
+    def test_rebuild_writes_one_snapshot_without_journal(self, tmp_path, monkeypatch):
+        idx = BM25Index.open(str(tmp_path))
+        self._fill(idx)
+        saves = []
+        original_save = idx.save
+        monkeypatch.setattr(idx, "save", lambda: (saves.append(len(idx)), original_save()))
+        idx.rebuild((f"doc{i}", f"python doc {i}") for i in range(3000))
+        assert saves == [3000]
+        assert (tmp_path / "journal.jsonl").read_text() == ""
+        idx.add("x", "after rebuild")
+        idx.close()
+
+        reloaded = BM25Index.open(str(tmp_path))
+        assert len(reloaded) == 3001 and "a" not in reloaded
+        assert reloaded.search("after")[0][0] == "x"
+
+    def test_rebuild_in_memory(self):
+        idx = BM25Index()
+        idx.add("a", "old")
+        idx.rebuild([("b", "new doc")])
+        assert len(idx) == 1 and idx.search("new")[0][0] == "b"
+
+    def test_save_requires_directory(self):
+        with pytest.raises(ValueError):
+            BM25Index().save()
+
+    def test_tokenizer_change_discards_snapshot(self, tmp_path):
+        idx = BM25Index.open(str(tmp_path), tokenizer="whitespace")
+        self._fill(idx)
+        idx.close()
+
+        reloaded = BM25Index.open(str(tmp_path), tokenizer="bigram")
+        assert len(reloaded) == 0
+        assert reloaded.tokenizer_name == "bigram"
@@ -0,0 +1,126 @@
+"""缓存模块单元测试"""
+
+import pytest
+
+from cache import LRUCache
+from embedding_cache import CachedEmbeddings
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_ttl_expiry(self, monkeypatch):
+        import cache as cache_module
+        now = [100.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        cache = LRUCache(maxsize=10, ttl=5)
+        cache.set("a", 1)
+        now[0] = 104.0
+        assert cache.get("a") == 1
+        now[0] = 106.0
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_stats(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_pop_and_clear(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        assert cache.pop("a") == 1
+        assert cache.pop("a", "gone") == "gone"
+        cache.set("b", 2)
+        cache.clear()
+        assert len(cache) == 0
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.document_calls = []
+        self.query_calls = []
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [[float(len(t)), 0.5] for t in texts]
+
+    def embed_query(self, text):
+        self.query_calls.append(text)
+        return [float(len(text)), 0.25]
+
+
+@pytest.fixture
+def fake():
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def cached(fake, tmp_path):
+    c = CachedEmbeddings(fake, model_name="fake", path=str(tmp_path / "emb.sqlite"))
+    yield c
+    c.close()
+
+
+class TestCachedEmbeddings:
+    def test_documents_cached_in_memory(self, cached, fake):
+        assert cached.embed_documents(["ab", "abc"]) == [[2.0, 0.5], [3.0, 0.5]]
+        assert cached.embed_documents(["abc", "ab"]) == [[3.0, 0.5], [2.0, 0.5]]
+        assert fake.document_calls == [["ab", "abc"]]
+        assert cached.stats()["memory_hits"] == 2
+
+    def test_only_missing_texts_are_embedded(self, cached, fake):
+        cached.embed_documents(["a"])
+        cached.embed_documents(["a", "bb", "bb"])
+        assert fake.document_calls == [["a"], ["bb"]]
+
+    def test_query_cached(self, cached, fake):
+        cached.embed_query("hello")
+        cached.embed_query("hello")
+        assert fake.query_calls == ["hello"]
+
+    def test_disk_tier_survives_restart(self, fake, tmp_path):
+        path = str(tmp_path / "emb.sqlite")
+        first = CachedEmbeddings(fake, model_name="fake", path=path)
+        first.embed_documents(["persist me"])
+        first.close()
+
+        second = CachedEmbeddings(fake, model_name="fake", path=path)
+        assert second.embed_documents(["persist me"]) == [[10.0, 0.5]]
+        assert len(fake.document_calls) == 1
+        assert second.stats()["disk_hits"] == 1
+        second.close()
+
+    def test_model_name_is_part_of_key(self, fake, tmp_path):
+        path = str(tmp_path / "emb.sqlite")
+        a = CachedEmbeddings(fake, model_name="model-a", path=path)
+        a.embed_documents(["same text"])
+        a.close()
+        b = CachedEmbeddings(fake, model_name="model-b", path=path)
+        b.embed_documents(["same text"])
+        b.close()
+        assert len(fake.document_calls) == 2
+
+    def test_hit_rate(self, cached):
+        cached.embed_documents(["x", "y"])
+        cached.embed_documents(["x", "y"])
+        assert cached.stats()["hit_rate"] == 0.5
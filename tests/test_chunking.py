@@ -0,0 +1,97 @@
+"""结构感知切分单元测试"""
+
+from types import SimpleNamespace
+
+from chunking import StructureAwareSplitter, markdown_sections, pdf_sections
+
+
+def _doc(text: str, source: str, **metadata):
+    return SimpleNamespace(page_content=text, metadata={"source": source, **metadata})
+
+
+MARKDOWN = """# 指南
+
+简介。
+
+## 安装
+
+pip install aura
+
+```bash
+# 这是注释不是标题
+```
+
+## 使用
+
+### 命令行
+
+运行 aura。
+"""
+
+
+class TestMarkdownSections:
+    def test_heading_paths(self):
+        sections = markdown_sections(MARKDOWN)
+        assert [path for path, _ in sections] == [
+            ["指南"], ["指南", "安装"], ["指南", "使用", "命令行"],
+        ]
+
+    def test_code_fence_is_not_heading(self):
+        _, body = markdown_sections(MARKDOWN)[1]
+        assert "# 这是注释不是标题" in body
+
+    def test_heading_only_section_merges_into_child(self):
+        _, body = markdown_sections(MARKDOWN)[2]
+        assert body.startswith("## 使用")
+        assert "运行 aura" in body
+
+
+class TestPdfSections:
+    def test_numbered_headings_and_page_carry_over(self):
+        path = []
+        first = pdf_sections("1 引言\n背景介绍。\n2 方法\n2.1 数据\n数据来源。", path)
+        second = pdf_sections("继续描述数据。\n第三章 结论\n总结。", path)
+        assert [p for p, _ in first] == [["1 引言"], ["2 方法", "2.1 数据"]]
+        assert [p for p, _ in second] == [["2 方法", "2.1 数据"], ["第三章 结论"]]
+
+    def test_sentences_are_not_headings(self):
+        assert pdf_sections("2023 年营收增长。\n1 个样本不足，", []) == [
+            ([], "2023 年营收增长。\n1 个样本不足，"),
+        ]
+
+    def test_table_rows_are_not_headings(self):
+        table = "序号 姓名 年龄\n1 张三 男 28\n2 Apple 3.5 12%\n3 0.85 0.91\n4  李四  北京"
+        assert pdf_sections(table, []) == [([], table)]
+
+    def test_titles_with_words_still_headings(self):
+        sections = pdf_sections("3 Experimental Setup\n正文。\n3.1 GPT-4 评测\n结果。", [])
+        assert [p for p, _ in sections] == [["3 Experimental Setup"], ["3 Experimental Setup", "3.1 GPT-4 评测"]]
+
+
+class TestStructureAwareSplitter:
+    def test_markdown_chunks_carry_heading_path(self):
+        chunks = StructureAwareSplitter().split_documents([_doc(MARKDOWN, "/docs/guide.md")])
+        assert [c.metadata["heading_path"] for c in chunks] == ["指南", "指南 > 安装", "指南 > 使用 > 命令行"]
+        assert all(c.metadata["source"] == "/docs/guide.md" for c in chunks)
+
+    def test_long_section_packed_without_overlap(self):
+        paragraphs = [f"第{i}段。" + "内容" * 40 for i in range(10)]
+        text = "# 长章节\n\n" + "\n\n".join(paragraphs)
+        chunks = StructureAwareSplitter(max_chars=200).split_documents([_doc(text, "a.md")])
+        assert all(len(c.page_content) <= 200 + len("# 长章节\n\n") for c in chunks)
+        joined = "".join(c.page_content for c in chunks)
+        assert all(joined.count(p) == 1 for p in paragraphs)
+        assert [c.metadata["section_chunk"] for c in chunks] == list(range(len(chunks)))
+
+    def test_pdf_chunks_do_not_cross_pages(self):
+        pages = [_doc("1 引言\n第一页。", "p.pdf", page=0), _doc("第二页。", "p.pdf", page=1)]
+        chunks = StructureAwareSplitter().split_documents(pages)
+        assert [(c.metadata["page"], c.metadata["heading_path"]) for c in chunks] == [(0, "1 引言"), (1, "1 引言")]
+
+    def test_other_formats_use_fallback(self):
+        class Fallback:
+            def split_documents(self, docs):
+                return [SimpleNamespace(page_content="fallback", metadata=dict(d.metadata)) for d in docs]
+
+        chunks = StructureAwareSplitter(fallback=Fallback()).split_documents([_doc("a,b", "x.csv")])
+        assert [c.page_content for c in chunks] == ["fallback"]
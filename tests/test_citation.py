@@ -6,13 +6,13 @@ from types import SimpleNamespace
 
 
 @pytest.fixture
-def rag_system():
+def rag_system(tmp_path):
     """构造一个不依赖真实 embedding / Chroma 的 RAGSystem"""
     with patch("rag.HuggingFaceEmbeddings"), \
          patch("rag.Chroma"), \
          patch("rag.CrossEncoder"):
         from rag import RAGSystem
-        system = RAGSystem(persist_directory="test_db", enable_reranker=False)
+        system = RAGSystem(persist_directory=str(tmp_path / "test_db"), enable_reranker=False)
         return system
 
 
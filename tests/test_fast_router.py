@@ -0,0 +1,98 @@
+"""本地快速路由单元测试（分类器 / LLM 兜底 / 决策缓存 / 评测数据映射 / 路由对比）"""
+
+from unittest.mock import MagicMock
+
+from fast_router import SEED_EXAMPLES, FastRouter, RouteClassifier, examples_from_dataset
+
+
+def _classifier():
+    return RouteClassifier().fit(SEED_EXAMPLES)
+
+
+class TestRouteClassifier:
+    def test_predicts_seed_routes(self):
+        classifier = _classifier()
+        assert classifier.predict("帮我查一下明天上海的天气")[0] == "TOOL"
+        assert classifier.predict("请从知识库查找这份文档的内容")[0] == "RETRIEVE"
+        assert classifier.predict("写一首关于冬天的诗")[0] == "DIRECT"
+
+    def test_unknown_text_is_uniform(self):
+        route, confidence = _classifier().predict("zzz qqq")
+        assert abs(confidence - 1 / 3) < 1e-9
+
+    def test_unknown_route_rejected(self):
+        import pytest
+        with pytest.raises(ValueError):
+            RouteClassifier().fit([("你好", "CHAT")])
+
+    def test_from_dataset_missing_file(self, tmp_path):
+        classifier = RouteClassifier.from_dataset(str(tmp_path / "missing.json"))
+        assert classifier.predict("今天北京天气怎么样")[0] == "TOOL"
+
+    def test_from_dataset_holds_out_agent_tests(self, tmp_path):
+        import json
+        path = tmp_path / "dataset.json"
+        path.write_text(json.dumps({
+            "rag_tests": [{"question": "熊猫体长多少"}],
+            "agent_tests": [{"question": "翡翠城邮编多少", "expected_tool": "search_web"}],
+        }, ensure_ascii=False), encoding="utf-8")
+        classifier = RouteClassifier.from_dataset(str(path))
+        assert "熊猫" in classifier.vocab
+        assert "翡翠" not in classifier.vocab
+        assert "翡翠" in RouteClassifier.from_dataset(str(path), splits=("agent_tests",)).vocab
+
+    def test_examples_from_dataset(self):
+        dataset = {
+            "rag_tests": [{"question": "体长多少公分"}],
+            "agent_tests": [
+                {"question": "查知识库", "expected_tool": "search_knowledge"},
+                {"question": "记住我喜欢 Python", "expected_tool": "remember_user_info"},
+                {"question": "1+1", "expected_tool": None},
+            ],
+        }
+        assert [route for _, route in examples_from_dataset(dataset)] == [
+            "RETRIEVE", "RETRIEVE", "TOOL", "DIRECT",
+        ]
+
+
+class TestFastRouter:
+    def test_confident_local_decision_skips_llm(self):
+        fallback = MagicMock()
+        router = FastRouter(_classifier(), fallback=fallback, threshold=0.6)
+        decision = router.decide("今天北京天气怎么样")
+        assert decision.route == "TOOL" and decision.source == "local"
+        fallback.route.assert_not_called()
+
+    def test_low_confidence_falls_back_to_llm(self):
+        fallback = MagicMock()
+        fallback.route.return_value = "DIRECT"
+        router = FastRouter(_classifier(), fallback=fallback, threshold=0.99)
+        decision = router.decide("zzz qqq")
+        assert decision.route == "DIRECT" and decision.source == "llm"
+        assert router.stats()["llm_rate"] == 1.0
+
+    def test_decisions_cached(self):
+        fallback = MagicMock()
+        fallback.route.return_value = "RETRIEVE"
+        router = FastRouter(_classifier(), fallback=fallback, threshold=0.99)
+        router.route("zzz qqq")
+        decision = router.decide("  ZZZ   qqq ")
+        assert decision.source == "cache" and decision.route == "RETRIEVE"
+        assert fallback.route.call_count == 1
+
+    def test_without_fallback_uses_classifier(self):
+        router = FastRouter(_classifier(), threshold=0.99)
+        assert router.decide("zzz qqq").source == "local"
+
+
+class TestRouterBenchmark:
+    def test_compares_llm_and_local(self):
+        from evaluation.agent_eval import benchmark_router, router_report
+        llm = MagicMock(spec=["route"])
+        llm.route.return_value = "RETRIEVE"
+        cases = [("今天北京天气怎么样", "TOOL"), ("请查询知识库回答", "RETRIEVE")]
+        results = benchmark_router({"llm": llm, "local": FastRouter(_classifier())}, cases)
+        by_name = {r.name: r for r in results}
+        assert by_name["llm"].llm_calls == 2 and by_name["llm"].accuracy == 0.5
+        assert by_name["local"].llm_calls == 0 and by_name["local"].accuracy == 1.0
+        assert "`local`" in router_report(results)
@@ -0,0 +1,86 @@
+"""检索过滤条件单元测试"""
+
+from datetime import datetime
+
+import pytest
+
+from filters import SearchFilter, file_metadata, match_where, parse_timestamp
+
+
+class TestParseTimestamp:
+    def test_epoch_and_iso(self):
+        assert parse_timestamp(1700000000) == 1700000000.0
+        assert parse_timestamp("1700000000") == 1700000000.0
+        assert parse_timestamp("2024-05-01") == datetime(2024, 5, 1).timestamp()
+        assert parse_timestamp(None) is None
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match="无法解析时间"):
+            parse_timestamp("上周")
+
+
+class TestSearchFilter:
+    def test_empty_filter_is_falsy(self):
+        assert not SearchFilter.from_params()
+        assert SearchFilter.coerce({}) is None
+        assert SearchFilter.coerce(None) is None
+
+    def test_normalizes_and_is_hashable(self):
+        a = SearchFilter.from_params(sources=["b.md", "a.md"], extensions=["PDF", ".md"])
+        b = SearchFilter.from_params(sources=["a.md", "b.md", "a.md"], extensions=[".pdf", "md"])
+        assert a == b
+        assert hash(a) == hash(b)
+        assert a.extensions == (".md", ".pdf")
+
+    def test_coerce_dict(self):
+        f = SearchFilter.coerce({"sources": "paper.pdf", "ingested_after": "2024-01-01"})
+        assert f.sources == ("paper.pdf",)
+        assert f.ingested_after == datetime(2024, 1, 1).timestamp()
+
+    def test_matches(self):
+        f = SearchFilter.from_params(sources=["paper.pdf"], ingested_after=100)
+        assert f.matches("/data/paper.pdf", ingested_at=150)
+        assert not f.matches("/data/paper.pdf", ingested_at=50)
+        assert not f.matches("/data/paper.pdf", ingested_at=None)
+        assert not f.matches("/data/other.pdf", ingested_at=150)
+        assert SearchFilter.from_params(extensions=["md"]).matches("/x/A.MD")
+
+    def test_to_where_single_clause(self):
+        assert SearchFilter.from_params(extensions=["pdf"]).to_where() == {"extension": {"$in": [".pdf"]}}
+
+    def test_to_where_combined(self):
+        where = SearchFilter.from_params(sources=["a.md"], ingested_after=1, ingested_before=2).to_where()
+        assert where == {"$and": [
+            {"$or": [{"source": {"$in": ["a.md"]}}, {"file_name": {"$in": ["a.md"]}}]},
+            {"ingested_at": {"$gte": 1.0}},
+            {"ingested_at": {"$lt": 2.0}},
+        ]}
+
+    def test_file_metadata(self):
+        assert file_metadata("/data/Paper.PDF", 5.0) == {
+            "file_name": "Paper.PDF", "extension": ".pdf", "ingested_at": 5.0,
+        }
+
+
+class TestMatchWhere:
+    META = {"source": "/data/a.md", "file_name": "a.md", "extension": ".md", "ingested_at": 100.0}
+
+    def test_empty_where(self):
+        assert match_where(self.META, None)
+        assert match_where(self.META, {})
+
+    def test_equality_and_operators(self):
+        assert match_where(self.META, {"extension": ".md"})
+        assert not match_where(self.META, {"extension": {"$in": [".pdf"]}})
+        assert match_where(self.META, {"ingested_at": {"$gte": 100.0, "$lt": 200.0}})
+        assert not match_where({}, {"ingested_at": {"$gte": 0}})
+
+    def test_agrees_with_search_filter(self):
+        f = SearchFilter.from_params(sources=["a.md"], extensions=["md"], ingested_after=50)
+        assert match_where(self.META, f.to_where())
+        assert not match_where(dict(self.META, file_name="b.md", source="/data/b.md"), f.to_where())
+        assert not match_where(dict(self.META, ingested_at=10.0), f.to_where())
+
+    def test_unknown_operator(self):
+        with pytest.raises(ValueError, match="不支持的 where 运算符"):
+            match_where(self.META, {"extension": {"$like": "%md"}})
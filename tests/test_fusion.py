@@ -0,0 +1,118 @@
+"""多路召回融合单元测试"""
+
+import pytest
+from types import SimpleNamespace
+
+from fusion import chunk_key, fuse, make_chunk_id, reciprocal_rank_fusion, weighted_score_fusion
+
+
+def _doc(chunk_id: str, content: str = ""):
+    return SimpleNamespace(page_content=content or chunk_id, metadata={"chunk_id": chunk_id})
+
+
+def _ids(fused):
+    return [doc.metadata["chunk_id"] for doc, _ in fused]
+
+
+class TestChunkKey:
+    def test_prefers_metadata_chunk_id(self):
+        assert chunk_key(_doc("abc", "正文")) == "abc"
+
+    def test_fallback_is_stable_hash(self):
+        doc = SimpleNamespace(page_content="正文", metadata={"source": "a.md"})
+        assert chunk_key(doc) == make_chunk_id(doc)
+        assert len(chunk_key(doc)) == 16
+
+    def test_same_prefix_different_chunks_not_merged(self):
+        # 旧实现按前 100 字去重，会把共享开头的不同块误合并
+        prefix = "x" * 100
+        a = SimpleNamespace(page_content=prefix + "a", metadata={})
+        b = SimpleNamespace(page_content=prefix + "b", metadata={})
+        assert chunk_key(a) != chunk_key(b)
+
+
+class TestReciprocalRankFusion:
+    def test_doc_in_both_lists_ranks_first(self):
+        vector = [(_doc("a"), 0.9), (_doc("b"), 0.8), (_doc("c"), 0.7)]
+        bm25 = [(_doc("c"), 12.0), (_doc("d"), 9.0)]
+        assert _ids(reciprocal_rank_fusion([vector, bm25]))[0] == "c"
+
+    def test_deduplicates_by_chunk_id(self):
+        fused = reciprocal_rank_fusion([[(_doc("a"), 1.0)], [(_doc("a"), 5.0)]])
+        assert _ids(fused) == ["a"]
+        assert fused[0][1] == pytest.approx(2 / 61)
+
+    def test_weights(self):
+        vector = [(_doc("a"), 1.0)]
+        bm25 = [(_doc("b"), 1.0)]
+        assert _ids(reciprocal_rank_fusion([vector, bm25], weights=[1.0, 2.0])) == ["b", "a"]
+
+    def test_ties_keep_first_seen_order(self):
+        fused = reciprocal_rank_fusion([[(_doc("a"), 1.0)], [(_doc("b"), 1.0)]])
+        assert _ids(fused) == ["a", "b"]
+
+    def test_weight_count_mismatch(self):
+        with pytest.raises(ValueError):
+            reciprocal_rank_fusion([[], []], weights=[1.0])
+
+
+class TestWeightedScoreFusion:
+    def test_scores_are_normalized_per_list(self):
+        # BM25 分数尺度远大于向量分数，归一化后不应压过向量一路
+        vector = [(_doc("a"), -0.1), (_doc("b"), -0.5)]
+        bm25 = [(_doc("b"), 30.0), (_doc("c"), 10.0)]
+        fused = {doc.metadata["chunk_id"]: score for doc, score in weighted_score_fusion([vector, bm25])}
+        assert fused["a"] == pytest.approx(1.0)
+        assert fused["b"] == pytest.approx(1.0)
+        assert fused["c"] == pytest.approx(0.0)
+
+    def test_single_result_list(self):
+        assert _ids(weighted_score_fusion([[(_doc("a"), 3.0)], []])) == ["a"]
+
+
+class TestFuse:
+    def test_dispatch(self):
+        lists = [[(_doc("a"), 1.0)], [(_doc("b"), 2.0)]]
+        assert _ids(fuse(lists, method="rrf")) == ["a", "b"]
+        assert len(fuse(lists, method="weighted")) == 2
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError, match="未知融合方式"):
+            fuse([], method="max")
+
+
+class TestFusionBenchmark:
+    """两路召回各自把噪声排在第 1、都把相关块排在第 2：拼接去重会让噪声领先，RRF 无需重排序即可纠正"""
+
+    def _setup(self, n_cases=4):
+        chunks, cases, legs = [], [], {"vector": {}, "bm25": {}}
+        for q in range(n_cases):
+            base = len(chunks)
+            chunks += [(f"rel{q}.md", f"相关 {q}"), (f"noise{q}a.md", f"噪声 {q}a"),
+                       (f"noise{q}b.md", f"噪声 {q}b"), (f"noise{q}c.md", f"噪声 {q}c")]
+            question = f"问题 {q}"
+            cases.append({"question": question, "relevant_docs": [f"rel{q}.md"]})
+            legs["vector"][question] = [(base + 1, 0.9), (base, 0.8), (base + 2, 0.1)]
+            legs["bm25"][question] = [(base + 3, 12.0), (base, 11.0), (base + 2, 1.0)]
+        recall_legs = {name: (lambda question, n, hits=hits: hits[question][:n]) for name, hits in legs.items()}
+        return chunks, cases, recall_legs
+
+    def test_rrf_without_rerank_matches_reranked(self):
+        from evaluation.rag_eval import benchmark_fusion, fusion_report
+
+        chunks, cases, recall_legs = self._setup()
+        oracle = lambda question, passages: [1.0 if p.startswith("相关") else 0.0 for p in passages]
+        rows = {r["config"]: r for r in benchmark_fusion(cases, chunks, recall_legs, rerank_fn=oracle, k=3)}
+        assert set(rows) == {"concat", "rrf", "weighted", "rrf+rerank", "weighted+rerank"}
+        assert rows["concat"]["mrr"] == pytest.approx(0.5)
+        assert rows["rrf"]["mrr"] == pytest.approx(1.0)
+        assert rows["rrf"]["mrr"] == pytest.approx(rows["rrf+rerank"]["mrr"])
+        assert rows["rrf"]["hit_rate"] == rows["rrf+rerank"]["hit_rate"] == 1.0
+        assert "rrf+rerank" in fusion_report(list(rows.values()))
+
+    def test_without_reranker(self):
+        from evaluation.rag_eval import benchmark_fusion
+
+        chunks, cases, recall_legs = self._setup(1)
+        rows = benchmark_fusion(cases, chunks, recall_legs, methods=("rrf",))
+        assert [r["config"] for r in rows] == ["rrf"]
@@ -0,0 +1,286 @@
+"""流式导入流水线单元测试"""
+
+import os
+import threading
+import time
+
+import pytest
+from types import SimpleNamespace
+
+from ingest import FileVersion, IngestManifest, IngestPipeline, directory_size, discover_files
+
+
+def _chunk(text: str):
+    return SimpleNamespace(page_content=text, metadata={"chunk_id": text})
+
+
+FILES = {
+    "a.md": ["a1", "a2", "a3"],
+    "b.md": ["b1", "b2"],
+    "c.md": ["c1", "a1"],  # a1 与 a.md 重复
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.embed_batches = []
+        self.written = []
+        self.write_threads = set()
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.embed_batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    def write(self, chunks, vectors):
+        self.write_threads.add(threading.get_ident())
+        assert len(chunks) == len(vectors)
+        self.written.extend(c.page_content for c in chunks)
+
+
+def _pipeline(recorder, **kwargs):
+    return IngestPipeline(
+        load_fn=lambda path: FILES[path],
+        split_fn=lambda docs: [_chunk(t) for t in docs],
+        embed_fn=recorder.embed,
+        write_fn=recorder.write,
+        key_fn=lambda c: c.metadata["chunk_id"],
+        **kwargs,
+    )
+
+
+def _load_with_pid(path):
+    """进程池加载函数（模块级，可被 pickle）：记录执行加载的进程号"""
+    return [f"{os.path.basename(path)}@{os.getpid()}"]
+
+
+class TestIngestPipeline:
+    def test_all_chunks_written_once(self):
+        rec = Recorder()
+        report = _pipeline(rec, batch_size=2).run(list(FILES))
+        assert sorted(rec.written) == ["a1", "a2", "a3", "b1", "b2", "c1"]
+        assert report.chunks == 6
+        assert report.duplicates == 1
+        assert report.files == 3
+
+    def test_batches_respect_batch_size(self):
+        rec = Recorder()
+        _pipeline(rec, batch_size=4).run(list(FILES))
+        assert all(len(b) <= 4 for b in rec.embed_batches)
+        assert sum(len(b) for b in rec.embed_batches) == 6
+
+    def test_writes_happen_on_caller_thread(self):
+        rec = Recorder()
+        _pipeline(rec, batch_size=1, embed_workers=3).run(list(FILES))
+        assert rec.write_threads == {threading.get_ident()}
+
+    def test_load_errors_are_collected(self):
+        rec = Recorder()
+        report = _pipeline(rec).run(["a.md", "missing.md"])
+        assert report.files == 1
+        assert report.errors[0][0] == "missing.md"
+        assert sorted(rec.written) == ["a1", "a2", "a3"]
+
+    def test_stage_stats(self):
+        rec = Recorder()
+        report = _pipeline(rec, batch_size=3).run(list(FILES))
+        assert report.stages["load"].items == 7
+        assert report.stages["split"].items == 7
+        assert report.stages["embed"].items == 6
+        assert report.stages["write"].items == 6
+        assert "导入 3 个文件" in report.summary()
+
+    def test_embed_error_propagates(self):
+        def boom(texts):
+            raise RuntimeError("model crashed")
+
+        pipeline = IngestPipeline(
+            load_fn=lambda path: FILES[path],
+            split_fn=lambda docs: [_chunk(t) for t in docs],
+            embed_fn=boom,
+            write_fn=lambda chunks, vectors: None,
+        )
+        with pytest.raises(RuntimeError, match="model crashed"):
+            pipeline.run(list(FILES))
+
+    def test_filter_fn_drops_unchanged_chunks(self):
+        rec = Recorder()
+        pipeline = _pipeline(rec, filter_fn=lambda path, chunks: [c for c in chunks if c.page_content != "a2"])
+        report = pipeline.run(["a.md"])
+        assert sorted(rec.written) == ["a1", "a3"]
+        assert report.unchanged_chunks == 1
+
+
+    def test_heavy_formats_load_in_process_pool(self):
+        rec = Recorder()
+        pipeline = IngestPipeline(
+            load_fn=_load_with_pid,
+            split_fn=lambda docs: [_chunk(t) for t in docs],
+            embed_fn=rec.embed,
+            write_fn=rec.write,
+            process_extensions=(".pdf",),
+            process_workers=1,
+        )
+        report = pipeline.run(["/x/a.pdf", "/x/b.md"])
+        assert report.files == 2
+        pids = {name.split("@")[0]: int(name.split("@")[1]) for name in rec.written}
+        assert pids["b.md"] == os.getpid()
+        assert pids["a.pdf"] != os.getpid()
+        assert pipeline._process_pool is None
+
+
+class TestDiscoverFiles:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        for rel in ["a.md", "b.PDF", "c.txt", "sub/d.docx", "sub/deeper/e.md", ".hidden/f.md"]:
+            path = tmp_path / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x", encoding="utf-8")
+        return tmp_path
+
+    def _names(self, paths, root):
+        return sorted(os.path.relpath(p, root) for p in paths)
+
+    def test_single_level(self, tree):
+        found = discover_files(str(tree), (".md", ".pdf"))
+        assert self._names(found, tree) == ["a.md", "b.PDF"]
+
+    def test_recursive_all_formats(self, tree):
+        found = discover_files(str(tree), (".md", ".pdf", ".docx"), recursive=True)
+        assert self._names(found, tree) == [
+            "a.md", "b.PDF", os.path.join("sub", "d.docx"), os.path.join("sub", "deeper", "e.md"),
+        ]
+        assert all(os.path.isabs(p) for p in found)
+
+
+class TestDirectorySize:
+    def test_counts_nested_files(self, tmp_path):
+        (tmp_path / "a.bin").write_bytes(b"x" * 10)
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "b.bin").write_bytes(b"x" * 5)
+        assert directory_size(str(tmp_path)) == 15
+
+    def test_missing_directory(self, tmp_path):
+        assert directory_size(str(tmp_path / "nope")) == 0
+
+
+class TestIngestManifest:
+    @pytest.fixture
+    def manifest(self, tmp_path):
+        return IngestManifest(str(tmp_path / "manifest.json"))
+
+    @pytest.fixture
+    def doc(self, tmp_path):
+        path = tmp_path / "docs" / "a.md"
+        path.parent.mkdir()
+        path.write_text("hello", encoding="utf-8")
+        return path
+
+    def test_new_file_is_changed(self, manifest, doc):
+        assert manifest.check(str(doc)) is not None
+
+    def test_unchanged_after_update(self, manifest, doc):
+        digest = manifest.check(str(doc))
+        manifest.update(str(doc), digest, ["c1"])
+        assert manifest.check(str(doc)) is None
+
+    def test_touch_without_content_change(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1"])
+        stat = doc.stat()
+        os.utime(doc, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000))
+        assert manifest.check(str(doc)) is None
+
+    def test_edit_during_ingest_not_skipped(self, manifest, doc):
+        version = manifest.check(str(doc))
+        # 哈希之后、提交之前文件被修改：清单保留 check() 时的 stat，下次仍会检测到变化
+        doc.write_text("hello again", encoding="utf-8")
+        manifest.update(str(doc), version, ["c1"])
+        assert manifest.check(str(doc)) is not None
+
+    def test_content_change_detected(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1"])
+        doc.write_text("hello world", encoding="utf-8")
+        assert manifest.check(str(doc)) is not None
+
+    def test_persistence(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1", "c2"])
+        manifest.save()
+        reloaded = IngestManifest(manifest.path)
+        assert reloaded.chunks(str(doc)) == ["c1", "c2"]
+        assert reloaded.check(str(doc)) is None
+
+    def test_missing_files(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1"])
+        assert manifest.missing_files(str(doc.parent), ".md") == []
+        doc.unlink()
+        assert manifest.missing_files(str(doc.parent), ".md") == [str(doc)]
+        assert manifest.missing_files(str(doc.parent), ".pdf") == []
+        assert manifest.missing_files(str(doc.parent), (".pdf", ".md")) == [str(doc)]
+        assert manifest.remove(str(doc)) == ["c1"]
+        assert str(doc) not in manifest
+
+    def test_select_by_path_and_time(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1", "c2"], ingested_at=100.0)
+        assert manifest.select(lambda path, ts: path.endswith(".md")) == {"c1", "c2"}
+        assert manifest.select(lambda path, ts: ts > 200) == set()
+
+    def test_selection_is_lazy_per_file(self, manifest, doc):
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1", "c2"])
+        selection = manifest.select(lambda path, ts: True)
+        assert len(selection) == 2 and "c1" in selection and "x" not in selection
+        doc.write_text("changed", encoding="utf-8")
+        manifest.update(str(doc), manifest.check(str(doc)), ["c2", "c3"])
+        # 已删除的旧块立即不再命中
+        assert "c1" not in selection and "c3" in selection
+
+    def test_select_concurrent_with_updates(self, manifest, tmp_path):
+        paths = []
+        for i in range(50):
+            path = tmp_path / f"f{i}.md"
+            path.write_text(str(i), encoding="utf-8")
+            paths.append(str(path))
+        errors, stop = [], threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    list(manifest.select(lambda path, ts: time.sleep(0) or True))
+                except RuntimeError as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for _ in range(20):
+            for i, path in enumerate(paths):
+                manifest.update(path, FileVersion("h", 0, 0), [f"c{i}"])
+            for path in paths:
+                manifest.remove(path)
+        stop.set()
+        thread.join()
+        assert errors == []
+
+    def test_match_source(self, manifest, doc, tmp_path):
+        other = tmp_path / "other" / "a.md"
+        other.parent.mkdir()
+        other.write_text("x", encoding="utf-8")
+        manifest.update(str(doc), manifest.check(str(doc)), ["c1"])
+        manifest.update(str(other), manifest.check(str(other)), ["c2"])
+        assert manifest.match_source(str(doc)) == [str(doc)]
+        assert manifest.match_source(str(doc.parent)) == [str(doc)]
+        assert sorted(manifest.match_source("a.md")) == sorted([str(doc), str(other)])
+        assert manifest.match_source(str(tmp_path / "doc")) == []  # 目录前缀不能误匹配 docs/
+
+    def test_missing_files_non_recursive(self, manifest, tmp_path):
+        nested = tmp_path / "docs" / "sub" / "b.md"
+        nested.parent.mkdir(parents=True)
+        nested.write_text("x", encoding="utf-8")
+        manifest.update(str(nested), manifest.check(str(nested)), ["c2"])
+        nested.unlink()
+        assert manifest.missing_files(str(tmp_path / "docs"), ".md", recursive=False) == []
+        assert manifest.missing_files(str(tmp_path / "docs"), ".md") == [str(nested)]
+
+    def test_corrupt_manifest_starts_empty(self, tmp_path):
+        path = tmp_path / "manifest.json"
+        path.write_text("{not json", encoding="utf-8")
+        assert IngestManifest(str(path)).files == {}
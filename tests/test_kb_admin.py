@@ -0,0 +1,128 @@
+"""知识库维护工具单元测试"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+import kb_admin
+from bm25_index import BM25Index
+from kb_admin import CHROMA_SQLITE, compact_chroma, orphan_segment_dirs, remove_dirs, vacuum_sqlite
+from vector_store import NumpyStore
+
+
+def _make_chroma_db(directory, segment_ids):
+    conn = sqlite3.connect(os.path.join(directory, CHROMA_SQLITE))
+    conn.execute("CREATE TABLE segments (id TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO segments VALUES (?)", [(s,) for s in segment_ids])
+    conn.commit()
+    conn.close()
+
+
+class TestVacuum:
+    def test_reclaims_deleted_pages(self, tmp_path):
+        path = str(tmp_path / "t.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE t (v BLOB)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(b"x" * 4096,) for _ in range(200)])
+        conn.commit()
+        conn.execute("DELETE FROM t")
+        conn.commit()
+        conn.close()
+        before = os.path.getsize(path)
+        assert vacuum_sqlite(path)
+        assert os.path.getsize(path) < before
+
+    def test_missing_file(self, tmp_path):
+        assert not vacuum_sqlite(str(tmp_path / "none.sqlite"))
+
+
+class TestOrphanSegments:
+    def test_only_unreferenced_uuid_dirs(self, tmp_path):
+        live, dead = str(uuid.uuid4()), str(uuid.uuid4())
+        _make_chroma_db(str(tmp_path), [live])
+        for name in (live, dead, "bm25"):
+            (tmp_path / name).mkdir()
+        (tmp_path / dead / "data_level0.bin").write_bytes(b"x" * 100)
+        orphans = orphan_segment_dirs(str(tmp_path))
+        assert orphans == [str(tmp_path / dead)]
+        assert remove_dirs(orphans) == 100
+        assert sorted(os.listdir(tmp_path)) == sorted([CHROMA_SQLITE, live, "bm25"])
+
+    def test_no_chroma_db(self, tmp_path):
+        (tmp_path / str(uuid.uuid4())).mkdir()
+        assert orphan_segment_dirs(str(tmp_path)) == []
+
+    def test_unreadable_schema_skips(self, tmp_path):
+        sqlite3.connect(str(tmp_path / CHROMA_SQLITE)).close()
+        (tmp_path / str(uuid.uuid4())).mkdir()
+        assert orphan_segment_dirs(str(tmp_path)) == []
+
+
+class TestOfflineCompact:
+    def test_compact_chroma(self, tmp_path):
+        live, dead = str(uuid.uuid4()), str(uuid.uuid4())
+        _make_chroma_db(str(tmp_path), [live])
+        (tmp_path / live).mkdir()
+        (tmp_path / dead).mkdir()
+        result = compact_chroma(str(tmp_path))
+        assert result == {"vacuumed": [CHROMA_SQLITE], "orphan_segments_removed": 1}
+        assert not (tmp_path / dead).exists()
+
+    def test_chroma_compacted_without_rag(self, tmp_path, monkeypatch):
+        events = []
+        monkeypatch.setattr(kb_admin, "compact_chroma", lambda db: events.append("chroma") or
+                            {"vacuumed": [CHROMA_SQLITE], "orphan_segments_removed": 2})
+        # 离线压缩不能构造 RAGSystem（会加载嵌入模型并打开 Chroma 客户端）
+        monkeypatch.setitem(sys.modules, "rag", None)
+        sqlite3.connect(str(tmp_path / "embedding_cache.sqlite")).close()
+        result = kb_admin._offline_compact(str(tmp_path))
+        assert events == ["chroma"]
+        assert result["vacuumed"] == [CHROMA_SQLITE, "embedding_cache.sqlite"]
+        assert result["orphan_segments_removed"] == 2
+
+    def test_in_process_store_and_bm25(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(kb_admin, "compact_chroma", lambda db: pytest.fail("numpy 存储不应压缩 Chroma"))
+        monkeypatch.setitem(sys.modules, "rag", None)
+        store = NumpyStore(str(tmp_path / "vectors"))
+        store.upsert(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["x", "y"], [{}, {}])
+        store.save()
+        index = BM25Index.open(str(tmp_path / "bm25"), tokenizer="whitespace")
+        index.add("a", "alpha beta")
+        index.add("b", "beta gamma")
+        index.close()
+        journal = tmp_path / "bm25" / "journal.jsonl"
+        assert journal.stat().st_size > 0
+
+        result = kb_admin._offline_compact(str(tmp_path), store="numpy")
+        assert result["orphan_segments_removed"] == 0
+        assert journal.stat().st_size == 0
+        # 按快照记录的分词器打开，没有丢弃索引
+        reopened = BM25Index.open(str(tmp_path / "bm25"), tokenizer="whitespace")
+        assert len(reopened) == 2
+        reopened.close()
+        assert NumpyStore(str(tmp_path / "vectors")).count() == 2
+
+
+class TestDeleteCompact:
+    def test_result_read_from_file(self, tmp_path, monkeypatch, capsys):
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            # stdout 中夹杂以 { 开头的日志行，结果只从 --result 文件读取
+            with open(cmd[cmd.index("--result") + 1], "w", encoding="utf-8") as f:
+                json.dump({"deleted": [{"source": "old.md", "chunks": 3}]}, f)
+            return subprocess.CompletedProcess(cmd, 0, stdout='{"log": 1}\n{\n  "noise": true\n}\n', stderr="")
+
+        monkeypatch.setattr(kb_admin.subprocess, "run", fake_run)
+        monkeypatch.setattr(kb_admin, "_offline_compact", lambda db, store, quantization: {"store": store})
+        assert kb_admin.main(["--db", str(tmp_path), "--store", "hnsw", "delete", "--compact", "old.md"]) == 0
+        result = json.loads(capsys.readouterr().out)
+        assert result == {"deleted": [{"source": "old.md", "chunks": 3}], "compact": {"store": "hnsw"}}
+        assert calls[0][calls[0].index("--store") + 1] == "hnsw"
+        assert not os.path.exists(calls[0][calls[0].index("--result") + 1])
@@ -0,0 +1,90 @@
+"""延迟预算单元测试（滑动平均 / 降级顺序 / 重排序候选数）"""
+
+from latency_budget import LatencyModel, plan_pipeline, rerank_fit
+
+
+def _model(**estimates):
+    return LatencyModel(defaults={"vector": 40.0, "bm25": 10.0, "rerank_per_candidate": 8.0,
+                                  "overhead": 2.0, **estimates})
+
+
+class TestLatencyModel:
+    def test_defaults_until_observed(self):
+        model = _model()
+        assert model.estimate("vector") == 40.0
+        model.observe("vector", 100.0)
+        assert model.estimate("vector") == 100.0
+
+    def test_ewma(self):
+        model = LatencyModel(alpha=0.5)
+        model.observe("bm25", 10.0)
+        model.observe("bm25", 30.0)
+        assert model.estimate("bm25") == 20.0
+        assert model.snapshot()["bm25"] == 20.0
+
+    def test_estimate_decays_toward_prior(self, monkeypatch):
+        import latency_budget
+        now = [100.0]
+        monkeypatch.setattr(latency_budget.time, "monotonic", lambda: now[0])
+        model = LatencyModel(half_life_s=10, defaults={"rerank_per_candidate": 8.0})
+        model.observe("rerank_per_candidate", 108.0)
+        assert model.estimate("rerank_per_candidate") == 108.0
+        now[0] += 10
+        assert model.estimate("rerank_per_candidate") == 58.0
+        now[0] += 90
+        assert model.estimate("rerank_per_candidate") < 8.2
+
+    def test_skipped_stage_recovers(self, monkeypatch):
+        import latency_budget
+        now = [0.0]
+        monkeypatch.setattr(latency_budget.time, "monotonic", lambda: now[0])
+        model = _model()
+        model.observe("rerank_per_candidate", 200.0)
+        assert plan_pipeline(100, model, ("vector", "bm25"), k=3, rerank_top_n=6).rerank_n == 0
+        now[0] += 600
+        plan = plan_pipeline(100, model, ("vector", "bm25"), k=3, rerank_top_n=6)
+        assert plan.rerank_n == 6 and plan.degraded == []
+
+    def test_unknown_stage(self):
+        assert _model().estimate("sparse") == 0.0
+
+
+class TestPlanPipeline:
+    LEGS = ("vector", "bm25")
+
+    def test_no_budget_runs_full_pipeline(self):
+        plan = plan_pipeline(None, _model(), self.LEGS, k=3, rerank_top_n=6)
+        assert plan.legs == self.LEGS and plan.depth == 6 and plan.rerank_n == 6
+        assert plan.degraded == []
+
+    def test_generous_budget(self):
+        plan = plan_pipeline(500, _model(), self.LEGS, k=3, rerank_top_n=6)
+        assert plan.degraded == [] and plan.estimate_ms == 40 + 48 + 2
+
+    def test_shrinks_rerank_pool_first(self):
+        # 40 + 2 + 5×8 = 82
+        plan = plan_pipeline(85, _model(), self.LEGS, k=3, rerank_top_n=6)
+        assert plan.rerank_n == 5
+        assert plan.degraded == ["rerank_pool:6->5"]
+        assert plan.legs == self.LEGS
+
+    def test_skips_rerank_when_pool_below_k(self):
+        plan = plan_pipeline(50, _model(), self.LEGS, k=3, rerank_top_n=6)
+        assert plan.rerank_n == 0
+        assert plan.degraded == ["skip_rerank"]
+        assert plan.estimate_ms == 42
+
+    def test_vector_only_as_last_resort(self):
+        plan = plan_pipeline(20, _model(), self.LEGS, k=3, rerank_top_n=6)
+        assert plan.degraded == ["skip_rerank", "vector_only"]
+        assert plan.legs == ("vector",) and plan.depth == 3
+
+    def test_without_rerank(self):
+        plan = plan_pipeline(20, _model(), self.LEGS, k=3, rerank_top_n=6, use_rerank=False)
+        assert plan.rerank_n == 0
+        assert plan.degraded == ["vector_only"]
+
+    def test_rerank_fit(self):
+        model = _model()
+        assert rerank_fit(model, 26) == 3
+        assert rerank_fit(model, 1) == 0
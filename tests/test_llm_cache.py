@@ -0,0 +1,141 @@
+"""LLM 响应缓存单元测试（键 / 两级缓存 / 按 namespace 统计 / 评测打分接入）"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from llm_cache import LLMCache, cached_invoke, llm_identity
+
+
+def _llm(output="4", model="qwen2.5:7b", temperature=0):
+    llm = MagicMock()
+    llm.model = model
+    llm.temperature = temperature
+    llm.invoke.return_value = SimpleNamespace(content=output)
+    return llm
+
+
+class TestLLMIdentity:
+    def test_model_and_params(self):
+        model, params = llm_identity(SimpleNamespace(model_name="gpt-4o-mini", temperature=0, max_tokens=16))
+        assert model == "SimpleNamespace:gpt-4o-mini"
+        assert params == {"temperature": 0, "max_tokens": 16}
+
+    def test_non_scalar_attributes_ignored(self):
+        model, params = llm_identity(_llm())
+        assert model == "MagicMock:qwen2.5:7b"
+        assert set(params) == {"temperature"}
+
+
+class TestLLMCache:
+    def test_key_depends_on_model_params_and_prompt(self):
+        base = LLMCache.key("m", "p", {"temperature": 0})
+        assert base == LLMCache.key("m", "p", {"temperature": 0})
+        assert base != LLMCache.key("m2", "p", {"temperature": 0})
+        assert base != LLMCache.key("m", "p", {"temperature": 0.7})
+        assert base != LLMCache.key("m", "p2", {"temperature": 0})
+
+    def test_memory_only(self):
+        cache = LLMCache()
+        assert cache.get("k") is None
+        cache.set("k", "v")
+        assert cache.get("k") == "v"
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+    def test_disk_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "llm_cache.sqlite")
+        first = LLMCache(path)
+        first.set("k", "完成")
+        first.close()
+        second = LLMCache(path)
+        assert second.get("k", "judge") == "完成"
+        assert second.stats()["namespaces"]["judge"]["disk_hits"] == 1
+        assert second.get("k", "judge") == "完成"
+        assert second.stats()["namespaces"]["judge"]["memory_hits"] == 1
+
+    def test_prune_by_age_and_size(self, tmp_path, monkeypatch):
+        import llm_cache
+        now = [1000.0]
+        monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+        path = str(tmp_path / "llm_cache.sqlite")
+        cache = LLMCache(path, max_entries=2, max_age=100)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+            now[0] += 10
+        assert cache.prune() == 1
+        now[0] += 85
+        assert cache.prune() == 1
+        cache.close()
+        reopened = LLMCache(path, max_entries=2, max_age=100)
+        assert reopened.get("b") is None and reopened.get("c") == "c"
+
+    def test_expired_entry_not_served(self, tmp_path, monkeypatch):
+        import llm_cache
+        now = [1000.0]
+        monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+        path = str(tmp_path / "llm_cache.sqlite")
+        LLMCache(path, max_age=100).set("k", "v")
+        now[0] += 200
+        assert LLMCache(path, max_age=100).get("k") is None
+
+    def test_clear(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+        cache.set("k", "v")
+        cache.clear()
+        assert cache.get("k") is None
+
+
+class TestCachedInvoke:
+    def test_without_cache_calls_llm(self):
+        llm = _llm()
+        assert cached_invoke(None, llm, "p") == "4"
+        assert cached_invoke(None, llm, "p") == "4"
+        assert llm.invoke.call_count == 2
+
+    def test_repeat_hits_cache(self):
+        cache, llm = LLMCache(), _llm()
+        assert cached_invoke(cache, llm, "p", "judge") == "4"
+        assert cached_invoke(cache, llm, "p", "judge") == "4"
+        llm.invoke.assert_called_once_with("p")
+        assert cache.stats()["namespaces"]["judge"]["hit_rate"] == 0.5
+
+    def test_different_temperature_not_shared(self):
+        cache = LLMCache()
+        cached_invoke(cache, _llm(temperature=0), "p")
+        hot = _llm(output="5", temperature=0.7)
+        assert cached_invoke(cache, hot, "p") == "5"
+        hot.invoke.assert_called_once()
+
+    def test_nonzero_temperature_bypasses_cache(self):
+        cache, llm = LLMCache(), _llm(temperature=0.3)
+        for _ in range(2):
+            assert cached_invoke(cache, llm, "p", "router") == "4"
+        assert llm.invoke.call_count == 2
+        assert len(cache.memory) == 0 and cache.stats()["namespaces"] == {}
+
+    def test_invalid_output_not_cached(self):
+        cache, llm = LLMCache(), _llm(output="无法判断")
+        for _ in range(2):
+            cached_invoke(cache, llm, "p", validate=lambda text: text.isdigit())
+        assert llm.invoke.call_count == 2
+
+    def test_custom_call(self):
+        cache, llm = LLMCache(), _llm()
+        call = MagicMock(return_value="TOOL")
+        assert cached_invoke(cache, llm, "p", call=call) == "TOOL"
+        assert cached_invoke(cache, llm, "p", call=call) == "TOOL"
+        call.assert_called_once()
+        llm.invoke.assert_not_called()
+
+
+class TestJudgeCache:
+    def test_repeated_eval_reuses_scores(self):
+        from evaluation.rag_eval import RAGEvaluator
+
+        llm = _llm(output="评分：4")
+        evaluator = RAGEvaluator(rag_system=None, llm=llm, llm_cache=LLMCache())
+        for _ in range(2):
+            assert evaluator._evaluate_faithfulness("问题", "回答", "上下文") == 4.0
+            assert evaluator._evaluate_relevance("问题", "回答") == 4.0
+        assert llm.invoke.call_count == 2
+        assert evaluator.llm_cache.stats()["namespaces"]["judge"]["hit_rate"] == 0.5
@@ -0,0 +1,64 @@
+"""hybrid_search 检索结果缓存单元测试"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+
+
+@pytest.fixture
+def rag_system(tmp_path):
+    """构造一个不依赖真实 embedding / Chroma 的 RAGSystem，底层检索用 MagicMock 计数"""
+    with patch("rag.HuggingFaceEmbeddings"), \
+         patch("rag.Chroma"), \
+         patch("rag.CrossEncoder"):
+        from rag import RAGSystem
+        system = RAGSystem(persist_directory=str(tmp_path / "test_db"), enable_reranker=False)
+        system._hybrid_search = MagicMock(
+            return_value=[SimpleNamespace(page_content="Aura 是一个 AI 助手", metadata={})]
+        )
+        return system
+
+
+class TestNormalizeQuery:
+    def test_case_whitespace_and_punctuation(self):
+        from rag import normalize_query
+        assert normalize_query("  什么是  Aura？ ") == normalize_query("什么是 aura")
+
+    def test_fullwidth_characters(self):
+        from rag import normalize_query
+        assert normalize_query("ＡＵＲＡ") == "aura"
+
+
+class TestQueryCache:
+    def test_repeated_query_hits_cache(self, rag_system):
+        first = rag_system.hybrid_search("什么是 Aura?", k=3)
+        second = rag_system.hybrid_search("什么是 aura", k=3)
+        assert first == second
+        assert rag_system._hybrid_search.call_count == 1
+        stats = rag_system.cache_stats()["query_cache"]
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_key_includes_k_and_rerank(self, rag_system):
+        rag_system.hybrid_search("Aura", k=3)
+        rag_system.hybrid_search("Aura", k=5)
+        rag_system.hybrid_search("Aura", k=3, use_rerank=False)
+        assert rag_system._hybrid_search.call_count == 3
+
+    def test_write_invalidates(self, rag_system):
+        rag_system.hybrid_search("Aura", k=3)
+        version = rag_system.collection_version
+        rag_system._write_chunks([], [])
+        assert rag_system.collection_version == version + 1
+        rag_system.hybrid_search("Aura", k=3)
+        assert rag_system._hybrid_search.call_count == 2
+
+    def test_delete_invalidates(self, rag_system):
+        rag_system.hybrid_search("Aura", k=3)
+        rag_system._delete_chunks(["missing"])
+        rag_system.hybrid_search("Aura", k=3)
+        assert rag_system._hybrid_search.call_count == 2
+
+    def test_caller_mutation_does_not_leak(self, rag_system):
+        rag_system.hybrid_search("Aura", k=3).clear()
+        assert len(rag_system.hybrid_search("Aura", k=3)) == 1
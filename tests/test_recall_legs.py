@@ -0,0 +1,202 @@
+"""hybrid_search 多路并发召回单元测试（并发 / 单路超时降级 / 出错降级 / trace 记录）"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+
+from ingest import FileVersion
+
+
+def _doc(chunk_id):
+    return SimpleNamespace(page_content=chunk_id, metadata={"chunk_id": chunk_id})
+
+
+def _slow(seconds, hits):
+    def leg(query, k, filters=None):
+        time.sleep(seconds)
+        return hits
+    return leg
+
+
+@pytest.fixture
+def rag_system(tmp_path):
+    with patch("rag.HuggingFaceEmbeddings"), \
+         patch("rag.Chroma"), \
+         patch("rag.CrossEncoder"):
+        from rag import RAGSystem
+        system = RAGSystem(persist_directory=str(tmp_path / "test_db"), enable_reranker=False)
+    system._vector_recall = MagicMock(side_effect=_slow(0.1, [(_doc("v1"), -0.1)]))
+    system._bm25_recall = MagicMock(side_effect=_slow(0.1, [(_doc("b1"), 3.0)]))
+    yield system
+    system.recall_executor.shutdown(wait=True)
+    system.search_executor.shutdown(wait=True)
+
+
+def _ids(docs):
+    return {doc.metadata["chunk_id"] for doc in docs}
+
+
+class TestParallelRecall:
+    def test_legs_run_concurrently(self, rag_system):
+        start = time.perf_counter()
+        results = rag_system.hybrid_search("Aura", k=2, use_rerank=False)
+        assert time.perf_counter() - start < 0.18
+        assert _ids(results) == {"v1", "b1"}
+
+    def test_slow_leg_times_out(self, rag_system):
+        rag_system.recall_timeout = {"vector": 0.05, "bm25": None}
+        start = time.perf_counter()
+        results = rag_system.hybrid_search("Aura", k=2, use_rerank=False)
+        elapsed = time.perf_counter() - start
+        assert _ids(results) == {"b1"}
+        assert elapsed < 0.15
+        assert rag_system.cache_stats()["recall"]["vector"]["timeouts"] == 1
+
+    def test_failing_leg_degrades(self, rag_system):
+        rag_system._bm25_recall.side_effect = RuntimeError("index corrupt")
+        results = rag_system.hybrid_search("Aura", k=2, use_rerank=False)
+        assert _ids(results) == {"v1"}
+        assert rag_system.cache_stats()["recall"]["bm25"]["errors"] == 1
+
+    def test_async_leg_timeout(self, rag_system):
+        import asyncio
+        rag_system.recall_timeout = {"bm25": 0.05}
+        results = asyncio.run(rag_system.ahybrid_search("Aura", k=2, use_rerank=False))
+        assert _ids(results) == {"v1"}
+        assert rag_system.cache_stats()["recall"]["bm25"]["timeouts"] == 1
+
+
+class TestRecallTrace:
+    def test_leg_timings_recorded(self, rag_system, tmp_path, monkeypatch):
+        import tracing
+        monkeypatch.setattr(tracing, "TRACE_DIR", tmp_path)
+        tracer = tracing.Tracer()
+        trace = tracer.start_trace("Aura")
+        rag_system.hybrid_search("Aura", k=2, use_rerank=False)
+        tracer.end_trace(trace, "ok")
+        recall = {e["data"]["leg"]: e["data"] for e in trace["events"] if e["type"] == "recall"}
+        assert set(recall) == {"vector", "bm25"}
+        assert all(entry["status"] == "ok" and entry["ms"] >= 90 for entry in recall.values())
+        assert recall["vector"]["hits"] == 1
+
+    def test_async_path_keeps_trace_context(self, rag_system, tmp_path, monkeypatch):
+        import asyncio
+        import tracing
+        monkeypatch.setattr(tracing, "TRACE_DIR", tmp_path)
+        tracer = tracing.Tracer()
+        rag_system._vector_recall.side_effect = lambda *a: tracing.trace_event("in_leg") or []
+
+        async def traced():
+            trace = tracer.start_trace("Aura")
+            await rag_system.asearch_with_budget("Aura", 1000, k=2, use_rerank=False)
+            tracer.end_trace(trace, "ok")
+            return trace
+
+        trace = asyncio.run(traced())
+        types = [e["type"] for e in trace["events"]]
+        assert "in_leg" in types and "retrieval_budget" in types
+
+
+class TestLatencyBudget:
+    def test_generous_budget_runs_everything(self, rag_system):
+        results, report = rag_system.search_with_budget("Aura", 1000, k=2, use_rerank=False)
+        assert _ids(results) == {"v1", "b1"}
+        assert report["degraded"] == [] and report["met"]
+        assert report["stages"] == ["vector", "bm25", "fuse"]
+        # 未降级的结果写入缓存，第二次直接命中
+        _, again = rag_system.search_with_budget("Aura", 1000, k=2, use_rerank=False)
+        assert again["stages"] == ["cache"]
+
+    def test_tight_budget_goes_vector_only(self, rag_system):
+        rag_system._vector_recall.side_effect = _slow(0.01, [(_doc("v1"), -0.1)])
+        results, report = rag_system.search_with_budget("Aura", 30, k=2, use_rerank=False)
+        assert report["degraded"] == ["vector_only"]
+        assert _ids(results) == {"v1"}
+        rag_system._bm25_recall.assert_not_called()
+        assert rag_system.query_cache.stats()["size"] == 0
+
+    def test_deadline_caps_leg_timeouts(self, rag_system):
+        start = time.perf_counter()
+        results, report = rag_system.search_with_budget("Aura", 50, k=2, use_rerank=False)
+        assert time.perf_counter() - start < 0.09
+        assert results == []
+        assert report["legs"] == {"vector": "timeout", "bm25": "timeout"}
+        assert {"vector_timeout", "bm25_timeout"} <= set(report["degraded"])
+
+    def test_rerank_skipped_when_recall_eats_budget(self, rag_system):
+        rag_system.rerank_batcher = MagicMock()
+        results, report = rag_system.search_with_budget("Aura", 115, k=2)
+        assert "skip_rerank" in report["degraded"]
+        assert "rerank" not in report["stages"]
+        rag_system.rerank_batcher.rerank.assert_not_called()
+        assert _ids(results) == {"v1", "b1"}
+
+    def test_hybrid_search_budget_and_stats(self, rag_system, tmp_path, monkeypatch):
+        import tracing
+        monkeypatch.setattr(tracing, "TRACE_DIR", tmp_path)
+        tracer = tracing.Tracer()
+        trace = tracer.start_trace("Aura")
+        results = rag_system.hybrid_search("Aura", k=2, use_rerank=False, budget_ms=1000)
+        tracer.end_trace(trace, "ok")
+        assert _ids(results) == {"v1", "b1"}
+        budget_events = [e["data"] for e in trace["events"] if e["type"] == "retrieval_budget"]
+        assert len(budget_events) == 1 and budget_events[0]["budget_ms"] == 1000
+        stats = rag_system.cache_stats()
+        assert stats["budget"]["searches"] == 1
+        assert stats["latency_model"]["vector"] >= 90
+
+    def test_async_budget(self, rag_system):
+        import asyncio
+        results, report = asyncio.run(rag_system.asearch_with_budget("Aura", 50, k=2, use_rerank=False))
+        assert results == []
+        assert report["legs"] == {"vector": "timeout", "bm25": "timeout"}
+
+
+class TestWarmup:
+    def test_warmup_bypasses_embedding_cache(self, rag_system):
+        from embedding_cache import CachedEmbeddings
+        model = MagicMock()
+        model.embed_query.return_value = [0.1, 0.2]
+        rag_system.embeddings = CachedEmbeddings(model, "m", ":memory:")
+        rag_system.embeddings.embed_query("预热")
+        model.embed_query.reset_mock()
+        rag_system.warmup()
+        model.embed_query.assert_called_once_with("预热")
+
+
+class TestIncrementalIngest:
+    def _changed_file(self, rag_system, tmp_path):
+        path = tmp_path / "a.md"
+        path.write_text("old", encoding="utf-8")
+        rag_system.manifest.update(str(path), FileVersion("old-digest", 0, 0), ["old1", "keep"])
+        rag_system.manifest.save()
+        path.write_text("new content", encoding="utf-8")
+        rag_system.store = MagicMock()
+        rag_system.embeddings = MagicMock()
+        rag_system.embeddings.embed_documents.side_effect = lambda texts: [[0.0] for _ in texts]
+        rag_system._split_documents = lambda docs: [
+            SimpleNamespace(page_content=cid, metadata={"chunk_id": cid}) for cid in ("keep", "new1")
+        ]
+        return path
+
+    def test_failed_write_keeps_old_chunks_and_manifest(self, rag_system, tmp_path):
+        path = self._changed_file(rag_system, tmp_path)
+        rag_system.store.upsert.side_effect = RuntimeError("disk full")
+        with patch("rag.load_file", return_value=["doc"]), pytest.raises(RuntimeError):
+            rag_system.add_documents(str(tmp_path), process_workers=0)
+        rag_system.store.delete.assert_not_called()
+        assert rag_system.manifest.chunks(str(path)) == ["old1", "keep"]
+        assert rag_system.manifest.check(str(path)) is not None
+
+    def test_stale_chunks_removed_after_write(self, rag_system, tmp_path):
+        path = self._changed_file(rag_system, tmp_path)
+        order = []
+        rag_system.store.upsert.side_effect = lambda ids, *a: order.append(("upsert", ids))
+        rag_system.store.delete.side_effect = lambda ids: order.append(("delete", ids))
+        with patch("rag.load_file", return_value=["doc"]):
+            rag_system.add_documents(str(tmp_path), process_workers=0)
+        assert order == [("upsert", ["new1"]), ("delete", ["old1"])]
+        assert rag_system.manifest.chunks(str(path)) == ["keep", "new1"]
+        assert rag_system.manifest.check(str(path)) is None
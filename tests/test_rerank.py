@@ -0,0 +1,124 @@
+"""重排序微批 / 分数缓存 / 截断单元测试"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from rerank import RerankBatcher, percentile, truncate_passage
+
+
+def _doc(chunk_id: str, content: str | None = None):
+    return SimpleNamespace(page_content=content or chunk_id, metadata={"chunk_id": chunk_id})
+
+
+class FakeCrossEncoder:
+    """分数 = 正文长度；记录每次 predict 的 pair 数"""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def predict(self, pairs):
+        if self.delay:
+            threading.Event().wait(self.delay)
+        with self._lock:
+            self.calls.append([list(p) for p in pairs])
+        return [float(len(passage)) for _, passage in pairs]
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([5.0], 99) == 5.0
+        assert percentile([], 50) == 0.0
+
+
+class TestTruncatePassage:
+    def test_char_fallback(self):
+        assert truncate_passage("一二三四五", 3) == "一二三"
+        assert truncate_passage("短", 3) == "短"
+        assert truncate_passage("不截断", None) == "不截断"
+
+    def test_word_fallback_for_non_cjk(self):
+        text = " ".join(f"word{i}" for i in range(100))
+        assert truncate_passage(text, 60) == " ".join(f"word{i}" for i in range(60))
+        assert truncate_passage("Aura 支持 hybrid search", 3) == "Aura 支持"
+        assert truncate_passage("alpha beta", 5) == "alpha beta"
+
+    def test_uses_tokenizer_offsets(self):
+        def tokenizer(text, **kwargs):
+            # 按空格切词的假 tokenizer
+            offsets, pos = [], 0
+            for word in text.split(" "):
+                offsets.append((pos, pos + len(word)))
+                pos += len(word) + 1
+            return {"offset_mapping": offsets[:kwargs["max_length"]]}
+
+        assert truncate_passage("alpha beta gamma delta", 2, tokenizer) == "alpha beta"
+
+
+class TestRerankBatcher:
+    def test_scores_in_input_order(self):
+        batcher = RerankBatcher(FakeCrossEncoder(), max_tokens=None)
+        docs = [_doc("a", "xx"), _doc("b", "xxxx"), _doc("c", "x")]
+        assert batcher.score("q", docs) == [2.0, 4.0, 1.0]
+        assert [d.metadata["chunk_id"] for d in batcher.rerank("q", docs, k=2)] == ["b", "a"]
+
+    def test_score_cache(self):
+        model = FakeCrossEncoder()
+        batcher = RerankBatcher(model, max_tokens=None)
+        docs = [_doc("a"), _doc("b")]
+        batcher.score("q", docs)
+        batcher.score("q", docs + [_doc("c")])
+        assert [len(call) for call in model.calls] == [2, 1]
+        # 缓存键包含 query
+        batcher.score("other", docs)
+        assert len(model.calls) == 3
+        assert batcher.stats()["cache"]["hits"] == 2
+
+    def test_truncates_before_predict(self):
+        model = FakeCrossEncoder()
+        batcher = RerankBatcher(model, max_tokens=4)
+        batcher.score("q", [_doc("a", "一二三四五六七八")])
+        assert model.calls[0][0][1] == "一二三四"
+
+    def test_concurrent_requests_are_batched(self):
+        model = FakeCrossEncoder(delay=0.05)
+        batcher = RerankBatcher(model, max_wait_ms=20, max_tokens=None)
+        requests = [(f"q{i}", [_doc(f"d{i}-{j}") for j in range(3)]) for i in range(8)]
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda r: batcher.score(*r), requests))
+        assert len(model.calls) < len(requests)
+        assert sum(len(call) for call in model.calls) == 24
+        for (_, docs), scores in zip(requests, results):
+            assert scores == [float(len(d.page_content)) for d in docs]
+
+    def test_max_batch_size(self):
+        model = FakeCrossEncoder(delay=0.05)
+        batcher = RerankBatcher(model, max_batch_size=4, max_wait_ms=20, max_tokens=None)
+        requests = [(f"q{i}", [_doc(f"d{i}-{j}") for j in range(2)]) for i in range(6)]
+        with ThreadPoolExecutor(6) as pool:
+            list(pool.map(lambda r: batcher.score(*r), requests))
+        assert all(len(call) <= 4 for call in model.calls)
+
+    def test_predict_error_propagates(self):
+        class Broken:
+            def predict(self, pairs):
+                raise RuntimeError("model crashed")
+
+        batcher = RerankBatcher(Broken())
+        with pytest.raises(RuntimeError, match="model crashed"):
+            batcher.score("q", [_doc("a")])
+
+    def test_latency_stats(self):
+        batcher = RerankBatcher(FakeCrossEncoder())
+        for i in range(5):
+            batcher.score(f"q{i}", [_doc("a")])
+        stats = batcher.stats()
+        assert stats["batches"] == 5
+        assert stats["p99_ms"] >= stats["p50_ms"] > 0
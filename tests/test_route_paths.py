@@ -0,0 +1,235 @@
+"""按路由的快速路径单元测试（DIRECT 单次调用 / RETRIEVE 检索 + 生成 / 无结果回退 ReAct / token 统计 / 会话隔离）"""
+
+import threading
+import time
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    import tracing
+    from aura_react import AuraReActAgent, TokenUsageHandler
+    from sessions import SessionPool
+    monkeypatch.setattr(tracing, "TRACE_DIR", tmp_path)
+    agent = AuraReActAgent.__new__(AuraReActAgent)
+    agent.tracer = tracing.Tracer()
+    agent.usage_handler = TokenUsageHandler()
+    agent.search_budget_ms = None
+    agent.llm = MagicMock(return_value="答案 [1]")
+    agent.long_term_memory = MagicMock()
+    agent.rag_system = MagicMock()
+    agent.rag_system.hybrid_search_with_sources.return_value = [
+        {"index": 1, "content": "半线天竺鲷体长可达12公分", "source": "doc_000.md"},
+    ]
+    agent.sessions = SessionPool(_mock_session)
+    agent.default_session = _mock_session("default")
+    return agent
+
+
+def _mock_session(session_id):
+    from aura_react import AgentSession
+    memory = MagicMock()
+    memory.load_memory_variables.return_value = {"chat_history": ""}
+    executor = MagicMock()
+    executor.invoke.return_value = {"output": "ReAct 回答", "intermediate_steps": []}
+    return AgentSession(session_id, memory, executor)
+
+
+def _route(agent, route):
+    agent.router = MagicMock(spec=["route"])
+    agent.router.route.return_value = route
+
+
+class TestRoutePaths:
+    def test_direct_single_llm_call(self, agent):
+        _route(agent, "DIRECT")
+        info = agent.process_query_with_info("1加1等于几？")
+        assert info["response"] == "答案 [1]"
+        assert info["tools_used"] == []
+        assert agent.llm.call_count == 1
+        agent.agent_executor.invoke.assert_not_called()
+        agent.rag_system.hybrid_search_with_sources.assert_not_called()
+
+    def test_retrieve_grounded_generation(self, agent):
+        _route(agent, "RETRIEVE")
+        info = agent.process_query_with_info("半线天竺鲷的体长可达多少公分？")
+        assert info["tools_used"] == ["search_knowledge"]
+        assert "12公分" in info["tool_outputs"][0]
+        prompt = agent.llm.call_args[0][0]
+        prompt = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        assert "12公分" in prompt and "doc_000.md" in prompt
+        agent.agent_executor.invoke.assert_not_called()
+        agent.conversation_memory.save_context.assert_called_once()
+
+    def test_retrieve_without_hits_falls_back_to_react(self, agent):
+        _route(agent, "RETRIEVE")
+        agent.rag_system.hybrid_search_with_sources.return_value = []
+        assert agent.process_query("知识库里没有的问题") == "ReAct 回答"
+        agent.agent_executor.invoke.assert_called_once()
+
+    def test_tool_runs_react(self, agent):
+        _route(agent, "TOOL")
+        assert agent.process_query("今天北京天气怎么样") == "ReAct 回答"
+        agent.llm.assert_not_called()
+
+
+class TestLLMUsage:
+    def _result(self, llm_output=None, generation_info=None, usage_metadata=None):
+        message = SimpleNamespace(usage_metadata=usage_metadata) if usage_metadata else None
+        gen = SimpleNamespace(generation_info=generation_info, message=message)
+        return SimpleNamespace(llm_output=llm_output, generations=[[gen]])
+
+    def test_openai_token_usage(self):
+        from aura_react import llm_usage
+        result = self._result(llm_output={"token_usage": {"prompt_tokens": 10, "completion_tokens": 3}})
+        assert llm_usage(result) == (10, 3)
+
+    def test_chat_usage_metadata(self):
+        from aura_react import llm_usage
+        result = self._result(usage_metadata={"input_tokens": 7, "output_tokens": 2})
+        assert llm_usage(result) == (7, 2)
+
+    def test_ollama_generation_info(self):
+        from aura_react import llm_usage
+        result = self._result(generation_info={"prompt_eval_count": 50, "eval_count": 20})
+        assert llm_usage(result) == (50, 20)
+
+    def test_missing_usage(self):
+        from aura_react import llm_usage
+        assert llm_usage(self._result()) == (None, None)
+
+
+def _collect(agent, query):
+    import asyncio
+
+    async def run():
+        return [event async for event in agent.astream_query(query)]
+    return asyncio.run(run())
+
+
+class TestFinalAnswerFilter:
+    def test_only_final_answer_passes(self):
+        from aura_react import FinalAnswerFilter
+        f = FinalAnswerFilter()
+        emitted = [f.feed(t) for t in ["Thought: 我知道了\nFinal ", "Answer: 12", "公分"]]
+        assert "".join(emitted) == "12公分"
+
+    def test_reset_between_llm_calls(self):
+        from aura_react import FinalAnswerFilter
+        f = FinalAnswerFilter()
+        f.feed("Final Answer: 第一次")
+        f.reset()
+        assert f.feed("Action: search_web") == ""
+
+
+class TestStreaming:
+    def test_direct_stream(self, agent):
+        _route(agent, "DIRECT")
+        events = _collect(agent, "1加1等于几？")
+        kinds = [e["event"] for e in events]
+        assert kinds[0] == "route" and kinds[-1] == "done"
+        assert "".join(e["data"]["text"] for e in events if e["event"] == "token") == "答案 [1]"
+        assert events[-1]["data"]["tools_used"] == []
+
+    def test_retrieve_stream_emits_tool_events(self, agent):
+        _route(agent, "RETRIEVE")
+        events = _collect(agent, "半线天竺鲷的体长可达多少公分？")
+        kinds = [e["event"] for e in events]
+        assert kinds[:3] == ["route", "tool_start", "tool_end"]
+        assert "12公分" in events[2]["data"]["output"]
+        assert events[-1]["data"]["tools_used"] == ["search_knowledge"]
+
+    def test_react_stream_filters_thoughts(self, agent):
+        _route(agent, "TOOL")
+        chunk = lambda text: {"event": "on_llm_stream", "data": {"chunk": SimpleNamespace(text=text)}}
+
+        async def fake_events(*args, **kwargs):
+            yield {"event": "on_llm_start", "data": {}}
+            yield chunk("Thought: 查天气\nAction: search_web")
+            yield {"event": "on_tool_start", "name": "search_web", "data": {"input": "北京天气"}}
+            yield {"event": "on_tool_end", "name": "search_web", "data": {"output": "晴"}}
+            yield {"event": "on_llm_start", "data": {}}
+            yield chunk("Thought: 我知道了\nFinal Answer: 今天")
+            yield chunk("晴")
+            yield {"event": "on_chain_end", "parent_ids": [], "data": {"output": {"output": "今天晴"}}}
+
+        agent.agent_executor.astream_events = fake_events
+        events = _collect(agent, "今天北京天气怎么样")
+        tokens = "".join(e["data"]["text"] for e in events if e["event"] == "token")
+        assert tokens == "今天晴"
+        assert [e["event"] for e in events].count("tool_end") == 1
+        assert events[-1]["data"]["response"] == "今天晴"
+        assert events[-1]["data"]["tools_used"] == ["search_web"]
+
+    def test_error_event(self, agent):
+        _route(agent, "DIRECT")
+        agent.conversation_memory.load_memory_variables.side_effect = RuntimeError("boom")
+        events = _collect(agent, "你好")
+        assert events[-1] == {"event": "error", "data": {"error": "boom"}}
+
+
+class TestSessions:
+    def test_sessions_have_separate_memory(self, agent):
+        _route(agent, "DIRECT")
+        agent.process_query("我叫小明", session_id="a")
+        agent.process_query("你好", session_id="b")
+        agent.session("a").conversation_memory.save_context.assert_called_once()
+        agent.session("b").conversation_memory.save_context.assert_called_once()
+        agent.conversation_memory.save_context.assert_not_called()
+        assert agent.sessions.stats()["created"] == 2
+
+    def test_last_tools_used_per_session(self, agent):
+        _route(agent, "RETRIEVE")
+        agent.process_query("半线天竺鲷的体长可达多少公分？", session_id="a")
+        _route(agent, "DIRECT")
+        agent.process_query("你好", session_id="b")
+        assert agent.get_last_tools_used("a") == ["search_knowledge"]
+        assert agent.get_last_tools_used("b") == []
+
+    def _timed(self, agent, session_ids, delay=0.2):
+        _route(agent, "TOOL")
+
+        def slow_session(session_id):
+            session = _mock_session(session_id)
+            session.agent_executor.invoke.side_effect = lambda *a, **kw: (
+                time.sleep(delay) or {"output": "ok", "intermediate_steps": []})
+            return session
+
+        agent.sessions.factory = slow_session
+        threads = [threading.Thread(target=agent.process_query, args=("查天气", sid)) for sid in session_ids]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+    def test_different_sessions_run_in_parallel(self, agent):
+        assert self._timed(agent, ["a", "b", "c", "d"]) < 0.6
+
+    def test_same_session_is_serialized(self, agent):
+        assert self._timed(agent, ["a", "a", "a"]) >= 0.6
+
+    def test_cancelled_queued_stream_releases_session(self, agent):
+        import asyncio
+        _route(agent, "DIRECT")
+        session = agent.session("a")
+
+        async def scenario():
+            session.lock.acquire()          # 模拟同一会话上正在执行的请求
+            stream = agent.astream_query("你好", session_id="a")
+            task = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            session.lock.release()          # 前一个请求结束，排队中的线程拿到锁后应立即归还
+            await asyncio.sleep(0.1)
+            return [e async for e in agent.astream_query("你好", session_id="a")]
+
+        events = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+        assert events[-1]["event"] == "done"
+        assert not session.lock.locked()
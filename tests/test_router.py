@@ -58,3 +58,32 @@ class TestQueryRouter:
         """如果 LLM 同时出现多个关键词，取第一个匹配"""
         router = _make_router("RETRIEVE or maybe TOOL")
         assert router.route("test") == "RETRIEVE"
+
+
+class TestQueryRouterCache:
+    def _router(self, tmp_path, response="TOOL"):
+        from aura_react import QueryRouter
+        from llm_cache import LLMCache
+
+        llm = MagicMock()
+        llm.model = "qwen2.5:7b"
+        llm.temperature = 0
+        router = QueryRouter(llm, cache=LLMCache(str(tmp_path / "llm_cache.sqlite")))
+        mock_result = MagicMock()
+        mock_result.content = response
+        router.chain = MagicMock()
+        router.chain.invoke = MagicMock(return_value=mock_result)
+        return router
+
+    def test_repeated_query_hits_cache(self, tmp_path):
+        router = self._router(tmp_path)
+        assert router.route("今天北京天气怎么样") == "TOOL"
+        assert router.route("今天北京天气怎么样") == "TOOL"
+        router.chain.invoke.assert_called_once()
+        assert router.cache.stats()["namespaces"]["router"]["hit_rate"] == 0.5
+
+    def test_unparseable_output_not_cached(self, tmp_path):
+        router = self._router(tmp_path, response="I don't know")
+        assert router.route("test") == "RETRIEVE"
+        assert router.route("test") == "RETRIEVE"
+        assert router.chain.invoke.call_count == 2
@@ -0,0 +1,125 @@
+"""会话池 / 长期记忆并发写入 / 负载测试工具单元测试"""
+
+import json
+import threading
+import time
+
+from memory import LongTermMemory
+from sessions import SessionPool
+
+
+class TestSessionPool:
+    def test_create_on_demand_and_reuse(self):
+        pool = SessionPool(lambda sid: {"id": sid})
+        a = pool.get("a")
+        assert pool.get("a") is a
+        assert "a" in pool and len(pool) == 1
+        assert pool.stats()["created"] == 1
+
+    def test_lru_eviction(self):
+        pool = SessionPool(lambda sid: object(), max_sessions=2)
+        pool.get("a")
+        pool.get("b")
+        pool.get("a")
+        pool.get("c")
+        assert "a" in pool and "c" in pool and "b" not in pool
+        assert pool.stats()["evicted"] == 1
+
+    def test_idle_ttl(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        pool = SessionPool(lambda sid: object(), idle_ttl=60)
+        pool.get("a")
+        now[0] += 30
+        pool.get("b")
+        now[0] += 45
+        pool.get("b")
+        assert "a" not in pool and "b" in pool
+
+    def test_busy_sessions_not_evicted(self):
+        busy = {"a"}
+        pool = SessionPool(lambda sid: sid, max_sessions=2, busy=lambda session: session in busy)
+        pool.get("a")
+        pool.get("b")
+        pool.get("c")
+        assert "a" in pool and "b" not in pool and "c" in pool
+        busy.add("c")
+        pool.get("d")
+        assert len(pool) == 3 and "d" in pool
+        busy.clear()
+        pool.get("e")
+        assert len(pool) == 2 and "d" in pool and "e" in pool
+
+    def test_busy_sessions_survive_idle_ttl(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        pool = SessionPool(lambda sid: sid, idle_ttl=60, busy=lambda session: session == "a")
+        pool.get("a")
+        pool.get("b")
+        now[0] += 120
+        pool.get("c")
+        assert "a" in pool and "b" not in pool
+
+    def test_drop(self):
+        pool = SessionPool(lambda sid: object())
+        pool.get("a")
+        assert pool.drop("a") and not pool.drop("a")
+
+    def test_concurrent_get_creates_once(self):
+        created = []
+
+        def factory(sid):
+            time.sleep(0.01)
+            created.append(sid)
+            return object()
+
+        pool = SessionPool(factory)
+        threads = [threading.Thread(target=pool.get, args=("a",)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert created == ["a"]
+
+
+class TestLongTermMemoryConcurrency:
+    def test_concurrent_add_conversation(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("AURA_MASTER_KEY", raising=False)
+        path = tmp_path / "memory.json"
+        memory = LongTermMemory(memory_file=str(path))
+
+        def worker(n):
+            for i in range(10):
+                memory.add_conversation(f"q{n}-{i}", "a", session_id=f"s{n}")
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        saved = json.loads(path.read_text(encoding="utf-8"))
+        assert len(saved["conversations"]) == 80
+        assert {c["session_id"] for c in saved["conversations"]} == {f"s{n}" for n in range(8)}
+        assert not (tmp_path / "memory.json.tmp").exists()
+
+
+class TestLoadTest:
+    def test_throughput_scales_with_concurrency(self):
+        from evaluation.load_test import scaling
+
+        rows = scaling(lambda i: time.sleep(0.02), levels=(1, 4), requests=16)
+        assert [r["concurrency"] for r in rows] == [1, 4]
+        assert rows[0]["speedup"] == 1.0
+        assert rows[1]["speedup"] > 2.5
+        assert all(r["errors"] == 0 for r in rows)
+
+    def test_errors_counted(self):
+        from evaluation.load_test import run_load
+
+        def call(i):
+            if i % 2:
+                raise RuntimeError("boom")
+
+        row = run_load(call, concurrency=2, requests=6)
+        assert row["requests"] == 6 and row["errors"] == 3
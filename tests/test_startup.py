@@ -0,0 +1,59 @@
+"""启动时间线单元测试"""
+
+import pytest
+
+from startup import DEGRADED, DISABLED, FAILED, LOADING, PENDING, READY, StartupTimeline
+
+
+@pytest.fixture
+def timeline():
+    return StartupTimeline()
+
+
+class TestStartupTimeline:
+    def test_expected_components_start_pending(self, timeline):
+        timeline.expect("embeddings", "reranker")
+        components = timeline.snapshot()["components"]
+        assert components["embeddings"]["state"] == PENDING
+        assert not timeline.is_ready()
+
+    def test_track_records_duration(self, timeline):
+        timeline.expect("embeddings")
+        with timeline.track("embeddings"):
+            assert timeline.snapshot()["components"]["embeddings"]["state"] == LOADING
+        entry = timeline.snapshot()["components"]["embeddings"]
+        assert entry["state"] == READY
+        assert entry["seconds"] >= 0
+        assert entry["start_s"] >= 0
+        assert timeline.is_ready()
+
+    def test_failure_is_recorded_and_raised(self, timeline):
+        with pytest.raises(RuntimeError):
+            with timeline.track("reranker"):
+                raise RuntimeError("download failed")
+        entry = timeline.snapshot()["components"]["reranker"]
+        assert entry["state"] == FAILED
+        assert "download failed" in entry["error"]
+        assert not timeline.is_ready()
+
+    def test_disabled_counts_as_ready(self, timeline):
+        with timeline.track("embeddings"):
+            pass
+        timeline.mark("reranker", DISABLED)
+        assert timeline.is_ready()
+        assert timeline.is_ready("embeddings", "reranker")
+        assert not timeline.is_ready("embeddings", "agent")
+
+    def test_degraded_optional_component_counts_as_ready(self, timeline):
+        with pytest.raises(RuntimeError):
+            with timeline.track("reranker"):
+                raise RuntimeError("download failed")
+        timeline.mark("reranker", DEGRADED, error="download failed")
+        assert timeline.snapshot()["components"]["reranker"]["state"] == DEGRADED
+        assert timeline.is_ready()
+
+    def test_reset(self, timeline):
+        with timeline.track("bm25"):
+            pass
+        timeline.reset()
+        assert timeline.snapshot()["components"] == {}
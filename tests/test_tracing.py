@@ -75,6 +75,59 @@ class TestTracer:
         assert tracer.get_recent_traces() == []
 
 
+class TestCurrentTrace:
+    def test_trace_event_appends_to_active_trace(self, tracer):
+        from tracing import current_trace, trace_event
+        trace = tracer.start_trace("q")
+        assert current_trace() is trace
+        trace_event("recall", {"leg": "bm25", "ms": 1.2})
+        assert trace["events"][0]["type"] == "recall"
+        assert trace["events"][0]["data"]["leg"] == "bm25"
+
+    def test_end_trace_deactivates(self, tracer):
+        from tracing import current_trace, trace_event
+        trace = tracer.start_trace("q")
+        tracer.end_trace(trace, "done")
+        assert current_trace() is None
+        trace_event("recall", {"leg": "vector"})  # 没有活动 trace 时忽略
+        assert trace["events"] == []
+
+
+class TestLLMUsage:
+    def test_llm_calls_accumulate_tokens(self, tracer):
+        from tracing import trace_llm_call
+        trace = tracer.start_trace("q")
+        trace_llm_call("router", 12.0, 30, 2)
+        trace_llm_call("grounded", 480.0, 400, 120)
+        finished = tracer.end_trace(trace, "done", route="RETRIEVE")
+        assert finished["tokens"] == {"prompt": 430, "completion": 122, "total": 552, "llm_calls": 2}
+        llm_events = [e["data"] for e in trace["events"] if e["type"] == "llm"]
+        assert [e["name"] for e in llm_events] == ["router", "grounded"]
+
+    def test_unknown_usage_counts_call_only(self, tracer):
+        from tracing import trace_llm_call
+        trace = tracer.start_trace("q")
+        trace_llm_call("direct", 100.0)
+        finished = tracer.end_trace(trace, "done")
+        assert finished["tokens"] == {"prompt": 0, "completion": 0, "total": 0, "llm_calls": 1}
+
+    def test_end_trace_without_llm_calls(self, tracer):
+        finished = tracer.end_trace(tracer.start_trace("q"), "done")
+        assert finished["tokens"]["llm_calls"] == 0
+
+    def test_route_stats(self, tracer):
+        from tracing import trace_llm_call
+        for route, tokens in (("DIRECT", 50), ("DIRECT", 70), ("TOOL", 900)):
+            trace = tracer.start_trace(route)
+            trace_llm_call(route.lower(), 10.0, tokens, 0)
+            tracer.end_trace(trace, "ok", route=route)
+        stats = tracer.route_stats()
+        assert stats["DIRECT"]["count"] == 2
+        assert stats["DIRECT"]["avg_tokens"] == 60
+        assert stats["TOOL"]["avg_llm_calls"] == 1
+        assert tracer.get_recent_traces(1)[0]["tokens"] is not None
+
+
 class TestLangSmithSetup:
     def test_disabled_by_default(self, monkeypatch):
         monkeypatch.delenv("LANGCHAIN_TRACING_V2", raising=False)
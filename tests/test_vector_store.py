@@ -0,0 +1,326 @@
+"""进程内向量存储（NumpyStore / HnswStore）单元测试"""
+
+import os
+
+import numpy as np
+import pytest
+
+import vector_store
+from vector_store import NumpyStore, QuantizedStore, RWLock, chroma_hnsw_metadata, open_store
+
+
+DOCS = {
+    "a": ([1.0, 0.0, 0.0], {"source": "/d/a.md", "extension": ".md", "ingested_at": 1.0}),
+    "b": ([0.9, 0.1, 0.0], {"source": "/d/b.pdf", "extension": ".pdf", "ingested_at": 2.0}),
+    "c": ([0.0, 1.0, 0.0], {"source": "/d/c.md", "extension": ".md", "ingested_at": 3.0}),
+}
+
+
+def _fill(store):
+    ids = list(DOCS)
+    store.upsert(ids, [DOCS[i][0] for i in ids], [f"text {i}" for i in ids], [DOCS[i][1] for i in ids])
+    return store
+
+
+OPENERS = {
+    "numpy": NumpyStore,
+    "hnsw": lambda directory: open_store("hnsw", directory),
+    "numpy-int8": lambda directory: QuantizedStore(directory, quantization="int8"),
+    "numpy-binary": lambda directory: QuantizedStore(directory, quantization="binary"),
+}
+
+
+@pytest.fixture(params=list(OPENERS))
+def kind(request):
+    if request.param == "hnsw" and not vector_store.HNSWLIB_AVAILABLE:
+        pytest.skip("未安装 hnswlib")
+    return request.param
+
+
+@pytest.fixture
+def store(kind, tmp_path):
+    return _fill(OPENERS[kind](str(tmp_path / "vectors")))
+
+
+class TestInProcessStores:
+    def test_query_orders_by_cosine(self, store):
+        hits = store.query([1.0, 0.05, 0.0], k=2)
+        assert [h[0] for h in hits] == ["a", "b"]
+        assert hits[0][1] == "text a"
+        assert hits[0][3] < hits[1][3]
+
+    def test_query_with_where(self, store):
+        hits = store.query([1.0, 0.0, 0.0], k=3, where={"extension": {"$in": [".md"]}})
+        assert [h[0] for h in hits] == ["a", "c"]
+        assert store.query([1.0, 0.0, 0.0], k=3, where={"extension": ".docx"}) == []
+
+    def test_upsert_overwrites(self, store):
+        store.upsert(["a"], [[0.0, 0.0, 1.0]], ["new a"], [{"source": "/d/a.md"}])
+        assert store.count() == 3
+        assert store.query([0.0, 0.0, 1.0], k=1)[0][:2] == ("a", "new a")
+
+    def test_delete(self, store):
+        store.delete(["a", "missing"])
+        assert store.count() == 2
+        assert "a" not in [h[0] for h in store.query([1.0, 0.0, 0.0], k=3)]
+
+    def test_get(self, store):
+        got = store.get(ids=["c", "a"])
+        assert sorted(got["ids"]) == ["a", "c"]
+        assert store.get(where={"source": "/d/b.pdf"}, include=())["ids"] == ["b"]
+        assert store.get(where={"source": "/d/b.pdf"}, include=())["documents"] is None
+        assert len(store.get(limit=2)["ids"]) == 2
+        assert len(store.get(offset=2)["ids"]) == 1
+
+    def test_persistence(self, store, kind):
+        store.update_metadata(["b"], [{"source": "/d/b.pdf", "extension": ".pdf", "ingested_at": 9.0}])
+        store.delete(["c"])
+        store.save()
+        reopened = OPENERS[kind](store.directory)
+        assert reopened.count() == 2
+        assert reopened.get(ids=["b"])["metadatas"][0]["ingested_at"] == 9.0
+        assert [h[0] for h in reopened.query([1.0, 0.0, 0.0], k=2)] == ["a", "b"]
+
+    def test_compact_keeps_results(self, store, kind):
+        store.delete(["c"])
+        store.save()
+        store.compact()
+        reopened = OPENERS[kind](store.directory)
+        assert reopened.count() == 2
+        assert [h[0] for h in reopened.query([1.0, 0.0, 0.0], k=3)] == ["a", "b"]
+
+
+class TestNumpyStore:
+    def test_loads_as_memmap_and_copies_on_write(self, tmp_path):
+        store = _fill(NumpyStore(str(tmp_path)))
+        store.save()
+        reopened = NumpyStore(str(tmp_path))
+        assert isinstance(reopened.matrix, np.memmap)
+        reopened.upsert(["d"], [[0.0, 0.0, 1.0]], ["text d"], [{}])
+        assert not isinstance(reopened.matrix, np.memmap)
+        assert reopened.count() == 4
+
+    def test_save_never_replaces_mapped_file(self, tmp_path, monkeypatch):
+        import os
+        store = _fill(NumpyStore(str(tmp_path)))
+        store.save()
+        first = store._vectors_file
+        assert isinstance(store.matrix, np.memmap)
+
+        # 模拟 Windows：已映射的文件既不能被 os.replace 覆盖，也不能删除
+        real_replace, real_remove = os.replace, os.remove
+        mapped = {os.path.join(str(tmp_path), first)}
+
+        def replace(src, dst):
+            if dst in mapped:
+                raise PermissionError(dst)
+            return real_replace(src, dst)
+
+        def remove(path):
+            if path in mapped:
+                raise PermissionError(path)
+            return real_remove(path)
+
+        monkeypatch.setattr(vector_store.os, "replace", replace)
+        monkeypatch.setattr(vector_store.os, "remove", remove)
+        store.upsert(["d"], [[0.0, 0.0, 1.0]], ["text d"], [{}])
+        store.save()
+        assert store._vectors_file != first
+        assert NumpyStore(str(tmp_path)).count() == 4
+
+        mapped.clear()
+        store.upsert(["e"], [[0.5, 0.5, 0.0]], ["text e"], [{}])
+        store.save()
+        leftovers = [n for n in os.listdir(tmp_path) if n.startswith("vectors")]
+        assert leftovers == [store._vectors_file]
+
+    def test_loads_legacy_vectors_file(self, tmp_path):
+        import json
+        store = _fill(NumpyStore(str(tmp_path)))
+        store.save()
+        (tmp_path / store._vectors_file).rename(tmp_path / "vectors.npy")
+        records = json.loads((tmp_path / "records.json").read_text(encoding="utf-8"))
+        del records["vectors_file"]
+        (tmp_path / "records.json").write_text(json.dumps(records), encoding="utf-8")
+        assert NumpyStore(str(tmp_path)).count() == 3
+
+    def test_appends_grow_buffer_without_copying(self, tmp_path):
+        store = NumpyStore(str(tmp_path / "v"))
+        buffers = set()
+        for i in range(200):
+            store.upsert([f"c{i}"], [[1.0, float(i), 0.0]], [f"t{i}"], [{}])
+            buffers.add(id(store._buffer))
+        assert store.count() == len(store.matrix) == 200
+        assert len(buffers) <= 3           # 64 → 128 → 256，只在扩容时复制
+        assert store.get(ids=["c150"])["documents"] == ["t150"]
+
+    def test_snapshot_unaffected_by_later_writes(self, tmp_path):
+        store = _fill(NumpyStore(str(tmp_path / "v")))
+        matrix, ids, documents, _ = store._snapshot()
+        before = np.array(matrix)
+        store.upsert(["d"], [[0.0, 0.0, 1.0]], ["text d"], [{}])
+        store.upsert(["a"], [[0.0, 1.0, 0.0]], ["new a"], [{}])
+        assert len(matrix) == 3 and np.array_equal(matrix, before)
+        assert documents[0] == "text a"
+        assert store.query([0.0, 0.0, 1.0], k=1)[0][0] == "d"
+
+    def test_dimension_mismatch(self, tmp_path):
+        store = _fill(NumpyStore(str(tmp_path)))
+        with pytest.raises(ValueError, match="向量维度不一致"):
+            store.upsert(["x"], [[1.0, 0.0]], ["x"], [{}])
+
+    def test_empty_store(self, tmp_path):
+        assert NumpyStore(str(tmp_path)).query([1.0, 0.0], k=3) == []
+
+
+class TestQuantizedStore:
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(0)
+        return rng.standard_normal((2000, 64)).astype(np.float32), rng.standard_normal((20, 64)).astype(np.float32)
+
+    def _recall(self, store, matrix, queries, k=10):
+        from vector_store import normalize_rows
+        unit = normalize_rows(matrix)
+        total = 0.0
+        for q in queries:
+            exact = set(np.argsort(-(unit @ normalize_rows(q)[0]))[:k].astype(str))
+            total += len(exact & {h[0] for h in store.query(q, k)}) / k
+        return total / len(queries)
+
+    def _build(self, tmp_path, matrix, **kwargs):
+        store = QuantizedStore(str(tmp_path), **kwargs)
+        ids = [str(i) for i in range(len(matrix))]
+        store.upsert(ids, matrix, [""] * len(ids), [{} for _ in ids])
+        store.save()
+        return store
+
+    def test_int8_recall_close_to_exact(self, tmp_path, data):
+        store = self._build(tmp_path, data[0], quantization="int8", rescore_factor=4)
+        assert self._recall(store, *data) >= 0.95
+
+    def test_binary_recall_improves_with_rescoring(self, tmp_path, data):
+        narrow = self._recall(self._build(tmp_path / "a", data[0], quantization="binary", rescore_factor=1), *data)
+        wide = self._recall(self._build(tmp_path / "b", data[0], quantization="binary", rescore_factor=10), *data)
+        assert wide > narrow
+        assert wide >= 0.5  # 随机高斯数据是符号量化的最坏情况
+
+    def test_resident_memory_excludes_mapped_matrix(self, tmp_path, data):
+        matrix = data[0]
+        int8 = self._build(tmp_path / "i", matrix, quantization="int8")
+        binary = self._build(tmp_path / "b", matrix, quantization="binary")
+        assert isinstance(int8.matrix, np.memmap)
+        assert int8.nbytes() < matrix.nbytes / 3
+        assert binary.nbytes() == matrix.nbytes // 32
+
+    def test_codes_persist_and_track_deletes(self, tmp_path, data):
+        store = self._build(tmp_path, data[0][:10], quantization="int8")
+        store.delete(["3"])
+        store.save()
+        reopened = QuantizedStore(str(tmp_path), quantization="int8")
+        assert len(reopened.codes) == reopened.count() == 9
+        assert reopened.query(data[0][4], 1)[0][0] == "4"
+
+    def test_codes_versioned_with_vectors(self, tmp_path, data, monkeypatch):
+        from vector_store import normalize_rows
+        store = self._build(tmp_path, data[0][:10], quantization="int8")
+        assert sorted(p.name for p in tmp_path.glob("codes-*")) == [store._sidecar_files["codes_file"]]
+        # 只覆盖已有行（行数不变），写新编码时崩溃：records.json 不能已经指向新向量
+        store.upsert(["0"], data[0][5:6], [""], [{}])
+        real_write = vector_store._atomic_write
+
+        def crash_on_codes(path, write):
+            if os.path.basename(path).startswith("codes-"):
+                raise OSError("crash")
+            real_write(path, write)
+
+        monkeypatch.setattr(vector_store, "_atomic_write", crash_on_codes)
+        with pytest.raises(OSError):
+            store.save()
+        monkeypatch.setattr(vector_store, "_atomic_write", real_write)
+        reopened = QuantizedStore(str(tmp_path), quantization="int8")
+        expected, _ = reopened._encode(normalize_rows(np.asarray(reopened.matrix)))
+        assert np.array_equal(reopened.codes, expected)
+
+    def test_unknown_quantization(self, tmp_path):
+        with pytest.raises(ValueError, match="未知量化方式"):
+            QuantizedStore(str(tmp_path), quantization="pq")
+
+
+class TestConfig:
+    def test_chroma_metadata(self):
+        assert chroma_hnsw_metadata() is None
+        assert chroma_hnsw_metadata(M=32, ef_search=100) == {"hnsw:M": 32, "hnsw:search_ef": 100}
+
+    def test_quantization_only_for_numpy(self, tmp_path):
+        with pytest.raises(ValueError, match="量化检索只支持 numpy"):
+            open_store("hnsw", str(tmp_path), quantization="int8")
+
+    def test_unknown_store(self, tmp_path):
+        with pytest.raises(ValueError, match="未知向量存储"):
+            open_store("faiss", str(tmp_path))
+
+    def test_hnsw_requires_hnswlib(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vector_store, "HNSWLIB_AVAILABLE", False)
+        with pytest.raises(ImportError, match="hnswlib"):
+            open_store("hnsw", str(tmp_path))
+
+
+class TestConcurrency:
+    def test_rwlock_readers_share_writer_excludes(self):
+        import threading
+        import time
+        lock, inside, peak = RWLock(), [0], [0]
+        guard = threading.Lock()
+
+        def reader():
+            with lock.read():
+                with guard:
+                    inside[0] += 1
+                    peak[0] = max(peak[0], inside[0])
+                time.sleep(0.05)
+                with guard:
+                    inside[0] -= 1
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak[0] > 1
+
+        with lock.write():
+            t = threading.Thread(target=reader)
+            t.start()
+            time.sleep(0.05)
+            assert inside[0] == 0
+        t.join()
+
+    def test_hnsw_queries_concurrent_with_upserts(self, tmp_path):
+        import threading
+        if not vector_store.HNSWLIB_AVAILABLE:
+            pytest.skip("未安装 hnswlib")
+        rng = np.random.default_rng(1)
+        store = open_store("hnsw", str(tmp_path))
+        store.upsert([f"x{i}" for i in range(200)], rng.standard_normal((200, 16)), ["t"] * 200, [{}] * 200)
+        errors = []
+
+        def query():
+            local = np.random.default_rng()
+            try:
+                for _ in range(50):
+                    assert len(store.query(local.standard_normal(16), k=5)) == 5
+            except Exception as e:
+                errors.append(e)
+
+        def write():
+            for batch in range(20):
+                ids = [f"y{batch}-{i}" for i in range(100)]
+                store.upsert(ids, rng.standard_normal((100, 16)), ["t"] * 100, [{}] * 100)
+
+        threads = [threading.Thread(target=query) for _ in range(4)] + [threading.Thread(target=write)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == [] and store.count() == 2200
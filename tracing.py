@@ -2,8 +2,11 @@
 Aura 可观测性模块
 - 本地 JSON 文件追踪：每次请求记录 route → tools → latency → response
 - 可选 LangSmith 集成：设置 LANGCHAIN_TRACING_V2=true + LANGCHAIN_API_KEY 即可启用
+- 当前 trace 保存在 contextvar 中，RAG 等下层模块可通过 trace_event() 追加事件而无需层层传参
+- 每次 LLM 调用的耗时与 token 数通过 trace_llm_call() 记录，route_stats() 按路由汇总延迟与 token
 """
 
+import contextvars
 import json
 import os
 import time
@@ -12,6 +15,8 @@ from pathlib import Path
 
 TRACE_DIR = Path("traces")
 
+_current_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("aura_trace", default=None)
+
 
 def _ensure_trace_dir():
     TRACE_DIR.mkdir(exist_ok=True)
@@ -25,6 +30,45 @@ def setup_langsmith():
     return False
 
 
+def _append_event(trace: dict, event_type: str, data: dict | None = None):
+    trace["events"].append({
+        "type": event_type,
+        "ts": time.time() - trace["start_time"],
+        "data": data or {},
+    })
+
+
+def current_trace() -> dict | None:
+    return _current_trace.get()
+
+
+def trace_event(event_type: str, data: dict | None = None):
+    """向当前上下文中正在进行的 trace 追加事件；没有活动 trace 时忽略"""
+    trace = _current_trace.get()
+    if trace is not None:
+        _append_event(trace, event_type, data)
+
+
+def _add_llm_call(trace: dict, name: str, ms: float, prompt_tokens: int | None, completion_tokens: int | None):
+    _append_event(trace, "llm", {
+        "name": name, "ms": round(ms, 1),
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+    })
+    tokens = trace.setdefault("tokens", {"prompt": 0, "completion": 0, "total": 0, "llm_calls": 0})
+    tokens["llm_calls"] += 1
+    tokens["prompt"] += prompt_tokens or 0
+    tokens["completion"] += completion_tokens or 0
+    tokens["total"] = tokens["prompt"] + tokens["completion"]
+
+
+def trace_llm_call(name: str, ms: float, prompt_tokens: int | None = None,
+                   completion_tokens: int | None = None):
+    """向当前 trace 记录一次 LLM 调用（耗时 + token 数，后端未返回用量时为 None）并累计到 trace["tokens"]"""
+    trace = _current_trace.get()
+    if trace is not None:
+        _add_llm_call(trace, name, ms, prompt_tokens, completion_tokens)
+
+
 class Tracer:
     """轻量级本地链路追踪"""
 
@@ -33,27 +77,28 @@ class Tracer:
         self.langsmith_enabled = setup_langsmith()
 
     def start_trace(self, query: str) -> dict:
-        return {
+        trace = {
             "trace_id": datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
             "query": query,
             "start_time": time.time(),
             "events": [],
         }
+        _current_trace.set(trace)
+        return trace
 
     def add_event(self, trace: dict, event_type: str, data: dict | None = None):
-        trace["events"].append({
-            "type": event_type,
-            "ts": time.time() - trace["start_time"],
-            "data": data or {},
-        })
+        _append_event(trace, event_type, data)
 
     def end_trace(self, trace: dict, response: str, route: str = "",
                   tools_used: list | None = None):
+        if _current_trace.get() is trace:
+            _current_trace.set(None)
         trace["end_time"] = time.time()
         trace["latency_ms"] = round((trace["end_time"] - trace["start_time"]) * 1000, 1)
         trace["response"] = response[:500]
         trace["route"] = route
         trace["tools_used"] = tools_used or []
+        trace.setdefault("tokens", {"prompt": 0, "completion": 0, "total": 0, "llm_calls": 0})
 
         filepath = TRACE_DIR / f"{trace['trace_id']}.json"
         with open(filepath, "w", encoding="utf-8") as f:
@@ -74,5 +119,27 @@ class Tracer:
                     "route": t.get("route"),
                     "tools": t.get("tools_used"),
                     "latency_ms": t.get("latency_ms"),
+                    "tokens": t.get("tokens", {}).get("total"),
                 })
         return summaries
+
+    def route_stats(self, n: int = 200) -> dict[str, dict]:
+        """最近 n 条 trace 按路由汇总：请求数、平均 / P95 延迟、平均 LLM 调用次数与 token 数"""
+        by_route: dict[str, list[dict]] = {}
+        for fp in sorted(TRACE_DIR.glob("*.json"), reverse=True)[:n]:
+            with open(fp, "r", encoding="utf-8") as f:
+                t = json.load(f)
+            by_route.setdefault(t.get("route") or "", []).append(t)
+        stats = {}
+        for route, traces in by_route.items():
+            latencies = sorted(t.get("latency_ms", 0.0) for t in traces)
+            tokens = [t.get("tokens", {}) for t in traces]
+            count = len(traces)
+            stats[route] = {
+                "count": count,
+                "avg_latency_ms": round(sum(latencies) / count, 1),
+                "p95_latency_ms": latencies[min(count - 1, int(count * 0.95))],
+                "avg_llm_calls": round(sum(t.get("llm_calls", 0) for t in tokens) / count, 2),
+                "avg_tokens": round(sum(t.get("total", 0) for t in tokens) / count, 1),
+            }
+        return stats
@@ -0,0 +1,736 @@
+"""
+Aura 向量存储
+- chroma：默认，Chroma 持久化集合；HNSW 参数通过集合元数据 hnsw:M / hnsw:construction_ef / hnsw:search_ef
+  设置（只在新建集合时生效）
+- numpy：进程内 float32 矩阵，精确点积检索；持久化为 .npy，启动时 mmap 加载，适合小语料
+- hnsw：在 numpy 存储之上维护 hnswlib 近似索引，M / ef_construction / ef_search 可调，适合大语料
+- numpy + quantization="int8" / "binary"：内存中只保留量化编码做第一轮检索，全精度矩阵留在磁盘映射上，
+  只对前 k * rescore_factor 个候选读取原向量重新打分
+
+三种存储接口一致（upsert / update_metadata / delete / count / get / query / save），
+RAGSystem 只通过该接口读写向量；where 子句沿用 Chroma 语法（进程内存储用 filters.match_where 求值）。
+进程内存储由单个进程独占，多进程共享同一 db 目录时请使用 chroma。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from filters import match_where
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+logger = logging.getLogger("AuraVectorStore")
+
+VECTOR_STORES = ("chroma", "numpy", "hnsw")
+QUANTIZATIONS = ("int8", "binary")
+DEFAULT_INCLUDE = ("documents", "metadatas")
+
+
+def chroma_hnsw_metadata(M: int | None = None, ef_construction: int | None = None,
+                         ef_search: int | None = None) -> dict | None:
+    """Chroma 集合的 HNSW 参数；全部为 None 时使用 Chroma 默认值"""
+    metadata = {
+        key: value for key, value in (
+            ("hnsw:M", M), ("hnsw:construction_ef", ef_construction), ("hnsw:search_ef", ef_search),
+        ) if value is not None
+    }
+    return metadata or None
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """转为 float32 并按行单位化，点积即余弦相似度"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _reserve(buffer: np.ndarray, size: int, extra: int, copy: bool = False) -> np.ndarray:
+    """
+    返回前 size 行与 buffer 相同、容量至少 size + extra 行的可写缓冲区。
+    容量足够且可写时原样返回（追加是摊还 O(1)）；容量不足、只读映射或 copy=True 时按倍数扩容并复制
+    """
+    needed = size + extra
+    if not copy and buffer.flags.writeable and not isinstance(buffer, np.memmap) and len(buffer) >= needed:
+        return buffer
+    grown = np.empty((max(needed, 2 * size, 64),) + buffer.shape[1:], buffer.dtype)
+    grown[:size] = buffer[:size]
+    return grown
+
+
+def _atomic_write(path: str, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class RWLock:
+    """读写锁：读者之间并发，写者独占；有写者等待时新读者排队，避免写者饥饿。不可重入"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ChromaStore:
+    """Chroma 集合适配器"""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self) -> int:
+        return int(self.collection.count())
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        self.collection.upsert(
+            ids=list(ids),
+            embeddings=[list(v) for v in embeddings],
+            documents=list(documents),
+            metadatas=list(metadatas),
+        )
+
+    def update_metadata(self, ids, metadatas):
+        if ids:
+            self.collection.update(ids=list(ids), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=DEFAULT_INCLUDE) -> dict:
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def query(self, embedding, k: int, where=None) -> list[tuple]:
+        """返回 [(id, 正文, 元数据, 距离)]，距离越小越相似"""
+        got = self.collection.query(
+            query_embeddings=[list(embedding)], n_results=k, where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return list(zip(got["ids"][0], got["documents"][0], got["metadatas"][0], got["distances"][0]))
+
+    def save(self):
+        """Chroma 写入即持久化"""
+
+    def nbytes(self) -> int | None:
+        return None
+
+
+class NumpyStore:
+    """
+    进程内精确检索：单位化 float32 矩阵 + 点积，距离为 1 - 余弦相似度
+
+    向量存放在预留容量的缓冲区中，新行原地追加（摊还 O(1)），只有覆盖已有行与删除才写时复制；
+    查询在锁内取一次快照（前 n 行的视图 + 行数），之后追加的行不影响快照，因此并发查询之间不互相阻塞。
+    修改在 save() 时落盘并合并为紧凑的只读映射（由 RAGSystem 在导入 / 删除结束后调用）。
+
+    向量每次落盘写入新的 vectors-<版本>.npy，再由 records.json 的 vectors_file 指向它：
+    旧文件可能仍被映射（本实例或进行中的查询快照），Windows 上无法覆盖或删除已映射的文件，
+    因此不原地替换，旧版本在下次 save() 时尽力清理。
+    子类随向量派生的附属文件（如量化编码）同样按版本写入，由 records.json 的 *_file 键指向。
+    """
+
+    name = "numpy"
+    VECTORS_FILE = "vectors.npy"            # 旧版本的固定文件名，records.json 没有 vectors_file 时读取
+    VECTORS_PATTERN = "vectors-{}.npy"
+    RECORDS_FILE = "records.json"
+    STALE_PREFIXES = ("vectors",)           # 清理旧版本时匹配的文件名前缀
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        self._buffer = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._row: dict[str, int] = {}
+        self._dirty = False          # 记录（ID / 正文 / 元数据）有未落盘的修改
+        self._vectors_dirty = False  # 向量矩阵有未落盘的修改
+        self._vectors_file: str | None = None  # 当前生效的向量文件名
+        self._sidecar_files: dict[str, str] = {}  # 当前生效的附属文件 {records 键: 文件名}
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """当前全部向量（缓冲区前 _size 行的视图）"""
+        return self._buffer[:self._size]
+
+    @matrix.setter
+    def matrix(self, value: np.ndarray):
+        self._buffer, self._size = value, len(value)
+
+    def _load(self):
+        records_path = self._path(self.RECORDS_FILE)
+        if not os.path.exists(records_path):
+            return
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        vectors_file = records.get("vectors_file") or self.VECTORS_FILE
+        vectors_path = self._path(vectors_file)
+        if not (records["ids"] and os.path.exists(vectors_path)):
+            return
+        # 只读映射：启动不拷贝矩阵，第一次写入时才复制到内存
+        matrix = np.load(vectors_path, mmap_mode="r")
+        if len(matrix) != len(records["ids"]):
+            logger.warning("向量文件与记录数不一致（%d / %d），忽略已持久化的向量", len(matrix), len(records["ids"]))
+            return
+        self.ids, self.documents, self.metadatas = records["ids"], records["documents"], records["metadatas"]
+        self.matrix = matrix
+        self._vectors_file = vectors_file
+        self._sidecar_files = {
+            key: name for key, name in records.items() if key.endswith("_file") and key != "vectors_file"
+        }
+        self._row = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = normalize_rows(embeddings)
+        with self._lock:
+            n = self._size
+            if n and self._buffer.shape[1] != vectors.shape[1]:
+                raise ValueError(f"向量维度不一致: 存储为 {self._buffer.shape[1]}，写入为 {vectors.shape[1]}")
+            targets, appended = [], {}
+            for chunk_id in ids:
+                r = self._row.get(chunk_id, appended.get(chunk_id))
+                if r is None:
+                    r = appended[chunk_id] = n + len(appended)
+                targets.append(r)
+            # 覆盖已有行时写时复制，进行中的查询快照仍看到旧向量；纯追加直接写入预留容量
+            overwrite = any(r < n for r in targets)
+            buffer = self._buffer if n else np.zeros((0, vectors.shape[1]), np.float32)
+            buffer = _reserve(buffer, n, len(appended), copy=overwrite)
+            docs, metas = (list(self.documents), list(self.metadatas)) if overwrite else (self.documents, self.metadatas)
+            for chunk_id in appended:
+                self.ids.append(chunk_id)
+                docs.append(None)
+                metas.append(None)
+            for i, r in enumerate(targets):
+                buffer[r] = vectors[i]
+                docs[r], metas[r] = documents[i], metadatas[i]
+            self._row.update(appended)
+            self._buffer, self.documents, self.metadatas = buffer, docs, metas
+            self._size = n + len(appended)
+            self._dirty = self._vectors_dirty = True
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                if chunk_id in self._row:
+                    self.metadatas[self._row[chunk_id]] = metadata
+            self._dirty = True
+
+    def delete(self, ids):
+        with self._lock:
+            drop = {self._row[chunk_id] for chunk_id in ids if chunk_id in self._row}
+            if not drop:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            self.matrix = np.asarray(self.matrix)[keep]
+            self.ids = [self.ids[i] for i in keep]
+            self.documents = [self.documents[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self._row = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+            self._dirty = self._vectors_dirty = True
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=DEFAULT_INCLUDE) -> dict:
+        with self._lock:
+            if ids is not None:
+                rows = [self._row[chunk_id] for chunk_id in ids if chunk_id in self._row]
+            else:
+                rows = range(len(self.ids))
+            rows = [r for r in rows if match_where(self.metadatas[r], where)]
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            got = {"ids": [self.ids[r] for r in rows]}
+            got["documents"] = [self.documents[r] for r in rows] if "documents" in include else None
+            got["metadatas"] = [self.metadatas[r] for r in rows] if "metadatas" in include else None
+            return got
+
+    def _snapshot(self):
+        """(向量视图, ids, documents, metadatas)；列表之后可能被追加，只应读取前 len(向量视图) 项"""
+        with self._lock:
+            return self.matrix, self.ids, self.documents, self.metadatas
+
+    def query(self, embedding, k: int, where=None) -> list[tuple]:
+        matrix, ids, documents, metadatas = self._snapshot()
+        n = len(matrix)
+        if not n or k <= 0:
+            return []
+        scores = np.asarray(matrix) @ normalize_rows(embedding)[0]
+        if where:
+            mask = np.fromiter((match_where(m, where) for m in metadatas), dtype=bool, count=n)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return []
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], documents[i], metadatas[i], float(1.0 - scores[i])) for i in top]
+
+    def save(self):
+        with self._lock:
+            vectors_file, sidecars = self._vectors_file, self._sidecar_files
+            if self._vectors_dirty:
+                # 先写新版本向量文件与附属文件，再由 records.json 原子切换指向
+                matrix = self.matrix
+                version = f"{time.time_ns():x}"
+                vectors_file = self.VECTORS_PATTERN.format(version)
+                _atomic_write(self._path(vectors_file), lambda f: np.save(f, matrix))
+                sidecars = self._save_sidecars(version)
+                self._dirty = True
+            if self._dirty:
+                records = {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas,
+                           "vectors_file": vectors_file, **sidecars}
+                _atomic_write(
+                    self._path(self.RECORDS_FILE),
+                    lambda f: f.write(json.dumps(records, ensure_ascii=False).encode("utf-8")),
+                )
+                self._dirty = False
+            if self._vectors_dirty:
+                self._vectors_file, self._sidecar_files = vectors_file, sidecars
+                # 落盘后改回只读映射，释放内存中的副本（空矩阵无法映射）
+                if len(matrix):
+                    self.matrix = np.load(self._path(vectors_file), mmap_mode="r")
+                self._vectors_dirty = False
+                self._remove_stale_vectors()
+
+    def compact(self):
+        """落盘未保存的修改并清理旧版本向量文件（供离线维护调用）"""
+        with self._lock:
+            self.save()
+            self._remove_stale_vectors()
+
+    def _save_sidecars(self, version: str) -> dict[str, str]:
+        """在 records.json 切换之前写入与向量同版本的附属文件，返回 {records 键: 文件名}"""
+        return {}
+
+    def _remove_stale_vectors(self):
+        """删除旧版本向量（及附属）文件；仍被映射（Windows）而删除失败的留到下次 save() 再试"""
+        current = {self._vectors_file, *self._sidecar_files.values()}
+        for name in os.listdir(self.directory):
+            if name in current or not (name.startswith(self.STALE_PREFIXES) and name.endswith(".npy")):
+                continue
+            try:
+                os.remove(self._path(name))
+            except OSError as e:
+                logger.debug("旧向量文件 %s 暂时无法删除: %s", name, e)
+
+    def nbytes(self) -> int:
+        """向量矩阵占用的字节数"""
+        return int(self.matrix.nbytes)
+
+
+class HnswStore(NumpyStore):
+    """
+    NumpyStore + hnswlib 近似索引（内积空间，向量已单位化）
+
+    全精度矩阵仍保留在 NumpyStore 中，用于持久化、重建索引以及索引返回结果不足时的精确检索回退。
+    索引标签与 chunk ID 的映射单独持久化；删除只做 mark_deleted，标签不复用。
+
+    并发：hnswlib 的 knn_query 可与其他查询并发，但不能与 add_items / resize_index / mark_deleted 并发。
+    查询持有 _index_lock 读锁，修改索引（写入 / 删除 / 重建 / 保存）先取 _lock 再取写锁；
+    查询不取 _lock，精确检索回退在释放读锁之后执行，避免与写者互相等待。
+    """
+
+    name = "hnsw"
+    INDEX_FILE = "hnsw.bin"
+    LABELS_FILE = "hnsw_labels.json"
+
+    def __init__(self, directory: str, M: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        if not HNSWLIB_AVAILABLE:
+            raise ImportError("vector_store='hnsw' 需要安装 hnswlib（pip install hnswlib）")
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+        self._labels: dict[str, int] = {}
+        self._label_ids: dict[int, str] = {}
+        self._next_label = 0
+        self._index_lock = RWLock()
+        super().__init__(directory)
+        if not self._load_index():
+            self._rebuild_index()
+
+    def _new_index(self, dim: int, capacity: int):
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=max(capacity, 1024), M=self.M, ef_construction=self.ef_construction)
+        index.set_ef(self.ef_search)
+        return index
+
+    def _load_index(self) -> bool:
+        index_path, labels_path = self._path(self.INDEX_FILE), self._path(self.LABELS_FILE)
+        if not (self.ids and os.path.exists(index_path) and os.path.exists(labels_path)):
+            return False
+        with open(labels_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if set(saved["labels"]) != set(self.ids) or saved.get("M") != self.M:
+            logger.info("HNSW 索引与向量记录不一致或参数已变化，重建索引")
+            return False
+        self.index = hnswlib.Index(space="ip", dim=self.matrix.shape[1])
+        self.index.load_index(index_path, max_elements=max(saved["next_label"], 1024))
+        self.index.set_ef(self.ef_search)
+        self._labels = saved["labels"]
+        self._label_ids = {label: chunk_id for chunk_id, label in self._labels.items()}
+        self._next_label = saved["next_label"]
+        return True
+
+    def _rebuild_index(self):
+        with self._lock, self._index_lock.write():
+            self._labels, self._label_ids, self._next_label = {}, {}, 0
+            if not self.ids:
+                self.index = None
+                return
+            self.index = self._new_index(self.matrix.shape[1], len(self.ids) * 2)
+            self._add_to_index(self.ids, np.asarray(self.matrix))
+
+    def _add_to_index(self, ids, vectors):
+        if self.index is None:
+            self.index = self._new_index(vectors.shape[1], len(ids) * 2)
+        needed = self._next_label + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, self.index.get_max_elements() * 2))
+        labels = []
+        for chunk_id in ids:
+            if chunk_id in self._labels:
+                self.index.mark_deleted(self._labels[chunk_id])
+                del self._label_ids[self._labels[chunk_id]]
+            label = self._next_label
+            self._next_label += 1
+            self._labels[chunk_id] = label
+            self._label_ids[label] = chunk_id
+            labels.append(label)
+        self.index.add_items(vectors, np.asarray(labels))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        with self._lock, self._index_lock.write():
+            super().upsert(ids, embeddings, documents, metadatas)
+            self._add_to_index(list(ids), normalize_rows(embeddings))
+
+    def delete(self, ids):
+        with self._lock, self._index_lock.write():
+            super().delete(ids)
+            for chunk_id in ids:
+                label = self._labels.pop(chunk_id, None)
+                if label is not None:
+                    self.index.mark_deleted(label)
+                    del self._label_ids[label]
+
+    def query(self, embedding, k: int, where=None) -> list[tuple]:
+        with self._index_lock.read():
+            if self.index is None or not self.ids or k <= 0:
+                return []
+            allowed = None
+            if where:
+                allowed = {
+                    self._labels[chunk_id]
+                    for chunk_id, metadata in zip(self.ids, self.metadatas) if match_where(metadata, where)
+                }
+                k = min(k, len(allowed))
+                if k == 0:
+                    return []
+            k = min(k, len(self.ids))
+            # 不在查询中 set_ef：ef 是索引级共享状态，hnswlib 搜索时本身取 max(ef, k)
+            try:
+                labels, distances = self.index.knn_query(
+                    normalize_rows(embedding), k=k,
+                    filter=(lambda label: label in allowed) if allowed is not None else None,
+                )
+            except RuntimeError:
+                pass
+            else:
+                results = []
+                for label, distance in zip(labels[0], distances[0]):
+                    chunk_id = self._label_ids[int(label)]
+                    r = self._row[chunk_id]
+                    results.append((chunk_id, self.documents[r], self.metadatas[r], float(distance)))
+                return results
+        # 过滤后可达节点不足 k 个时 hnswlib 会报错，退回精确检索
+        return super().query(embedding, k, where)
+
+    def save(self):
+        with self._lock, self._index_lock.write():
+            super().save()
+            if self.index is None:
+                return
+            index_path = self._path(self.INDEX_FILE)
+            self.index.save_index(index_path + ".tmp")
+            os.replace(index_path + ".tmp", index_path)
+            _atomic_write(
+                self._path(self.LABELS_FILE),
+                lambda f: f.write(json.dumps(
+                    {"labels": self._labels, "next_label": self._next_label, "M": self.M}
+                ).encode("utf-8")),
+            )
+
+    def compact(self):
+        """重建索引丢弃 mark_deleted 留下的节点（标签从 0 重新分配），再落盘"""
+        with self._lock:
+            self._rebuild_index()
+            super().compact()
+
+    def nbytes(self) -> int:
+        """全精度矩阵 + HNSW 图（按 hnswlib 的每元素开销估算）"""
+        graph = 0
+        if self.index is not None:
+            graph = self.index.get_current_count() * (self.M * 2 * 4 + 8)
+        return super().nbytes() + graph
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """逐行统计置位数（NumPy 2 使用 bitwise_count，否则退回 unpackbits）"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+    return np.unpackbits(bits, axis=1).sum(axis=1, dtype=np.int32)
+
+
+class QuantizedStore(NumpyStore):
+    """
+    量化第一轮检索 + 全精度重打分
+
+    - int8：每行对称标量量化（code = round(v / max|v| * 127)，保存每行 scale），内存为 float32 的 1/4
+    - binary：符号位打包（768 维 → 96 字节），按汉明距离排序，内存为 float32 的 1/32
+
+    全精度矩阵在 save() 后以只读映射形式留在磁盘上，查询时只读取候选行；
+    编码按块计算分数，避免为整个矩阵生成 float32 临时副本。
+    NumPy 没有 int8 矩阵向量乘的快速路径，int8 主要节省内存（QPS 略低于 float32 精确检索）；
+    binary 的异或 + 位计数比 float32 点积更快，但第一轮更粗，需要更大的 rescore_factor。
+    """
+
+    CODES_PATTERN = "codes-{}-{}.npy"       # 量化方式, 版本（与向量文件同版本）
+    SCALES_PATTERN = "scales-int8-{}.npy"
+    STALE_PREFIXES = ("vectors", "codes-", "scales-")
+    BLOCK_ROWS = 2048  # 块内临时 float32 副本约 6MB（768 维），留在 CPU 缓存附近
+
+    def __init__(self, directory: str, quantization: str = "int8", rescore_factor: int = 4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"未知量化方式: {quantization}，可选: {', '.join(QUANTIZATIONS)}")
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.name = f"numpy-{quantization}"
+        super().__init__(directory)
+        self.codes, self.scales = self._load_codes()
+
+    def _encode(self, vectors: np.ndarray):
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _empty_codes(self, dim: int):
+        if self.quantization == "binary":
+            return np.zeros((0, (dim + 7) // 8), np.uint8), None
+        return np.zeros((0, dim), np.int8), np.zeros(0, np.float32)
+
+    def _load_codes(self):
+        # 只信任 records.json 指向的、与当前向量同一次 save() 写入的编码；缺失或量化方式不同时重新编码
+        codes_file = self._sidecar_files.get("codes_file", "")
+        scales_file = self._sidecar_files.get("scales_file")
+        usable = (
+            codes_file.startswith(f"codes-{self.quantization}-")
+            and os.path.exists(self._path(codes_file))
+            and (self.quantization == "binary" or (scales_file and os.path.exists(self._path(scales_file))))
+        )
+        if self.ids and usable:
+            codes = np.load(self._path(codes_file))
+            scales = np.load(self._path(scales_file)) if self.quantization == "int8" else None
+            if len(codes) == len(self.ids):
+                return codes, scales
+            logger.info("量化编码与向量记录不一致，重新编码")
+        if not self.ids:
+            return self._empty_codes(self.matrix.shape[1] if self.matrix.ndim == 2 else 0)
+        codes, scales = [], []
+        for start in range(0, len(self.ids), self.BLOCK_ROWS):
+            c, sc = self._encode(np.asarray(self.matrix[start:start + self.BLOCK_ROWS]))
+            codes.append(c)
+            scales.append(sc)
+        return np.vstack(codes), (np.concatenate(scales) if self.quantization == "int8" else None)
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes[:self._size]
+
+    @codes.setter
+    def codes(self, value: np.ndarray):
+        self._codes = value
+
+    @property
+    def scales(self) -> np.ndarray | None:
+        return self._scales[:self._size] if self._scales is not None else None
+
+    @scales.setter
+    def scales(self, value: np.ndarray | None):
+        self._scales = value
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        with self._lock:
+            old_n = self._size
+            super().upsert(ids, embeddings, documents, metadatas)
+            new_codes, new_scales = self._encode(normalize_rows(embeddings))
+            if not old_n:
+                self._codes = np.zeros((0, new_codes.shape[1]), new_codes.dtype)
+                self._scales = np.zeros(0, np.float32) if self.quantization == "int8" else None
+            # 与全精度矩阵相同：追加写入预留容量，覆盖已有行时写时复制
+            rows = [self._row[chunk_id] for chunk_id in ids]
+            overwrite = min(rows) < old_n
+            grow = self._size - old_n
+            codes = _reserve(self._codes, old_n, grow, copy=overwrite)
+            codes[rows] = new_codes
+            if self.quantization == "int8":
+                scales = _reserve(self._scales, old_n, grow, copy=overwrite)
+                scales[rows] = new_scales
+                self._scales = scales
+            self._codes = codes
+
+    def delete(self, ids):
+        with self._lock:
+            drop = {self._row[chunk_id] for chunk_id in ids if chunk_id in self._row}
+            if not drop:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            codes, scales = self.codes, self.scales
+            super().delete(ids)
+            self.codes = codes[keep]
+            if scales is not None:
+                self.scales = scales[keep]
+
+    def _first_pass(self, codes, scales, query: np.ndarray) -> np.ndarray:
+        """按块计算量化相似度（越大越相似）"""
+        out = np.empty(len(codes), np.float32)
+        if self.quantization == "binary":
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(codes), self.BLOCK_ROWS):
+                xor = np.bitwise_xor(codes[start:start + self.BLOCK_ROWS], query_bits)
+                out[start:start + len(xor)] = -_popcount(xor)
+        else:
+            for start in range(0, len(codes), self.BLOCK_ROWS):
+                block = codes[start:start + self.BLOCK_ROWS]
+                out[start:start + len(block)] = (block.astype(np.float32) @ query) * scales[start:start + len(block)]
+        return out
+
+    def query(self, embedding, k: int, where=None) -> list[tuple]:
+        with self._lock:
+            matrix, ids, documents, metadatas = self._snapshot()
+            codes, scales = self.codes, self.scales
+        n = len(codes)
+        if not n or k <= 0:
+            return []
+        query = normalize_rows(embedding)[0]
+        scores = self._first_pass(codes, scales, query)
+        if where:
+            mask = np.fromiter((match_where(m, where) for m in metadatas), dtype=bool, count=n)
+            scores = np.where(mask, scores, -np.inf)
+            valid = int(mask.sum())
+        else:
+            valid = n
+        k = min(k, valid)
+        if k == 0:
+            return []
+        n_candidates = min(k * self.rescore_factor, valid)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates.sort()  # 顺序读取映射文件
+        exact = np.asarray(matrix[candidates]) @ query
+        order = np.argsort(-exact)[:k]
+        return [
+            (ids[candidates[i]], documents[candidates[i]], metadatas[candidates[i]], float(1.0 - exact[i]))
+            for i in order
+        ]
+
+    def _save_sidecars(self, version: str) -> dict[str, str]:
+        codes, scales = self.codes, self.scales
+        files = {"codes_file": self.CODES_PATTERN.format(self.quantization, version)}
+        _atomic_write(self._path(files["codes_file"]), lambda f: np.save(f, codes))
+        if scales is not None:
+            files["scales_file"] = self.SCALES_PATTERN.format(version)
+            _atomic_write(self._path(files["scales_file"]), lambda f: np.save(f, scales))
+        return files
+
+    def nbytes(self) -> int:
+        """常驻内存：量化编码 + scale；全精度矩阵已映射到磁盘时不计入（未落盘时计入）"""
+        resident = int(self.codes.nbytes) + (int(self.scales.nbytes) if self.scales is not None else 0)
+        if not isinstance(self.matrix, np.memmap):
+            resident += int(self.matrix.nbytes)
+        return resident
+
+
+def open_store(kind: str, directory: str, M: int | None = None, ef_construction: int | None = None,
+               ef_search: int | None = None, quantization: str | None = None, rescore_factor: int = 4):
+    """
+    打开进程内向量存储（numpy / hnsw）；chroma 由 RAGSystem 直接创建。
+    quantization（int8 / binary）只适用于 numpy 存储。
+    """
+    if quantization is not None and kind != "numpy":
+        raise ValueError(f"量化检索只支持 numpy 向量存储，当前为 {kind}")
+    if kind == "numpy":
+        if quantization is not None:
+            return QuantizedStore(directory, quantization=quantization, rescore_factor=rescore_factor)
+        return NumpyStore(directory)
+    if kind == "hnsw":
+        params = {key: value for key, value in (
+            ("M", M), ("ef_construction", ef_construction), ("ef_search", ef_search),
+        ) if value is not None}
+        return HnswStore(directory, **params)
+    raise ValueError(f"未知向量存储: {kind}，可选: {', '.join(VECTOR_STORES)}")